@@ -8,6 +8,7 @@ __version__ = "0.1.0"
 from .form import Form
 from .form import FormPage
 from .form import FormPanel
+from .preload import warmup
 from .questions import BarRatingQuestion
 from .questions import BooleanQuestion
 from .questions import BootstrapDatePickerQuestion
@@ -42,6 +43,7 @@ from .questions import TagBoxQuestion
 from .questions import TextQuestion
 from .questions import TextValidator
 from .settings import SURVEY_JS_CDN
+from .validators import ValidationBudgetError
 from .validators import ValidationError
 
 
@@ -83,5 +85,7 @@ __all__ = [
     "TagBoxQuestion",
     "TextQuestion",
     "TextValidator",
+    "ValidationBudgetError",
     "ValidationError",
+    "warmup",
 ]
@@ -0,0 +1,382 @@
+"""
+Synthetic forms and benchmarks.
+
+Synthetic forms use all the question types, at any size, with their questions
+spread over nested pages and panels, choice lists of a given length, and
+titles translated to any number of locales. The benchmarks build synthetic
+forms of several sizes, and time the main form operations:
+
+- `construct`: building the survey, without any cached results.
+- `to_json`: serializing the built survey.
+- `render_html`: rendering the full HTML page of the built survey.
+- `from_json`: creating a form class from the survey JSON.
+- `generate_code`: generating Python code from the survey JSON.
+- `validate`: validating a synthetic submission, timed over many
+  submissions.
+
+Each operation is run a number of times, and the best and mean times are
+kept. The peak memory used to build, render and validate each form is
+measured separately, since tracing allocations slows everything down. The
+results are plain data, which can be saved as JSON and compared with
+:func:`compare_results` to catch regressions.
+"""
+import datetime
+import platform
+import time
+import tracemalloc
+
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Sequence
+
+from .form import Form
+from .form import FormPage
+from .form import FormPanel
+from .questions import ChoicesQuestion
+from .questions import QUESTION_TYPES
+from .questions import TextValidator
+
+OPERATIONS = (
+    "construct",
+    "to_json",
+    "render_html",
+    "from_json",
+    "generate_code",
+    "validate",
+)
+
+# Answers for synthetic submissions, by question kind. Choice questions get
+# their first choice, and matrices and multiple text questions get one cell.
+MULTIPLE_CHOICE_KINDS = frozenset(["checkbox", "sortablelist", "tagbox"])
+SYNTHETIC_ANSWERS = {
+    "boolean": True,
+    "bootstrapdatepicker": "2020-01-01",
+    "bootstrpslider": 5,
+    "datepicker": "2020-01-01",
+    "matrix": {"row1": "column1"},
+    "matrixdropdown": {"row1": {"column1": "choice0"}},
+    "matrixdynamic": [{"column1": "choice0"}],
+    "multipletext": {"item1": "answer"},
+    "nouislider": 5,
+    "rating": 3,
+}
+
+
+def _title(text: str, locales: Sequence[str]):
+    if not locales:
+        return text
+    title = {"default": text}
+    for locale in locales:
+        title[locale] = f"{text} ({locale})"
+    return title
+
+
+def synthetic_question(
+    question_type: type, index: int, choices: int = 10, locales: Sequence[str] = ()
+):
+    """Create a question of a given type, with the parameters it needs.
+
+    :param question_type:
+        The question class.
+    :param index:
+        The question number, used in its title.
+    :param choices:
+        The number of choices for questions with choices.
+    :param locales:
+        The locales to translate the title to.
+
+    :Returns:
+        The question.
+    """
+    params = {"title": _title(f"Question {index}", locales)}
+    choice_list = [f"choice{number}" for number in range(choices)]
+    columns = [{"name": "column1"}, {"name": "column2"}]
+    rows = ["row1", "row2", "row3"]
+    kind = question_type.__fields__["kind"].default
+    if issubclass(question_type, ChoicesQuestion):
+        params["choices"] = choice_list
+    elif kind == "matrix":
+        params.update(columns=["column1", "column2"], rows=rows)
+    elif kind == "matrixdropdown":
+        params.update(columns=columns, rows=rows, choices=choice_list)
+    elif kind == "matrixdynamic":
+        params.update(columns=columns, choices=choice_list)
+    elif kind == "multipletext":
+        params["items"] = [{"name": "item1"}, {"name": "item2"}]
+    elif kind == "text":
+        params["validators"] = [TextValidator(max_length=100)]
+    if index % 2 == 0:
+        params["required"] = True
+    return question_type(**params)
+
+
+def _container(
+    name: str, elements: list, depth: int, branching: int, level: int = 0
+) -> type:
+    attributes = {}
+    if level >= depth:
+        attributes.update(elements)
+    else:
+        size = max(1, -(-len(elements) // branching))
+        for number, start in enumerate(range(0, len(elements), size)):
+            end = start + size
+            child = _container(
+                f"{name}_{number}", elements[start:end], depth, branching, level + 1
+            )
+            if level == 0:
+                attributes[f"page{number}"] = FormPage(child, name=f"page{number}")
+            else:
+                panel_name = f"{name}_panel{number}".lower()
+                attributes[panel_name] = FormPanel(child, name=panel_name)
+    return type(name, (Form,), attributes)
+
+
+def synthetic_form(
+    questions: int = 100,
+    depth: int = 1,
+    choices: int = 10,
+    locales: Sequence[str] = (),
+    branching: int = 10,
+    name: str = "SyntheticForm",
+) -> type:
+    """Create a form class with questions of all types, in turn.
+
+    :param questions:
+        The number of questions.
+    :param depth:
+        The nesting depth: 0 for a single page, 1 for pages, 2 for pages of
+        panels, and so on.
+    :param choices:
+        The number of choices for questions with choices.
+    :param locales:
+        The locales to translate the titles to.
+    :param branching:
+        The number of pages, or of panels in each page or panel.
+    :param name:
+        The form class name.
+
+    :Returns:
+        The form class.
+    """
+    elements = [
+        (
+            f"q{index}",
+            synthetic_question(
+                QUESTION_TYPES[index % len(QUESTION_TYPES)], index, choices, locales
+            ),
+        )
+        for index in range(questions)
+    ]
+    return _container(name, elements, depth, branching)
+
+
+def synthetic_submission(form: Form):
+    """Create a submission with an answer for each question of a form.
+
+    :param form:
+        The form instance.
+
+    :Returns:
+        The form data dictionary.
+    """
+    submission = {}
+    for name, element in form._form_elements.items():
+        choices = getattr(element, "choices", None)
+        if isinstance(element, ChoicesQuestion) and choices:
+            choice = choices[0]
+            if isinstance(choice, dict):
+                choice = choice.get("value")
+            if element.kind in MULTIPLE_CHOICE_KINDS:
+                choice = [choice]
+            submission[name] = choice
+        else:
+            submission[name] = SYNTHETIC_ANSWERS.get(element.kind, "answer")
+    return submission
+
+
+def _clear_caches(form: Form):
+    form.__class__._compiled_surveys.clear()
+
+
+def _time(
+    function: Callable[[], Any], repeat: int, setup: Callable[[], Any] = None
+) -> Dict[str, float]:
+    times = []
+    for run in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "mean": sum(times) / len(times)}
+
+
+def _peak_memory(form_class: type, submission: Dict[str, Any]):
+    form = form_class()
+    _clear_caches(form)
+    tracemalloc.start()
+    try:
+        form.to_json()
+        form.render_html()
+        form.validate(dict(submission))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_form(
+    questions: int,
+    depth: int = 1,
+    choices: int = 10,
+    locales: Sequence[str] = (),
+    branching: int = 10,
+    repeat: int = 3,
+    submissions: int = 100,
+):
+    """Benchmark the operations of a synthetic form. See
+    :func:`synthetic_form` for the form parameters.
+
+    :param repeat:
+        The number of times to run each operation.
+    :param submissions:
+        The number of submissions validated in each run.
+
+    :Returns:
+        A dictionary with the number of questions, the best and mean times
+        of each operation, in seconds, and the peak memory, in bytes. The
+        validation times are per submission, with the number of submissions
+        per second.
+    """
+    from .cli import form_code
+
+    form_class = synthetic_form(questions, depth, choices, locales, branching)
+    form = form_class()
+    locale = locales[0] if locales else None
+    operations = {}
+
+    def clear_json():
+        _clear_caches(form)
+        form._construct_survey()
+
+    operations["construct"] = _time(
+        form._construct_survey, repeat, lambda: _clear_caches(form)
+    )
+    operations["to_json"] = _time(
+        lambda: form.to_json(locale=locale), repeat, clear_json
+    )
+    operations["render_html"] = _time(
+        lambda: form.render_html(locale=locale), repeat, clear_json
+    )
+    form_json = form.to_json(exclude_defaults=True)
+    operations["from_json"] = _time(
+        lambda: Form.from_json(form_json, "BenchmarkForm"), repeat
+    )
+    operations["generate_code"] = _time(
+        lambda: form_code("BenchmarkForm", form_json), repeat
+    )
+    submission = synthetic_submission(form)
+    form.validate(dict(submission))
+
+    def validate():
+        for number in range(submissions):
+            form.validate(dict(submission))
+
+    # Validation times are per submission.
+    timing = _time(validate, repeat)
+    timing = {key: value / submissions for key, value in timing.items()}
+    timing["per_second"] = 1 / timing["best"] if timing["best"] else 0
+    operations["validate"] = timing
+    return {
+        "questions": questions,
+        "operations": operations,
+        "peak_memory": _peak_memory(form_class, submission),
+    }
+
+
+def run_benchmarks(
+    sizes: Iterable[int] = (10, 100, 1000),
+    depth: int = 1,
+    choices: int = 10,
+    locales: Sequence[str] = (),
+    branching: int = 10,
+    repeat: int = 3,
+    submissions: int = 100,
+):
+    """Benchmark synthetic forms of several sizes. See :func:`benchmark_form`
+    for the parameters.
+
+    :param sizes:
+        The numbers of questions of the forms.
+
+    :Returns:
+        A dictionary with the versions, the parameters and a list of
+        :func:`benchmark_form` results, ready to be saved as JSON.
+    """
+    from . import __version__
+
+    locales = list(locales)
+    return {
+        "questions_version": __version__,
+        "python_version": platform.python_version(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "parameters": {
+            "depth": depth,
+            "choices": choices,
+            "locales": locales,
+            "branching": branching,
+            "repeat": repeat,
+            "submissions": submissions,
+        },
+        "results": [
+            benchmark_form(
+                size, depth, choices, locales, branching, repeat, submissions
+            )
+            for size in sizes
+        ],
+    }
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2
+):
+    """Compare two benchmark runs, and find the operations that got slower,
+    and the forms that use more memory, by more than a threshold. Only the
+    sizes that are in both runs are compared.
+
+    :param baseline:
+        The results of the previous run.
+    :param current:
+        The results of the new run.
+    :param threshold:
+        The allowed increase, as a fraction: 0.2 allows 20% slower times.
+
+    :Returns:
+        A list of regressions, as dictionaries with the number of questions,
+        the measure, the old and new values and the relative change.
+    """
+    previous = {result["questions"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(result["questions"])
+        if old is None:
+            continue
+        measures = [
+            (operation, old["operations"][operation]["best"], timing["best"])
+            for operation, timing in result["operations"].items()
+            if operation in old["operations"]
+        ]
+        measures.append(("peak_memory", old["peak_memory"], result["peak_memory"]))
+        for measure, old_value, new_value in measures:
+            if old_value and new_value > old_value * (1 + threshold):
+                regressions.append(
+                    {
+                        "questions": result["questions"],
+                        "measure": measure,
+                        "baseline": old_value,
+                        "current": new_value,
+                        "change": new_value / old_value - 1,
+                    }
+                )
+    return regressions
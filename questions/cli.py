@@ -6,15 +6,36 @@ Console scripts for questions.
 
  - download_surveyjs PATH PLATFORM THEME
      Downloads all CSS and JS resources needed to run SurveyJS
+
+ - generate_code NAME JSON_FILE
+     Generates Questions form code from a SurveyJS JSON file
+
+ - questions validate FORM SUBMISSIONS [--workers N] [--errors PATH]
+     Validates a file of form submissions
+
+ - questions bench [--sizes N,N] [--output PATH] [--compare PATH]
+     Benchmarks synthetic forms
 """
+import csv
+import importlib
+import json
+import os
+import sys
+import time
+
 import click
 import requests
 
+from .benchmarks import compare_results
+from .benchmarks import OPERATIONS
+from .benchmarks import run_benchmarks
 from .form import Form
 from .form import FormPage
 from .form import FormPanel
+from .questions import CheckboxQuestion
 from .questions import Question
 from .questions import QUESTION_TYPES
+from .questions import TagBoxQuestion
 from .settings import SURVEY_JS_CDN
 from .templates import get_platform_js_resources
 from .templates import get_theme_css_resources
@@ -110,9 +131,24 @@ def generate_code(name, json_file):
     """
     Generate Questions form code from SurveyJS JSON file.
     """
+    click.echo(form_code(name, json_file.read()))
+
+
+def form_code(name: str, form_json: str):
+    """
+    Generate the Python code for a form from its SurveyJS JSON.
+
+    :param name:
+        The name of the form class.
+    :param form_json:
+        The SurveyJS JSON text.
+
+    :Returns:
+        The code, starting with the imports.
+    """
     imports = ["from questions import Form"]
     code = []
-    NewForm = Form.from_json(json_file.read(), name)
+    NewForm = Form.from_json(form_json, name)
     current = [NewForm]
     while current != []:
         fragment = []
@@ -123,9 +159,11 @@ def generate_code(name, json_file):
                 if isinstance(element, (FormPage, FormPanel)):
                     next_batch.append(element.form.__class__)
                 if isinstance(element, (FormPage, FormPanel, Question)):
-                    statement = f"from questions import {element.__class__.__name__}"
-                    if statement not in imports:
-                        imports.append(statement)
+                    classes = [element] + list(getattr(element, "validators", []))
+                    for item in classes:
+                        statement = f"from questions import {item.__class__.__name__}"
+                        if statement not in imports:
+                            imports.append(statement)
                 if element_name.startswith("_"):
                     continue
                 element_repr = repr(element)
@@ -136,9 +174,298 @@ def generate_code(name, json_file):
                 fragment.append(f"    {element_name} = {element_repr}\n")
         code.append(fragment)
         current = next_batch
-    click.echo()
-    for statement in imports:
-        click.echo(statement)
     code.reverse()
-    for fragment in code:
-        click.echo("".join(fragment))
+    return "\n".join([""] + imports + ["".join(fragment) for fragment in code])
+
+
+@click.group()
+def main():
+    """
+    Questions command line tools.
+    """
+
+
+def load_form(source: str):
+    """
+    Load a form from a SurveyJS JSON file, or from a `module:FormClass`
+    reference. Modules are imported from the current directory too.
+    """
+    if os.path.isfile(source):
+        with open(source) as json_file:
+            return Form.from_json(json_file.read(), "SubmissionsForm")()
+    module_name, _, attribute = source.partition(":")
+    if not attribute:
+        raise click.BadParameter(
+            "must be a JSON file or a module:FormClass reference", param_hint="FORM"
+        )
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as error:
+        raise click.BadParameter(str(error), param_hint="FORM")
+    form = getattr(module, attribute, None)
+    if isinstance(form, type) and issubclass(form, Form):
+        form = form()
+    if not isinstance(form, Form):
+        raise click.BadParameter(f"{source} is not a form", param_hint="FORM")
+    return form
+
+
+# Kinds of questions whose answers are objects or lists of objects.
+STRUCTURED_ANSWER_KINDS = frozenset(
+    [
+        "file",
+        "matrix",
+        "matrixdropdown",
+        "matrixdynamic",
+        "multipletext",
+        "paneldynamic",
+    ]
+)
+
+
+def answer_shapes(form: Form):
+    """
+    Get the questions of a form whose answers are not plain values: `list`
+    for check boxes, tag boxes, and image pickers that allow more than one
+    pick, and `json` for matrices, multiple text questions, file questions
+    and dynamic panels.
+    """
+    shapes = {}
+    for name, element in form._form_elements.items():
+        if isinstance(element, (CheckboxQuestion, TagBoxQuestion)) or getattr(
+            element, "multi_select", False
+        ):
+            shapes[name] = "list"
+        elif element.kind in STRUCTURED_ANSWER_KINDS:
+            shapes[name] = "json"
+    return shapes
+
+
+def _csv_value(value: str, shape: str, separator: str):
+    if shape is None:
+        return value
+    if value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    if shape == "list":
+        return [item.strip() for item in value.split(separator)]
+    return value
+
+
+def read_submissions(
+    submissions_file, file_format: str, shapes: dict = None, separator: str = ","
+):
+    """
+    Read submissions one at a time from a NDJSON or CSV file. CSV cells are
+    text, except for the questions in `shapes`, as returned by
+    :func:`answer_shapes`: cells with JSON arrays or objects are parsed, and
+    other cells of `list` questions are split by the separator. Empty CSV
+    cells are left out of the submission.
+    """
+    if file_format == "csv":
+        shapes = shapes or {}
+        for row in csv.DictReader(submissions_file):
+            yield {
+                name: _csv_value(value, shapes.get(name), separator)
+                for name, value in row.items()
+                if value != ""
+            }
+        return
+    for number, line in enumerate(submissions_file, 1):
+        if not line.strip():
+            continue
+        try:
+            submission = json.loads(line)
+        except ValueError as error:
+            raise click.ClickException(f"Line {number} is not valid JSON: {error}")
+        if not isinstance(submission, dict):
+            raise click.ClickException(f"Line {number} is not a JSON object")
+        yield submission
+
+
+@main.command()
+@click.argument("form")
+@click.argument("submissions", type=click.File("r"))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["ndjson", "csv"]),
+    help="submissions file format (default: from the file extension)",
+)
+@click.option(
+    "--workers", default=1, show_default=True, help="number of worker processes"
+)
+@click.option(
+    "--chunk-size",
+    default=256,
+    show_default=True,
+    help="submissions sent to a worker at a time",
+)
+@click.option(
+    "--separator",
+    default=",",
+    show_default=True,
+    help="separator of the answers in CSV cells of multiple answer questions",
+)
+@click.option(
+    "--errors",
+    "errors_file",
+    type=click.File("w"),
+    default="-",
+    help="file for the errors of invalid submissions (default: standard output)",
+)
+def validate(
+    form, submissions, file_format, workers, chunk_size, separator, errors_file
+):
+    """
+    Validate a file of form submissions.
+
+    FORM is a SurveyJS JSON file, or a module:FormClass reference to a
+    Questions form. SUBMISSIONS is a NDJSON file, with one submission per
+    line, or a CSV file with a column for each question. In CSV files, the
+    answers of check box and tag box questions are separated by commas, or
+    by the --separator, and matrix and other structured answers are JSON.
+
+    The errors for each invalid submission are written as one JSON object per
+    line, with its record number, starting at 1. A summary is written to
+    standard error. The exit code is 1 if any submission is invalid.
+    """
+    form = load_form(form)
+    if file_format is None:
+        extension = os.path.splitext(submissions.name)[1].lower()
+        file_format = "csv" if extension == ".csv" else "ndjson"
+    shapes = answer_shapes(form)
+    records = read_submissions(submissions, file_format, shapes, separator)
+    total = 0
+    invalid = 0
+    start = time.perf_counter()
+    results = form.validate_many(records, workers=workers, chunk_size=chunk_size)
+    for total, (valid, errors) in enumerate(results, 1):
+        if not valid:
+            invalid += 1
+            errors_file.write(json.dumps({"record": total, "errors": errors}) + "\n")
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0
+    click.echo(
+        f"{total} submissions, {total - invalid} valid, {invalid} invalid", err=True
+    )
+    click.echo(
+        f"{elapsed:.2f} seconds, {rate:.0f} submissions per second "
+        f"({workers} worker{'s' if workers != 1 else ''})",
+        err=True,
+    )
+    if invalid:
+        sys.exit(1)
+
+
+def _numbers(value: str):
+    try:
+        return [int(number) for number in value.split(",") if number.strip()]
+    except ValueError:
+        raise click.BadParameter("must be a comma separated list of numbers")
+
+
+@main.command()
+@click.option(
+    "--sizes",
+    default="10,100,1000",
+    show_default=True,
+    help="comma separated numbers of questions, from 10 to 100000",
+)
+@click.option(
+    "--depth",
+    default=1,
+    show_default=True,
+    help="nesting depth: 0 for one page, 1 for pages, 2 for pages of panels...",
+)
+@click.option(
+    "--branching",
+    default=10,
+    show_default=True,
+    help="number of pages, and of panels in each page or panel",
+)
+@click.option(
+    "--choices", default=10, show_default=True, help="choices of choice questions"
+)
+@click.option(
+    "--locales", default="", help="comma separated locales for translated titles"
+)
+@click.option("--repeat", default=3, show_default=True, help="runs of each operation")
+@click.option(
+    "--submissions",
+    default=100,
+    show_default=True,
+    help="submissions validated in each run",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="file for the JSON results (default: standard output)",
+)
+@click.option(
+    "--compare",
+    "baseline_file",
+    type=click.File("r"),
+    help="JSON results of a previous run to compare with",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    show_default=True,
+    help="allowed slowdown when comparing, as a fraction",
+)
+def bench(
+    sizes,
+    depth,
+    branching,
+    choices,
+    locales,
+    repeat,
+    submissions,
+    output,
+    baseline_file,
+    threshold,
+):
+    """
+    Benchmark synthetic forms with questions of all types.
+
+    Times building the survey, serializing it to JSON, rendering the HTML
+    page, loading the form from JSON, generating code, and validating
+    submissions, and measures the peak memory, for forms of each size. The
+    results are written as JSON, and a summary to standard error. With
+    --compare, the exit code is 1 if any operation is slower than in the
+    previous run by more than the threshold.
+    """
+    locales = [locale.strip() for locale in locales.split(",") if locale.strip()]
+    results = run_benchmarks(
+        _numbers(sizes), depth, choices, locales, branching, repeat, submissions
+    )
+    output.write(json.dumps(results, indent=2) + "\n")
+    for result in results["results"]:
+        times = ", ".join(
+            f"{operation} {result['operations'][operation]['best'] * 1000:.2f}ms"
+            for operation in OPERATIONS
+        )
+        rate = result["operations"]["validate"]["per_second"]
+        memory = result["peak_memory"] / 1024 / 1024
+        click.echo(
+            f"{result['questions']} questions: {times}; "
+            f"{rate:.0f} validations per second; {memory:.1f} MB peak",
+            err=True,
+        )
+    if baseline_file is None:
+        return
+    regressions = compare_results(json.load(baseline_file), results, threshold)
+    for regression in regressions:
+        click.echo(
+            f"Regression: {regression['measure']} with {regression['questions']} "
+            f"questions is {regression['change']:.0%} higher",
+            err=True,
+        )
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,275 @@
+"""
+Columnar validation for bulk datasets.
+
+Datasets exported for analysis usually keep one array of answers per question.
+The functions in this module validate those columns as a whole, using the same
+validation plan as :meth:`questions.Form.validate`. When NumPy is installed,
+required, numeric and text length checks run as vectorized operations over
+each column; all other checks, or columns that NumPy can't handle, are run
+answer by answer. Forms with conditional logic or matrix rows are validated
+row by row.
+"""
+import math
+
+from itertools import zip_longest
+
+from typing import Any
+from typing import Dict
+from typing import Mapping
+from typing import Sequence
+
+try:
+    import numpy
+except ImportError:  # pragma: NO COVER
+    numpy = None
+
+from .expressions import is_empty
+from .validators import DIGITS
+from .validators import ValidationPlan
+
+
+def to_python(value: Any):
+    """
+    Convert NumPy scalars and arrays to Python values, and NaN to
+    :data:`None`.
+    """
+    if numpy is not None and isinstance(value, (numpy.generic, numpy.ndarray)):
+        value = value.tolist()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class RowView(Mapping):
+    """
+    Read only view of one row of a set of columns, used as the form data
+    for checks that need the other answers, like expressions.
+
+    :param columns:
+        Mapping of answer columns, by question name.
+    :param index:
+        The row index.
+    """
+
+    __slots__ = ("columns", "index")
+
+    def __init__(self, columns: Mapping[str, Sequence], index: int):
+        self.columns = columns
+        self.index = index
+
+    def __getitem__(self, name: str):
+        return to_python(self.columns[name][self.index])
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+
+def column_length(columns: Mapping[str, Sequence]):
+    """
+    Get the number of rows of a set of columns.
+
+    :Raises:
+        ValueError if the columns do not have the same length.
+    """
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("All columns must have the same length")
+    return lengths.pop() if lengths else 0
+
+
+def _python_failures(plan: ValidationPlan, columns: Mapping[str, Sequence], length):
+    failures = {}
+    for name, required, checks in plan.entries:
+        column = columns.get(name)
+        failed = []
+        for index in range(length):
+            value = None if column is None else to_python(column[index])
+            empty = is_empty(value)
+            if empty and required:
+                failed.append(index)
+                continue
+            form_data = None
+            for check, message, check_empty in checks:
+                if empty and not check_empty:
+                    continue
+                if form_data is None:
+                    form_data = RowView(columns, index)
+                if not check(value, form_data):
+                    failed.append(index)
+                    break
+        if failed:
+            failures[name] = failed
+    return failures
+
+
+def _row_failures(plan: ValidationPlan, columns: Mapping[str, Sequence], length):
+    failures = {}
+    for index in range(length):
+        for error in plan.validate(RowView(columns, index)):
+            failed = failures.setdefault(error["question"].split("[")[0], [])
+            if not failed or failed[-1] != index:
+                failed.append(index)
+    return failures
+
+
+def _empty_mask(values):
+    kind = values.dtype.kind
+    if kind == "f":
+        return numpy.isnan(values)
+    if kind in "US":
+        return values == values.dtype.type()
+    if kind == "O":
+        return numpy.frompyfunc(lambda value: is_empty(to_python(value)), 1, 1)(
+            values
+        ).astype(bool)
+    return numpy.zeros(len(values), dtype=bool)
+
+
+def _numeric_failures(validator, values):
+    if values.dtype.kind not in "iuf":
+        return None
+    max_value = float(validator.max_value)
+    min_value = float(validator.min_value)
+    with numpy.errstate(invalid="ignore"):
+        numbers = values.astype(float)
+        failed = numbers < min_value
+        if max_value > 0:
+            failed |= numbers > max_value
+    return failed
+
+
+def _text_failures(validator, values):
+    if values.dtype.kind != "U":
+        return None
+    max_length = int(validator.max_length)
+    min_length = int(validator.min_length)
+    lengths = numpy.char.str_len(values)
+    failed = lengths < min_length
+    if max_length > 0:
+        failed |= lengths > max_length
+    if not validator.allow_digits:
+        for digit in sorted(DIGITS):
+            failed |= numpy.char.find(values, digit) >= 0
+    return failed
+
+
+# Vectorized checks, by validator type. They return None when they can't
+# handle the column type.
+VECTORIZED_CHECKS = {
+    "numeric": _numeric_failures,
+    "text": _text_failures,
+}
+
+
+def _column_array(column: Sequence):
+    """Convert a column to a one dimensional array. Columns whose answers are
+    lists, like the answers of multiple choice questions, become arrays of
+    objects with one list per row."""
+    try:
+        values = numpy.asarray(column)
+    except ValueError:
+        # Lists of different lengths.
+        values = None
+    if values is None or values.ndim != 1:
+        values = numpy.empty(len(column), dtype=object)
+        for index, value in enumerate(column):
+            values[index] = value
+    return values
+
+
+def _numpy_failures(plan: ValidationPlan, columns: Mapping[str, Sequence], length):
+    failures = {}
+    for name, required, checks in plan.entries:
+        column = columns.get(name)
+        if column is None:
+            if required:
+                failures[name] = numpy.arange(length)
+            continue
+        values = _column_array(column)
+        empty = _empty_mask(values)
+        failed = empty.copy() if required else numpy.zeros(length, dtype=bool)
+        validators = plan.form_elements[name].validators
+        # Checks after the validator checks, like the choices check, have no
+        # validator.
+        for validator, (check, message, check_empty) in zip_longest(validators, checks):
+            vectorized = VECTORIZED_CHECKS.get(getattr(validator, "kind", None))
+            result = None
+            if vectorized is not None and not check_empty:
+                result = vectorized(validator, values)
+            if result is not None:
+                failed |= result & ~empty
+                continue
+            pending = ~failed if check_empty else ~failed & ~empty
+            for index in numpy.flatnonzero(pending):
+                value = to_python(values[index])
+                if not check(value, RowView(columns, index)):
+                    failed[index] = True
+        if failed.any():
+            failures[name] = numpy.flatnonzero(failed)
+    return failures
+
+
+def validate_columns(
+    plan: ValidationPlan,
+    columns: Mapping[str, Sequence],
+    vectorize: bool = True,
+):
+    """Validate a set of answer columns with a validation plan. The results
+    are the same as validating each row with the plan.
+
+    :param plan:
+        The validation plan.
+    :param columns:
+        Mapping of answer columns, by question name. Columns can be lists or
+        NumPy arrays, and all must have the same length. NaN and :data:`None`
+        are missing answers. A missing column means all its answers are
+        missing.
+    :param vectorize:
+        Set to :data:`False` to validate answer by answer, even if NumPy is
+        installed.
+
+    :Returns:
+        A `(mask, errors)` tuple. The mask has one boolean for each row, which
+        is :data:`True` if the row is valid. The errors dictionary has the
+        indexes of the rows that failed, for each question that has errors.
+        If NumPy is used, the mask and the indexes are NumPy arrays, otherwise
+        they are lists.
+    """
+    length = column_length(columns)
+    if plan.logic is not None or plan.row_plans:
+        # Conditions and rows depend on the other answers of each row.
+        failures = _row_failures(plan, columns, length)
+        if numpy is not None and vectorize:
+            failures = {name: numpy.array(failed) for name, failed in failures.items()}
+    elif numpy is not None and vectorize:
+        failures = _numpy_failures(plan, columns, length)
+    else:
+        failures = _python_failures(plan, columns, length)
+    if numpy is not None and vectorize:
+        mask = numpy.ones(length, dtype=bool)
+        for failed in failures.values():
+            mask[failed] = False
+        return mask, failures
+    mask = [True] * length
+    for failed in failures.values():
+        for index in failed:
+            mask[index] = False
+    return mask, failures
+
+
+def errors_by_row(failures: Dict[str, Sequence[int]]):
+    """
+    Convert the errors returned by :func:`validate_columns` to a list of
+    failed question names for each failed row.
+
+    :Returns:
+        A dictionary of question name lists, by row index.
+    """
+    rows = {}
+    for name, failed in failures.items():
+        for index in failed:
+            rows.setdefault(int(index), []).append(name)
+    return dict(sorted(rows.items()))
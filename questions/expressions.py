@@ -0,0 +1,1091 @@
+"""
+Compiler for the SurveyJS expression language.
+
+Expressions are used by expression validators, by the conditions of questions,
+like `visible_if` or `required_if`, and by expression blocks. Each expression
+is tokenized and parsed once, and compiled into a tree of Python closures, so
+evaluating it is about as fast as calling a plain function. Compiled
+expressions are kept in a bounded cache shared by all forms.
+
+The operators and functions follow the SurveyJS semantics: string comparisons
+are case insensitive, numeric strings are compared as numbers, missing values
+are empty, and `contains`, `anyof` and `allof` work on lists and strings.
+"""
+import datetime
+import math
+import re
+
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Mapping
+
+from .settings import EXPRESSION_CACHE_SIZE
+from .settings import MAX_EXPRESSION_STEPS
+
+
+class ExpressionError(Exception):
+    """
+    Raised when an expression can't be tokenized, parsed or compiled.
+    """
+
+
+# Errors from evaluating expressions with unexpected answer types.
+EXPRESSION_ERRORS = (
+    ArithmeticError,
+    AttributeError,
+    LookupError,
+    TypeError,
+    ValueError,
+)
+
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<variable>\{[^{}]*\})
+    |(?P<operator>==|!=|<>|<=|>=|&&|\|\||[-=<>!+*/%^(),\[\]])
+    |(?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    """,
+    re.VERBOSE,
+)
+
+PATH_PATTERN = re.compile(r"\[(\d+)\]|([^.\[\]]+)")
+
+# Word operators, with their canonical symbols.
+WORD_OPERATORS = {
+    "or": "or",
+    "and": "and",
+    "not": "!",
+    "negate": "!",
+    "equal": "==",
+    "notequal": "!=",
+    "less": "<",
+    "lessorequal": "<=",
+    "greater": ">",
+    "greaterorequal": ">=",
+    "contains": "contains",
+    "contain": "contains",
+    "notcontains": "notcontains",
+    "notcontain": "notcontains",
+    "anyof": "anyof",
+    "allof": "allof",
+    "noneof": "noneof",
+    "empty": "empty",
+    "notempty": "notempty",
+}
+
+SYMBOL_OPERATORS = {
+    "||": "or",
+    "&&": "and",
+    "=": "==",
+    "<>": "!=",
+}
+
+CONSTANTS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "undefined": None,
+}
+
+# Binding powers of the infix operators.
+BINDING_POWERS = {
+    "or": 10,
+    "and": 20,
+    "==": 40,
+    "!=": 40,
+    "<": 40,
+    "<=": 40,
+    ">": 40,
+    ">=": 40,
+    "contains": 40,
+    "notcontains": 40,
+    "anyof": 40,
+    "allof": 40,
+    "noneof": 40,
+    "empty": 40,
+    "notempty": 40,
+    "+": 50,
+    "-": 50,
+    "*": 60,
+    "/": 60,
+    "%": 60,
+    "^": 70,
+}
+
+NOT_BINDING_POWER = 30
+UNARY_BINDING_POWER = 80
+
+_MISSING = object()
+
+
+def tokenize(expression: str):
+    """
+    Split an expression into tokens.
+
+    :param expression:
+        The expression text.
+
+    :Returns:
+        A list of (kind, value) tuples. Kinds are `number`, `string`,
+        `variable`, `operator`, `word` and `end`.
+
+    :Raises:
+        ExpressionError if the expression has an invalid character.
+    """
+    tokens = []
+    position = 0
+    length = len(expression)
+    while position < length:
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None:
+            raise ExpressionError(
+                f"Invalid character {expression[position]!r} at position {position}"
+            )
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "space":
+            continue
+        if kind == "number":
+            value = float(value) if re.search("[.eE]", value) else int(value)
+        elif kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif kind == "variable":
+            value = value[1:-1].strip()
+        elif kind == "operator":
+            value = SYMBOL_OPERATORS.get(value, value)
+        elif kind == "word" and value.lower() in WORD_OPERATORS:
+            kind = "operator"
+            value = WORD_OPERATORS[value.lower()]
+        tokens.append((kind, value))
+    tokens.append(("end", None))
+    return tokens
+
+
+class Parser(object):
+    """
+    Pratt parser for SurveyJS expressions. Produces a tree of tuples, where
+    the first item is the node kind.
+
+    :param expression:
+        The expression text.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def parse(self):
+        """
+        Parse the full expression.
+
+        :Returns:
+            The root node of the expression tree.
+
+        :Raises:
+            ExpressionError if the expression is not valid.
+        """
+        if self.tokens[0][0] == "end":
+            raise ExpressionError("Empty expression")
+        node = self.parse_expression(0)
+        kind, value = self.peek()
+        if kind != "end":
+            raise ExpressionError(f"Unexpected {value!r} in {self.expression!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.position]
+
+    def advance(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, operator: str):
+        kind, value = self.advance()
+        if kind != "operator" or value != operator:
+            raise ExpressionError(f"Expected {operator!r} in {self.expression!r}")
+
+    def parse_expression(self, binding_power: int):
+        node = self.parse_prefix()
+        while True:
+            kind, operator = self.peek()
+            if kind != "operator" or operator not in BINDING_POWERS:
+                return node
+            power = BINDING_POWERS[operator]
+            if power <= binding_power:
+                return node
+            self.advance()
+            if operator in ("empty", "notempty"):
+                node = ("postfix", operator, node)
+            elif operator == "^":
+                node = ("binary", operator, node, self.parse_expression(power - 1))
+            elif operator in ("and", "or"):
+                node = (operator, node, self.parse_expression(power))
+            else:
+                node = ("binary", operator, node, self.parse_expression(power))
+
+    def parse_prefix(self):
+        kind, value = self.advance()
+        if kind in ("number", "string"):
+            return ("constant", value)
+        if kind == "variable":
+            return ("variable", value)
+        if kind == "word":
+            name = value.lower()
+            next_kind, next_value = self.peek()
+            if next_kind == "operator" and next_value == "(":
+                self.advance()
+                return ("call", name, self.parse_list(")"))
+            if name in CONSTANTS:
+                return ("constant", CONSTANTS[name])
+            # SurveyJS treats other bare words as string constants.
+            return ("constant", value)
+        if kind == "operator":
+            if value == "(":
+                node = self.parse_expression(0)
+                self.expect(")")
+                return node
+            if value == "[":
+                return ("array", self.parse_list("]"))
+            if value == "!":
+                return ("not", self.parse_expression(NOT_BINDING_POWER))
+            if value in ("-", "+"):
+                return ("unary", value, self.parse_expression(UNARY_BINDING_POWER))
+        if kind == "end":
+            raise ExpressionError(f"Unexpected end of {self.expression!r}")
+        raise ExpressionError(f"Unexpected {value!r} in {self.expression!r}")
+
+    def parse_list(self, closing: str):
+        items = []
+        kind, value = self.peek()
+        if kind == "operator" and value == closing:
+            self.advance()
+            return items
+        while True:
+            items.append(self.parse_expression(0))
+            kind, value = self.advance()
+            if kind == "operator" and value == closing:
+                return items
+            if kind != "operator" or value != ",":
+                raise ExpressionError(f"Expected {closing!r} in {self.expression!r}")
+
+
+def parse(expression: str):
+    """
+    Parse an expression into an expression tree.
+
+    :param expression:
+        The expression text.
+
+    :Returns:
+        The root node of the expression tree.
+    """
+    return Parser(expression).parse()
+
+
+def is_true(value: Any):
+    """
+    Check if a value is true, following the Javascript rules used by SurveyJS:
+    :data:`None`, :data:`False`, zero and empty strings are false, anything
+    else is true.
+    """
+    return not (value is None or value is False or value == 0 or value == "")
+
+
+def is_empty(value: Any):
+    """
+    Check if a value is empty, as SurveyJS does: missing values, empty strings
+    and empty lists or dictionaries are empty.
+    """
+    if value is None or value == "":
+        return True
+    if isinstance(value, (list, tuple, dict, set)):
+        return len(value) == 0
+    return False
+
+
+def to_number(value: Any):
+    """
+    Convert numeric strings to numbers. Any other value is returned as is.
+    """
+    if isinstance(value, str):
+        text = value.strip()
+        if text:
+            try:
+                number = float(text)
+            except ValueError:
+                return value
+            return int(number) if number.is_integer() and "." not in text else number
+    return value
+
+
+def _is_number(value: Any):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def to_date(value: Any):
+    """
+    Convert ISO date strings to dates. Strings with a time part are converted
+    to datetimes. Returns :data:`None` for values that are not dates.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value
+    if isinstance(value, str) and value:
+        text = value.strip().replace("Z", "+00:00")
+        try:
+            if len(text) > 10:
+                return datetime.datetime.fromisoformat(text)
+            return datetime.date.fromisoformat(text)
+        except ValueError:
+            return None
+    return None
+
+
+def _comparable(left: Any, right: Any):
+    """
+    Convert two values to the same type for comparing them.
+    """
+    if isinstance(left, datetime.date) or isinstance(right, datetime.date):
+        left, right = to_date(left), to_date(right)
+        if isinstance(left, datetime.datetime) != isinstance(right, datetime.datetime):
+            if isinstance(left, datetime.datetime):
+                left = left.date()
+            if isinstance(right, datetime.datetime):
+                right = right.date()
+        return left, right
+    left_number, right_number = to_number(left), to_number(right)
+    if _is_number(left_number) and _is_number(right_number):
+        return left_number, right_number
+    if isinstance(left, str) and isinstance(right, str):
+        return left.lower(), right.lower()
+    return left, right
+
+
+def equals(left: Any, right: Any):
+    """
+    Compare two values for equality, as SurveyJS does. Strings are compared
+    without case, numeric strings are compared as numbers, and all empty values
+    are equal.
+    """
+    if left is right:
+        return True
+    if is_empty(left) and is_empty(right):
+        return True
+    if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        return len(left) == len(right) and all(map(equals, left, right))
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(
+            equals(value, right[key]) for key, value in left.items()
+        )
+    left, right = _comparable(left, right)
+    return left == right
+
+
+def _ordering(compare: Callable[[Any, Any], bool]):
+    def check(left: Any, right: Any):
+        if left is None or right is None:
+            return False
+        left, right = _comparable(left, right)
+        try:
+            return compare(left, right)
+        except TypeError:
+            return False
+
+    return check
+
+
+def _as_list(value: Any):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def _in_list(value: Any, items: list):
+    for item in items:
+        if equals(item, value):
+            return True
+    return False
+
+
+def contains(left: Any, right: Any):
+    """
+    Check if a list contains a value, or all the values of another list, or if
+    a string contains another string.
+    """
+    if is_empty(left):
+        return False
+    if isinstance(left, str):
+        if isinstance(right, (list, tuple)):
+            return all(contains(left, item) for item in right)
+        return str(right).lower() in left.lower()
+    if isinstance(left, dict):
+        return right in left
+    left = _as_list(left)
+    if isinstance(right, (list, tuple)):
+        return all(_in_list(item, left) for item in right)
+    return _in_list(right, left)
+
+
+def any_of(left: Any, right: Any):
+    """
+    Check if a value, or any value of a list, is one of the values of another
+    list.
+    """
+    right = _as_list(right)
+    return any(_in_list(item, right) for item in _as_list(left))
+
+
+def all_of(left: Any, right: Any):
+    """
+    Check if a list has all the values of another list.
+    """
+    left = _as_list(left)
+    right = _as_list(right)
+    if not left or not right:
+        return False
+    return all(_in_list(item, left) for item in right)
+
+
+def none_of(left: Any, right: Any):
+    """
+    Check if a value, or all the values of a list, are not in another list.
+    """
+    return not any_of(left, right)
+
+
+def _arithmetic_operand(value: Any):
+    value = to_number(value)
+    if value is None or value == "":
+        return 0
+    return value
+
+
+def add(left: Any, right: Any):
+    """
+    Add two numbers, or join strings if either value is not numeric.
+    """
+    left_number = _arithmetic_operand(left)
+    right_number = _arithmetic_operand(right)
+    if isinstance(left_number, str) or isinstance(right_number, str):
+        left = "" if left is None else left
+        right = "" if right is None else right
+        return f"{left}{right}"
+    return left_number + right_number
+
+
+# Integer powers whose result would have more bits than this are calculated
+# with floats.
+MAX_POWER_BITS = 1024
+
+
+def power(left: Any, right: Any):
+    """
+    Raise a number to a power. Integer powers with large results are
+    calculated with floats, as in JavaScript, so their cost doesn't depend on
+    the size of the result, and results too large for a float are infinite.
+    """
+    if (
+        isinstance(left, int)
+        and isinstance(right, int)
+        and abs(left).bit_length() * abs(right) > MAX_POWER_BITS
+    ):
+        try:
+            left = float(left)
+        except OverflowError:
+            left = math.copysign(math.inf, left)
+    try:
+        return left**right
+    except OverflowError:
+        negative = left < 0 and isinstance(right, int) and right % 2 == 1
+        return -math.inf if negative else math.inf
+
+
+def _is_operand(value: Any):
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _numeric(operation: Callable[[Any, Any], Any]):
+    def calculate(left: Any, right: Any):
+        left = _arithmetic_operand(left)
+        right = _arithmetic_operand(right)
+        # Only numbers are calculated. Python would repeat text and lists, so
+        # answers could build values of any size.
+        if not _is_operand(left) or not _is_operand(right):
+            return None
+        try:
+            return operation(left, right)
+        except ZeroDivisionError:
+            return None
+
+    return calculate
+
+
+BINARY_OPERATIONS = {
+    "==": equals,
+    "!=": lambda left, right: not equals(left, right),
+    "<": _ordering(lambda left, right: left < right),
+    "<=": _ordering(lambda left, right: left <= right),
+    ">": _ordering(lambda left, right: left > right),
+    ">=": _ordering(lambda left, right: left >= right),
+    "contains": contains,
+    "notcontains": lambda left, right: not contains(left, right),
+    "anyof": any_of,
+    "allof": all_of,
+    "noneof": none_of,
+    "+": add,
+    "-": _numeric(lambda left, right: left - right),
+    "*": _numeric(lambda left, right: left * right),
+    "/": _numeric(lambda left, right: left / right),
+    "%": _numeric(lambda left, right: left % right),
+    "^": _numeric(power),
+}
+
+
+def _numbers(values: Any):
+    """
+    Get all the numbers from a list of arguments, flattening lists.
+    """
+    numbers = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            numbers.extend(_numbers(value))
+            continue
+        value = to_number(value)
+        if _is_number(value):
+            numbers.append(value)
+    return numbers
+
+
+def _array_values(items: Any, name: str):
+    values = []
+    for item in _as_list(items):
+        if isinstance(item, dict):
+            value = item.get(name)
+            if not is_empty(value):
+                values.append(value)
+    return values
+
+
+def _sum(*values: Any):
+    return sum(_numbers(values))
+
+
+def _max(*values: Any):
+    numbers = _numbers(values)
+    return max(numbers) if numbers else None
+
+
+def _min(*values: Any):
+    numbers = _numbers(values)
+    return min(numbers) if numbers else None
+
+
+def _avg(*values: Any):
+    numbers = _numbers(values)
+    return sum(numbers) / len(numbers) if numbers else 0
+
+
+# Precisions of round() and trunc() are clamped to this many digits, so their
+# cost doesn't depend on the answers.
+MAX_PRECISION = 15
+
+
+def _precision(precision: Any):
+    precision = int(to_number(precision) or 0)
+    return max(-MAX_PRECISION, min(precision, MAX_PRECISION))
+
+
+def _round(value: Any, precision: Any = 0):
+    value = to_number(value)
+    if not _is_number(value):
+        return None
+    return round(value, _precision(precision))
+
+
+def _trunc(value: Any, precision: Any = 0):
+    value = to_number(value)
+    if not _is_number(value):
+        return None
+    factor = 10 ** _precision(precision)
+    return int(value * factor) / factor
+
+
+def _today(days: Any = 0):
+    return datetime.date.today() + datetime.timedelta(days=int(to_number(days) or 0))
+
+
+def _current_date():
+    return datetime.datetime.now()
+
+
+def _date_part(part: str):
+    def get(value: Any = None):
+        date = _current_date() if value is None else to_date(value)
+        if date is None:
+            return None
+        if part == "weekday":
+            return date.isoweekday() % 7
+        return getattr(date, part)
+
+    return get
+
+
+def _add_months(date: datetime.date, months: int):
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    day = date.day
+    while True:
+        try:
+            return date.replace(year=year, month=month, day=day)
+        except ValueError:
+            day -= 1
+
+
+def _months_between(start: datetime.date, end: datetime.date):
+    months = (end.year - start.year) * 12 + end.month - start.month
+    if end.day < start.day:
+        months -= 1
+    return months
+
+
+def _date_diff(start: Any, end: Any, kind: str = "days"):
+    start, end = to_date(start), to_date(end)
+    if start is None or end is None:
+        return None
+    if isinstance(start, datetime.datetime):
+        start = start.date()
+    if isinstance(end, datetime.datetime):
+        end = end.date()
+    kind = str(kind).lower()
+    if kind == "years":
+        return _months_between(start, end) // 12
+    if kind == "months":
+        return _months_between(start, end)
+    return (end - start).days
+
+
+def _date_add(date: Any, amount: Any, kind: str = "days"):
+    date = to_date(date)
+    amount = to_number(amount)
+    if date is None or not _is_number(amount):
+        return None
+    kind = str(kind).lower()
+    if kind == "years":
+        return _add_months(date, int(amount) * 12)
+    if kind == "months":
+        return _add_months(date, int(amount))
+    return date + datetime.timedelta(days=amount)
+
+
+def _age(birth_date: Any):
+    birth_date = to_date(birth_date)
+    if birth_date is None:
+        return None
+    if isinstance(birth_date, datetime.datetime):
+        birth_date = birth_date.date()
+    return _months_between(birth_date, datetime.date.today()) // 12
+
+
+def _sum_in_array(items: Any, name: str):
+    return _sum(_array_values(items, name))
+
+
+def _max_in_array(items: Any, name: str):
+    return _max(_array_values(items, name))
+
+
+def _min_in_array(items: Any, name: str):
+    return _min(_array_values(items, name))
+
+
+def _avg_in_array(items: Any, name: str):
+    return _avg(_array_values(items, name))
+
+
+def _count_in_array(items: Any, name: str):
+    return len(_array_values(items, name))
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "age": _age,
+    "avg": _avg,
+    "avginarray": _avg_in_array,
+    "countinarray": _count_in_array,
+    "currentdate": _current_date,
+    "dateadd": _date_add,
+    "datediff": _date_diff,
+    "day": _date_part("day"),
+    "getdate": to_date,
+    "isdisplaymode": lambda: False,
+    "iscontainerready": lambda *args: True,
+    "max": _max,
+    "maxinarray": _max_in_array,
+    "min": _min,
+    "mininarray": _min_in_array,
+    "month": _date_part("month"),
+    "round": _round,
+    "sum": _sum,
+    "suminarray": _sum_in_array,
+    "today": _today,
+    "trunc": _trunc,
+    "weekday": _date_part("weekday"),
+    "year": _date_part("year"),
+}
+
+
+def register_function(name: str, function: Callable[..., Any]):
+    """
+    Add a function that can be called from expressions, like the custom
+    functions registered with the SurveyJS `FunctionFactory`. Function names
+    are not case sensitive. The function gets the evaluated arguments.
+
+    :param name:
+        The name used in expressions.
+    :param function:
+        The Python function.
+    """
+    FUNCTIONS[name.lower()] = function
+    compile_expression.cache_clear()
+
+
+def split_path(name: str):
+    """
+    Split a variable name like `orders[0].quantity` into its parts.
+
+    :Returns:
+        A tuple of keys and list indexes.
+    """
+    parts = []
+    for index, key in PATH_PATTERN.findall(name):
+        parts.append(int(index) if index else key)
+    return tuple(parts)
+
+
+def _get_key(values: Any, key: str):
+    if not isinstance(values, Mapping):
+        return None
+    value = values.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    # SurveyJS variable names are not case sensitive. Mappings that are looked
+    # up many times, like the answers seen by the form logic, can index their
+    # lower case names instead of being scanned for each lookup.
+    lower = key.lower()
+    get_folded = getattr(values, "get_folded", None)
+    if get_folded is not None:
+        return get_folded(lower)
+    for name, value in values.items():
+        if isinstance(name, str) and name.lower() == lower:
+            return value
+    return None
+
+
+def resolve(values: Mapping, name: str, path: tuple = None):
+    """
+    Get the value of a variable. The full name is looked up first, so answers
+    with dots in their names work; otherwise the name is followed as a path
+    into nested answers.
+
+    :param values:
+        The answers, by question name.
+    :param name:
+        The variable name, without braces.
+    :param path:
+        The variable name, already split with :func:`split_path`.
+
+    :Returns:
+        The value, or :data:`None` if it is missing.
+    """
+    value = _get_key(values, name)
+    if value is not None:
+        return value
+    if path is None:
+        path = split_path(name)
+    if len(path) < 2:
+        return None
+    value = values
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(value, (list, tuple)) or part >= len(value):
+                return None
+            value = value[part]
+        else:
+            value = _get_key(value, part)
+            if value is None:
+                return None
+    return value
+
+
+def _constant(value: Any):
+    return lambda values: value
+
+
+class Compiler(object):
+    """
+    Compiles expression trees into Python closures. Operations on constants
+    are calculated when compiling. The compiled nodes are counted, and trees
+    with more than `MAX_EXPRESSION_STEPS` nodes are rejected.
+    """
+
+    def __init__(self):
+        self.variables = []
+        self.steps = 0
+
+    def compile(self, node: tuple):
+        """
+        Compile an expression tree node.
+
+        :Returns:
+            A (function, is_constant, constant_value) tuple.
+        """
+        self.steps += 1
+        if self.steps > MAX_EXPRESSION_STEPS:
+            raise ExpressionError("The expression is too complex")
+        method = getattr(self, f"compile_{node[0]}")
+        return method(*node[1:])
+
+    def compile_constant(self, value: Any):
+        return _constant(value), True, value
+
+    def compile_variable(self, name: str):
+        self.variables.append(name)
+        path = split_path(name)
+        if len(path) == 1 and isinstance(path[0], str):
+
+            def get(values: Mapping):
+                value = values.get(name)
+                if value is None:
+                    return _get_key(values, name)
+                return value
+
+        else:
+
+            def get(values: Mapping):
+                return resolve(values, name, path)
+
+        return get, False, None
+
+    def _fold(self, function: Callable[..., Any], *operands: tuple):
+        """
+        Calculate an operation on constant operands when compiling. Errors are
+        left for evaluation time.
+        """
+        if all(operand[1] for operand in operands):
+            try:
+                value = function(*[operand[2] for operand in operands])
+            except Exception:
+                return None
+            return _constant(value), True, value
+        return None
+
+    def compile_array(self, items: list):
+        compiled = [self.compile(item) for item in items]
+        folded = self._fold(lambda *values: list(values), *compiled)
+        if folded:
+            return folded
+        functions = [item[0] for item in compiled]
+        return (
+            (lambda values: [function(values) for function in functions]),
+            False,
+            None,
+        )
+
+    def compile_not(self, operand: tuple):
+        compiled = self.compile(operand)
+        folded = self._fold(lambda value: not is_true(value), compiled)
+        if folded:
+            return folded
+        function = compiled[0]
+        return (lambda values: not is_true(function(values))), False, None
+
+    def compile_unary(self, operator: str, operand: tuple):
+        compiled = self.compile(operand)
+        if operator == "+":
+            operation = _arithmetic_operand
+        else:
+
+            def operation(value: Any):
+                return -_arithmetic_operand(value)
+
+        folded = self._fold(operation, compiled)
+        if folded:
+            return folded
+        function = compiled[0]
+        return (lambda values: operation(function(values))), False, None
+
+    def compile_postfix(self, operator: str, operand: tuple):
+        compiled = self.compile(operand)
+        if operator == "empty":
+            operation = is_empty
+        else:
+
+            def operation(value: Any):
+                return not is_empty(value)
+
+        folded = self._fold(operation, compiled)
+        if folded:
+            return folded
+        function = compiled[0]
+        return (lambda values: operation(function(values))), False, None
+
+    def compile_binary(self, operator: str, left: tuple, right: tuple):
+        operation = BINARY_OPERATIONS[operator]
+        left = self.compile(left)
+        right = self.compile(right)
+        folded = self._fold(operation, left, right)
+        if folded:
+            return folded
+        left_function = left[0]
+        right_function = right[0]
+        if right[1]:
+            right_value = right[2]
+            return (
+                lambda values: operation(left_function(values), right_value),
+                False,
+                None,
+            )
+        return (
+            lambda values: operation(left_function(values), right_function(values)),
+            False,
+            None,
+        )
+
+    def compile_and(self, left: tuple, right: tuple):
+        left = self.compile(left)
+        right = self.compile(right)
+        left_function = left[0]
+        right_function = right[0]
+        folded = self._fold(
+            lambda left, right: is_true(left) and is_true(right), left, right
+        )
+        if folded:
+            return folded
+        return (
+            lambda values: is_true(left_function(values))
+            and is_true(right_function(values)),
+            False,
+            None,
+        )
+
+    def compile_or(self, left: tuple, right: tuple):
+        left = self.compile(left)
+        right = self.compile(right)
+        left_function = left[0]
+        right_function = right[0]
+        folded = self._fold(
+            lambda left, right: is_true(left) or is_true(right), left, right
+        )
+        if folded:
+            return folded
+        return (
+            lambda values: is_true(left_function(values))
+            or is_true(right_function(values)),
+            False,
+            None,
+        )
+
+    def compile_call(self, name: str, arguments: list):
+        compiled = [self.compile(argument) for argument in arguments]
+        functions = [argument[0] for argument in compiled]
+        if name == "iif":
+            # Only the selected branch is evaluated.
+            if len(functions) != 3:
+                raise ExpressionError("iif() takes three arguments")
+            condition, when_true, when_false = functions
+
+            def iif(values: Mapping):
+                if is_true(condition(values)):
+                    return when_true(values)
+                return when_false(values)
+
+            return iif, False, None
+        function = FUNCTIONS.get(name)
+        if function is None:
+            raise ExpressionError(f"Unknown function {name!r}")
+        return (
+            lambda values: function(*[argument(values) for argument in functions]),
+            False,
+            None,
+        )
+
+
+class Expression(object):
+    """
+    A compiled expression. Call it with a mapping of answers to get its value.
+
+    :param text:
+        The expression text.
+    """
+
+    __slots__ = ("text", "evaluate", "variables", "constant", "steps")
+
+    def __init__(self, text: str):
+        self.text = text
+        compiler = Compiler()
+        try:
+            evaluate, constant, value = compiler.compile(parse(text))
+        except RecursionError:
+            raise ExpressionError("The expression is too complex") from None
+        #: The compiled function, which takes the answers mapping.
+        self.evaluate = evaluate
+        #: The names of all the variables used by the expression.
+        self.variables = tuple(dict.fromkeys(compiler.variables))
+        #: :data:`True` if the expression does not use any answers.
+        self.constant = constant
+        #: The number of compiled operations, the cost of one evaluation
+        #: without counting the items of arrays passed to functions.
+        self.steps = compiler.steps
+
+    def __call__(self, values: Mapping = None):
+        return self.evaluate({} if values is None else values)
+
+    def __repr__(self):
+        return f"Expression({self.text!r})"
+
+    def __reduce__(self):
+        return (compile_expression, (self.text,))
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression: str) -> Expression:
+    """
+    Compile a SurveyJS expression. Compiled expressions are cached, so each
+    expression is only compiled once, no matter how many questions or forms
+    use it.
+
+    :param expression:
+        The expression text.
+
+    :Returns:
+        The compiled :class:`Expression`.
+
+    :Raises:
+        ExpressionError if the expression is not valid.
+    """
+    return Expression(expression)
+
+
+def evaluate(expression: str, values: Mapping = None):
+    """
+    Evaluate a SurveyJS expression with a set of answers.
+
+    :param expression:
+        The expression text.
+    :param values:
+        The answers, by question name.
+
+    :Returns:
+        The value of the expression.
+    """
+    return compile_expression(expression)(values)
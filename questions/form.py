@@ -1,8 +1,14 @@
+import hashlib
 import json
-import re
+import threading
 
+from collections import OrderedDict
+from types import MappingProxyType
 from typing import Any
 from typing import Dict
+from typing import Iterable
+from typing import Mapping
+from typing import Sequence
 from typing import Type
 
 try:
@@ -10,42 +16,428 @@ try:
 except ImportError:  # pragma: NO COVER
     from typing_extensions import Literal
 
+from . import hooks
+from .logic import build_logic
 from .questions import Page
 from .questions import PanelBlock
 from .questions import PanelDynamicBlock
 from .questions import Question
 from .questions import QUESTION_NAMES_TO_TYPES
 from .questions import Survey
-from .settings import INCLUDE_KEYS
+from .serializers import dumps
+from .serializers import iter_json as survey_iter_json
+from .serializers import locale_key
+from .serializers import localize
+from .serializers import to_data as survey_to_data
+from .serializers import to_json as survey_to_json
+from .serializers import translation_locales
+from .settings import ASYNC_VALIDATION_CONCURRENCY
+from .settings import ASYNC_VALIDATION_TIMEOUT
+from .settings import COMPILED_SURVEY_CACHE_SIZE
+from .settings import RENDER_CACHE_SIZE
+from .settings import LAZY_PAGE_LOADING_HTML
+from .settings import LAZY_PAGE_PREFIX
+from .settings import LOCALES
 from .settings import SURVEY_JS_CDN
 from .settings import SURVEY_JS_PLATFORMS
 from .settings import SURVEY_JS_THEMES
 from .settings import SURVEY_JS_WIDGETS
+from .settings import VALIDATION_MAX_STEPS
+from .settings import VALIDATION_TIME_LIMIT
+from .columns import validate_columns
 from .templates import get_form_page
 from .templates import get_platform_js_resources
 from .templates import get_survey_js
 from .templates import get_theme_css_resources
+from .templates import iter_form_page
+from .templates import iter_survey_js
 from .utils import get_params_for_repr
-from .validators import call_validator
+from .utils import RENAMED_FIELDS
+from .utils import to_camel_case
 from .validators import ValidationError
+from .validators import ValidationPlan
+from .validators import ValidationState
+from .validators import validate_many
+from .validators import validator_from_json
 
 
-RENAMED_FIELDS = {
-    "type": "kind",
-    "isAllRowRequired": "all_rows_required",
-    "format": "expression_format",
-    "max": "max_value",
-    "min": "min_value",
-    "isRequired": "required",
-}
+# Kinds of declared form elements, as stored in the form element registry.
+QUESTION_ELEMENT = 0
+PAGE_ELEMENT = 1
+PANEL_ELEMENT = 2
 
 
-def to_camel_case(name):
-    name = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
-    return re.sub("([a-z0-9])([A-Z])", r"\1_\2", name).lower()
+class CompiledSurvey(object):
+    """
+    The result of walking a form definition once: the SurveyJS survey object,
+    the resources required by the form and a flat mapping of all question
+    elements. Compiled surveys are cached per form class and shared by all
+    instances of that class which use the same configuration. A compiled survey
+    is never changed after it is built, so it can be used by many threads at
+    once. The JSON caches are only ever filled with the same values.
+
+    :param survey:
+        The generated Survey object.
+    :param extra_js:
+        Extra JS resources required by the form questions.
+    :param extra_css:
+        Extra CSS resources required by the form questions.
+    :param form_elements:
+        Dictionary of all question elements in the form, by name. Dynamic
+        panels are single elements, since their questions are answered once
+        per panel.
+    :param required_js:
+        Required JS resources needed to run SurveyJS on the form platform.
+    :param required_css:
+        Required CSS resources needed to run SurveyJS with the form theme.
+    """
+
+    def __init__(
+        self,
+        survey,
+        extra_js,
+        extra_css,
+        form_elements,
+        required_js=None,
+        required_css=None,
+    ):
+        self.survey = survey
+        self.extra_js = extra_js
+        self.extra_css = extra_css
+        self.form_elements = MappingProxyType(form_elements)
+        self.required_js = required_js or []
+        self.required_css = required_css or []
+        self.js = self.required_js + self.extra_js
+        self.css = self.required_css + self.extra_css
+        self.pages = {page.name: page for page in survey.pages}
+        self._json = {}
+        self._pages_json = {}
+        self._fingerprint = None
+        self._validation_plan = None
+        self._page_plans = {}
+        self._rendered = OrderedDict()
+        self._rendered_lock = threading.Lock()
+        self._locales = None
+
+    def locale_key(self, locale: str = None):
+        """
+        Get the key of a locale in the JSON caches. Locales that pick the same
+        translations from the form texts share their cached JSON, so locales
+        taken from request headers can't grow the caches without limit.
+
+        :param locale:
+            The requested locale, or :data:`None`.
+
+        :Returns:
+            The cache key.
+        """
+        if not locale:
+            return None
+        if self._locales is None:
+            self._locales = translation_locales(self.survey)
+        return locale_key(locale, self._locales)
+
+    def _localized(self, model, locale: str = None):
+        """
+        Surveys sliced to one of the SurveyJS locales also get that locale
+        set, so that the SurveyJS texts use the same language.
+        """
+        if locale in LOCALES and isinstance(model, Survey):
+            model = model.copy(update={"locale": locale})
+        return model
+
+    def to_json(
+        self,
+        exclude_defaults: bool = False,
+        canonical: bool = False,
+        locale: str = None,
+    ):
+        """
+        Serialize the compiled survey to SurveyJS JSON. The JSON is generated
+        the first time it is needed and reused afterwards.
+
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param canonical:
+            Set to :data:`True` to sort the keys and leave out extra whitespace.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale. Each locale gets its own cached JSON, shared by the
+            locales that pick the same translations.
+        """
+        key = (exclude_defaults, canonical, self.locale_key(locale))
+        form_json = self._json.get(key)
+        if form_json is None:
+            survey = self._localized(self.survey, locale)
+            form_json = survey_to_json(survey, exclude_defaults, canonical, locale)
+            self._json[key] = form_json
+        return form_json
+
+    def iter_json(self, exclude_defaults: bool = False, locale: str = None):
+        """
+        Serialize the compiled survey to SurveyJS JSON in chunks. If the JSON
+        was already generated, it is returned in one chunk.
+
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+        """
+        form_json = self._json.get((exclude_defaults, False, self.locale_key(locale)))
+        if form_json is not None:
+            return iter([form_json])
+        survey = self._localized(self.survey, locale)
+        return survey_iter_json(survey, exclude_defaults, locale)
+
+    def page_json(self, name: str, exclude_defaults: bool = False, locale: str = None):
+        """
+        Serialize a single page of the compiled survey to SurveyJS JSON. The
+        JSON for each page is generated the first time it is needed.
+
+        :param name:
+            The name of the page.
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+        """
+        key = (name, exclude_defaults, self.locale_key(locale))
+        page_json = self._pages_json.get(key)
+        if page_json is None:
+            page_json = survey_to_json(
+                self.pages[name], exclude_defaults, locale=locale
+            )
+            self._pages_json[key] = page_json
+        return page_json
+
+    def shell_json(self, exclude_defaults: bool = False, locale: str = None):
+        """
+        Serialize the compiled survey to SurveyJS JSON, including the questions
+        for the first page only. The questions for all other pages are replaced
+        with a placeholder, which is used to load them when needed.
+
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+        """
+        key = ("shell", exclude_defaults, self.locale_key(locale))
+        form_json = self._json.get(key)
+        if form_json is None:
+            survey = self._localized(self.survey, locale)
+            data = survey_to_data(
+                survey.copy(update={"pages": []}), exclude_defaults, locale
+            )
+            loading_html = survey.loading_html or LAZY_PAGE_LOADING_HTML
+            if locale and isinstance(loading_html, dict):
+                loading_html = localize(loading_html, locale)
+            pages = []
+            for index, page in enumerate(survey.pages):
+                if index == 0:
+                    pages.append(survey_to_data(page, exclude_defaults, locale))
+                    continue
+                page_data = survey_to_data(
+                    page.copy(update={"questions": []}), exclude_defaults, locale
+                )
+                page_data["questions"] = [
+                    {
+                        "type": "html",
+                        "name": f"{LAZY_PAGE_PREFIX}{page.name}",
+                        "html": loading_html,
+                    }
+                ]
+                pages.append(page_data)
+            data["pages"] = pages
+            form_json = dumps(data)
+            self._json[key] = form_json
+        return form_json
+
+    @property
+    def validation_plan(self):
+        """
+        The :class:`questions.validators.ValidationPlan` for the form
+        questions, with the conditional logic of the form. It is built the
+        first time it is needed.
+        """
+        if self._validation_plan is None:
+            survey = self.survey
+            logic = build_logic(
+                survey.pages,
+                survey.calculated_values,
+                survey.clear_invisible_values != "none",
+            )
+            self._validation_plan = ValidationPlan(self.form_elements, logic)
+        return self._validation_plan
+
+    def page_plan(self, name: str):
+        """
+        Get the :class:`questions.validators.ValidationPlan` for the questions
+        of one page, including the questions inside its panels. The plan uses
+        the conditional logic of the whole form. Page plans are built the
+        first time they are needed.
+
+        :param name:
+            The page name.
+
+        :Returns:
+            The validation plan.
+
+        :Raises:
+            KeyError if the form has no page with that name.
+        """
+        plan = self._page_plans.get(name)
+        if plan is None:
+            elements = {}
+            pending = list(self.pages[name].questions)
+            while pending:
+                element = pending.pop(0)
+                if element.kind == "panel":
+                    pending[:0] = element.elements
+                elif element.name in self.form_elements:
+                    elements[element.name] = self.form_elements[element.name]
+            plan = ValidationPlan(elements, self.validation_plan.logic)
+            self._page_plans[name] = plan
+        return plan
+
+    def fingerprint(self):
+        """
+        A hash of the canonical form JSON and the form resources. It is
+        computed once, the first time it is requested.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(self.to_json(canonical=True).encode("utf-8"))
+            for resource in self.js + self.css:
+                digest.update(b"\n" + resource.encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+
+class SurveyBuild(object):
+    """
+    The state used while a form is being compiled: the resources and question
+    elements found so far. Every build gets its own state, so concurrent
+    builds of the same form never share anything.
+
+    :param required_js:
+        Required JS resources needed to run SurveyJS on the form platform.
+    :param required_css:
+        Required CSS resources needed to run SurveyJS with the form theme.
+    """
+
+    def __init__(self, required_js, required_css):
+        self.extra_js = []
+        self.extra_css = []
+        self.form_elements = {}
+        self.required_js = required_js
+        self.required_css = required_css
+
+
+class RenderResult(object):
+    """
+    Everything produced by rendering a form once. Callers that need more than
+    one of the outputs (for example, the JSON and the resource lists for their
+    own page templates) can keep this object instead of rendering again.
+
+    :param title:
+        The form title.
+    :param json:
+        The SurveyJS JSON for the form.
+    :param js:
+        Combined JS resources for the form.
+    :param css:
+        Combined CSS resources for the form.
+    :param survey_js:
+        The SurveyJS initialization code for the form platform.
+    :param html:
+        The full HTML page showing the form.
+    """
+
+    def __init__(self, title, json, js, css, survey_js, html):
+        self.title = title
+        self.json = json
+        self.js = js
+        self.css = css
+        self.survey_js = survey_js
+        self.html = html
+
+    def __str__(self):
+        return self.html
+
+
+class FormMeta(type):
+    """
+    Metaclass for forms. Gives each form class its own compiled survey cache,
+    and keeps track of changes to form class attributes, so that cached
+    surveys can be discarded when a form definition changes. Each class has
+    its own generation number, so changing one class only discards the
+    surveys built from it, its subclasses, and the forms that use it as a page
+    or panel. Changes to form elements also update the element registry of the
+    class and of all its subclasses.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        type.__setattr__(cls, "_compiled_surveys", OrderedDict())
+        type.__setattr__(cls, "_compiled_surveys_lock", threading.Lock())
+        type.__setattr__(cls, "_generation", 0)
+
+    def __setattr__(cls, name, value):
+        super().__setattr__(name, value)
+        cls._elements_changed(name, value)
+        type.__setattr__(cls, "_generation", cls.__dict__["_generation"] + 1)
+
+    def __delattr__(cls, name):
+        super().__delattr__(name)
+        cls._elements_changed(name)
+        type.__setattr__(cls, "_generation", cls.__dict__["_generation"] + 1)
+
+    def _definition(cls):
+        """
+        Get the form classes that the survey of this class is built from, its
+        bases and the classes of its pages and panels, with their generations.
+        """
+        definition = []
+        seen = set()
+        pending = [cls]
+        while pending:
+            form_class = pending.pop()
+            for base in form_class.__mro__:
+                if isinstance(base, FormMeta) and base not in seen:
+                    seen.add(base)
+                    definition.append((base, base.__dict__["_generation"]))
+            for element, kind in form_class._elements:
+                if kind != QUESTION_ELEMENT:
+                    pending.append(element.form.__class__)
+        return tuple(definition)
 
+    def _elements_changed(cls, name, value=None):
+        if _element_kind(value) is None and name not in cls._element_names:
+            return
+        pending = [cls]
+        while pending:
+            form_class = pending.pop()
+            form_class._collect_elements()
+            pending.extend(form_class.__subclasses__())
 
-class Form(object):
+
+def _element_kind(element: Any):
+    if isinstance(element, Question):
+        return QUESTION_ELEMENT
+    if isinstance(element, FormPage):
+        return PAGE_ELEMENT
+    if isinstance(element, FormPanel):
+        return PANEL_ELEMENT
+    return None
+
+
+class Form(object, metaclass=FormMeta):
     """
     This is the base class used for creating user-defined forms. In addition to
     setting up the form configuration and performing validation, it generates
@@ -75,6 +467,37 @@ class Form(object):
 
     default_params = {}
 
+    # Registry of declared elements, as (element, kind) tuples.
+    _elements = ()
+    _element_names = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._collect_elements()
+
+    @classmethod
+    def _collect_elements(cls):
+        """
+        Collect the questions, pages and panels declared on this form class
+        and its base classes, in declaration order. Inherited elements come
+        first, and an element that is redefined in a subclass keeps the
+        position of the original. Setting an inherited element name to any
+        other value removes the element from the subclass. Questions without
+        a name are named after their attribute.
+        """
+        elements = {}
+        for form_class in reversed(cls.__mro__):
+            for name, element in form_class.__dict__.items():
+                kind = _element_kind(element)
+                if kind is None:
+                    elements.pop(name, None)
+                    continue
+                if kind == QUESTION_ELEMENT and element.name == "":
+                    element.name = name
+                elements[name] = (element, kind)
+        type.__setattr__(cls, "_elements", tuple(elements.values()))
+        type.__setattr__(cls, "_element_names", frozenset(elements))
+
     @classmethod
     def set_resource_url(cls, url: str):
         cls.questions_resource_url = url
@@ -101,9 +524,6 @@ class Form(object):
         self.resource_url = resource_url
         self.params = self.default_params.copy()
         self.params.update(params)
-        self._extra_js = []
-        self._extra_css = []
-        self._form_elements = {}
 
     def __call__(self, form_data=None):
         return self.render_html(form_data=form_data)
@@ -136,7 +556,11 @@ class Form(object):
         :Returns:
             A new Python Type that is a subclass of Form.
         """
-        NewForm = type(name, (cls,), {})
+        NewForm = type(
+            name,
+            (cls,),
+            {"default_params": cls.default_params.copy(), "_generated": True},
+        )
         form_json = json.loads(form_json)
         elements = form_json.items()
         cls._add_type_elements(NewForm, elements)
@@ -154,7 +578,7 @@ class Form(object):
                     page_title = page.get("title", "Page")
                     page_name = page.get("name", page_title)
                     page_name = page_name[0].upper() + page_name[1:]
-                    NewPage = type(page_name, (cls,), {})
+                    NewPage = type(page_name, (cls,), {"_generated": True})
                     page_items = {}
                     page_params = {}
                     for key, value in page.items():
@@ -182,6 +606,11 @@ class Form(object):
                             else:
                                 new_key = to_camel_case(key)
                             question_params[new_key] = value
+                        if "validators" in question_params:
+                            question_params["validators"] = [
+                                validator_from_json(validator)
+                                for validator in question_params["validators"]
+                            ]
                         new_element = QUESTION_NAMES_TO_TYPES[question_element["type"]](
                             **question_params
                         )
@@ -190,7 +619,7 @@ class Form(object):
                         panel_title = question_element.get("title", "Panel")
                         panel_name = question_element.get("name", panel_title)
                         panel_name = panel_name[0].upper() + panel_name[1:]
-                        Panel = type(panel_name, (cls,), {})
+                        Panel = type(panel_name, (cls,), {"_generated": True})
                         dynamic = question_element["type"] == "paneldynamic"
                         panel_items = {}
                         panel_params = {}
@@ -214,114 +643,194 @@ class Form(object):
             else:
                 NewForm.default_params[name] = element
 
+    def _cache_key(self):
+        """
+        Key for the compiled survey cache. Forms of the same class share a
+        compiled survey when all their rendering parameters match.
+        """
+        params = json.dumps(self.params, sort_keys=True, default=str)
+        return (self.theme, self.platform, self.resource_url, params)
+
+    def _compile(self):
+        """
+        Get the compiled survey for this form, building it if the cache has no
+        entry for the current form parameters, or if the definition of the
+        form class, its bases, pages or panels has changed since it was built.
+        The survey is built outside of the cache
+        lock, so two threads may build the same survey at the same time, but
+        both get an equivalent result.
+        """
+        cache = self.__class__._compiled_surveys
+        lock = self.__class__._compiled_surveys_lock
+        key = self._cache_key()
+        with lock:
+            entry = cache.get(key)
+            if entry is not None and all(
+                form_class.__dict__["_generation"] == generation
+                for form_class, generation in entry[0]
+            ):
+                cache.move_to_end(key)
+                return entry[1]
+        definition = self.__class__._definition()
+        started = hooks.start("on_construct")
+        compiled = self._build_survey()
+        hooks.finish("on_construct", started, form=self.__class__.__name__)
+        with lock:
+            cache[key] = (definition, compiled)
+            cache.move_to_end(key)
+            while len(cache) > COMPILED_SURVEY_CACHE_SIZE:
+                cache.popitem(last=False)
+        return compiled
+
     def _construct_survey(self):
+        """
+        Get the Survey object used to generate the JSON for initializing
+        SurveyJS. The survey is only built once per form class and
+        configuration; later calls reuse the compiled survey.
+        """
+        return self._compile().survey
+
+    @property
+    def _extra_js(self):
+        return self._compile().extra_js
+
+    @property
+    def _extra_css(self):
+        return self._compile().extra_css
+
+    @property
+    def _form_elements(self):
+        return self._compile().form_elements
+
+    def _build_survey(self):
         """
         Goes through all the form elements and creates a Survey object, which will
-        be used to generate the JSON for initializing SurveyJS. As a side effect,
-        populates extra CSS and JS resources. Also keeps a dictionary of all form
-        elements, used by validation and update object methods.
+        be used to generate the JSON for initializing SurveyJS, along with the
+        extra CSS and JS resources and the dictionary of all form elements. All
+        the build state is kept in a :class:`SurveyBuild`, so that the form
+        instance is never changed while building.
         """
-        self._extra_js = []
-        self._extra_css = []
-        self._form_elements = {}
+        build = SurveyBuild(self.required_js, self.required_css)
         default_page = Page(name="default")
         survey = Survey(**self.params)
         survey.pages.append(default_page)
-        self._add_elements(survey, self, top_level=True)
-        # get rid of duplicates
-        self._extra_js = list(set(self._extra_js))
-        self._extra_css = list(set(self._extra_css))
-        if self._extra_js:
-            self._extra_js.append(f"{self.resource_url}/{SURVEY_JS_WIDGETS}")
-        return survey
+        self._add_elements(build, survey, self, top_level=True)
+        # get rid of duplicates, keeping the resource order stable
+        extra_js = list(dict.fromkeys(build.extra_js))
+        extra_css = list(dict.fromkeys(build.extra_css))
+        if extra_js:
+            extra_js.append(f"{self.resource_url}/{SURVEY_JS_WIDGETS}")
+        return CompiledSurvey(
+            survey,
+            extra_js,
+            extra_css,
+            build.form_elements,
+            required_js=build.required_js,
+            required_css=build.required_css,
+        )
 
-    def _add_elements(self, survey, form, top_level=False, container_name="questions"):
+    def _add_elements(
+        self,
+        build,
+        survey,
+        form,
+        top_level=False,
+        container_name="questions",
+        form_elements=None,
+    ):
         """
         Method to put form elements inside a container. Needs to be recursive so that
-        pages and panels are properly nested.
+        pages and panels are properly nested. Questions inside dynamic panels are
+        answered once per panel, so only the dynamic panel is added to the form
+        elements.
         """
+        if form_elements is None:
+            form_elements = build.form_elements
         has_default_page = True
         extra_js = []
         extra_css = []
-        for element_name, element in form.__class__.__dict__.items():
-            if isinstance(element, (FormPage, FormPanel, Question)):
-                name = getattr(element, "name", "")
-                if name == "":
-                    element.name = element_name
-                if isinstance(element, FormPage) and top_level:
-                    if has_default_page:
-                        survey.pages = []
-                        has_default_page = False
-                    page = Page(name=name, **element.params)
-                    self._add_elements(page, element.form)
-                    survey.pages.append(page)
-                elif isinstance(element, (FormPage, FormPanel)):
-                    container = getattr(survey, container_name, None)
-                    if container is None:
-                        pages = survey.pages
-                        if len(pages) > 0:
-                            container = getattr(pages[0], container_name)
-                    if container is None:
-                        raise "Error in form definition: container not found."
-                    if element.dynamic:
-                        panel = PanelDynamicBlock(name=name, **element.params)
-                        new_container_name = "template_elements"
-                    else:
-                        panel = PanelBlock(name=name, **element.params)
-                        new_container_name = "elements"
-                    self._add_elements(
-                        panel, element.form, container_name=new_container_name
-                    )
-                    container.append(panel)
+        for element, kind in form._elements:
+            if kind == PAGE_ELEMENT and top_level:
+                if has_default_page:
+                    survey.pages = []
+                    has_default_page = False
+                page = Page(name=element.name, **element.params)
+                self._add_elements(
+                    build, page, element.form, form_elements=form_elements
+                )
+                survey.pages.append(page)
+            elif kind != QUESTION_ELEMENT:
+                container = getattr(survey, container_name, None)
+                if container is None:
+                    pages = survey.pages
+                    if len(pages) > 0:
+                        container = getattr(pages[0], container_name)
+                if container is None:
+                    raise "Error in form definition: container not found."
+                if element.dynamic:
+                    panel = PanelDynamicBlock(name=element.name, **element.params)
+                    new_container_name = "template_elements"
+                    panel_elements = {}
+                    form_elements[panel.name] = panel
                 else:
-                    self._form_elements[element.name] = element
-                    if element.extra_js != []:
-                        for js in element.extra_js:
-                            url = js
-                            if self.resource_url != SURVEY_JS_CDN:
-                                filename = js.split("/")[-1]
-                                url = f"{self.resource_url}/{filename}"
-                            if (
-                                url not in extra_js
-                                and url not in self._extra_js
-                                and url not in self.required_js
-                            ):
-                                extra_js.append(url)
-                    if element.extra_css != []:
-                        for css in element.extra_css:
-                            url = css
-                            if self.resource_url != SURVEY_JS_CDN:
-                                filename = css.split("/")[-1]
-                                url = f"{self.resource_url}/{filename}"
-                            if (
-                                url not in extra_css
-                                and url not in self._extra_css
-                                and url not in self.required_css
-                            ):
-                                extra_css.append(url)
-                    if top_level:
-                        container = survey.pages[0].questions
-                    else:
-                        container = getattr(survey, container_name)
-                    container.append(element)
-        self._extra_js = self._extra_js + extra_js
-        self._extra_css = self._extra_css + extra_css
+                    panel = PanelBlock(name=element.name, **element.params)
+                    new_container_name = "elements"
+                    panel_elements = form_elements
+                self._add_elements(
+                    build,
+                    panel,
+                    element.form,
+                    container_name=new_container_name,
+                    form_elements=panel_elements,
+                )
+                container.append(panel)
+            else:
+                form_elements[element.name] = element
+                if element.extra_js != []:
+                    for js in element.extra_js:
+                        url = js
+                        if self.resource_url != SURVEY_JS_CDN:
+                            filename = js.split("/")[-1]
+                            url = f"{self.resource_url}/{filename}"
+                        if (
+                            url not in extra_js
+                            and url not in build.extra_js
+                            and url not in build.required_js
+                        ):
+                            extra_js.append(url)
+                if element.extra_css != []:
+                    for css in element.extra_css:
+                        url = css
+                        if self.resource_url != SURVEY_JS_CDN:
+                            filename = css.split("/")[-1]
+                            url = f"{self.resource_url}/{filename}"
+                        if (
+                            url not in extra_css
+                            and url not in build.extra_css
+                            and url not in build.required_css
+                        ):
+                            extra_css.append(url)
+                if top_level:
+                    container = survey.pages[0].questions
+                else:
+                    container = getattr(survey, container_name)
+                container.append(element)
+        build.extra_js.extend(extra_js)
+        build.extra_css.extend(extra_css)
 
     @property
     def extra_js(self):
         """
         Any extra JS resources required by the form's question types.
         """
-        self._construct_survey()
-        return self._extra_js
+        return self._compile().extra_js
 
     @property
     def extra_css(self):
         """
         Any extra CSS resources required by the form's question types.
         """
-        self._construct_survey()
-        return self._extra_css
+        return self._compile().extra_css
 
     @property
     def required_js(self):
@@ -342,102 +851,618 @@ class Form(object):
         """
         Combined JS resources for this form.
         """
-        return self.required_js + self.extra_js
+        return self._compile().js
 
     @property
     def css(self):
         """
         Combined CSS resources for this form.
         """
-        return self.required_css + self.extra_css
+        return self._compile().css
 
-    def to_json(self):
+    def to_json(
+        self,
+        exclude_defaults: bool = False,
+        canonical: bool = False,
+        locale: str = None,
+    ):
         """
         Convert the form to JSON, in the SurveyJS format.
 
+        :param exclude_defaults:
+            Set to :data:`True` to leave out all properties that have their
+            default values, which makes the JSON considerably smaller.
+            Properties whose Questions defaults differ from the SurveyJS
+            defaults, like `hide_number`, are always kept, so SurveyJS renders
+            the same form.
+        :param canonical:
+            Set to :data:`True` to get canonical JSON, with sorted keys and no
+            extra whitespace. The same form definition always generates the
+            same canonical JSON.
+        :param locale:
+            If given, all translated texts are replaced with their text for
+            this locale. A regional locale, like `pt-br`, falls back to its
+            language, and then to the default texts.
+
         :Returns:
             JSON object with the form definition.
         """
-        survey = self._construct_survey()
-        return survey.json(by_alias=True, include=INCLUDE_KEYS)
+        started = hooks.start("on_serialize")
+        form_json = self._compile().to_json(exclude_defaults, canonical, locale)
+        hooks.finish("on_serialize", started, form=self.__class__.__name__, kind="json")
+        return form_json
 
-    def render_js(self, form_data: Dict[str, Any] = None):
+    def iter_json(self, exclude_defaults: bool = False, locale: str = None):
         """
-        Generate the SurveyJS initialization code for the chosen platform.
+        Convert the form to JSON in chunks, page by page and question by
+        question. Use this instead of :meth:`to_json` to stream very large
+        forms without building the full JSON string.
 
-        :param form_data: answers to show on the form for each
-            question (for edit forms).
+        :param exclude_defaults:
+            Set to :data:`True` to leave out all properties that have their
+            default values.
+        :param locale:
+            If given, all translated texts are replaced with their text for
+            this locale.
 
         :Returns:
-            String with the generated javascript.
+            A generator of JSON string chunks.
         """
+        yield from self._compile().iter_json(exclude_defaults, locale)
+
+    def _title(self, title=None, locale: str = None):
+        if title is None:
+            title = self.params.get("title", self.name)
+        if locale and isinstance(title, dict):
+            title = localize(title, locale)
+        return title
+
+    def fingerprint(
+        self,
+        title: str = None,
+        form_data: Dict[str, Any] = None,
+        locale: str = None,
+    ):
+        """
+        Get a content hash for the rendered form. The hash only changes when
+        the form definition, its resources or the rendering parameters change,
+        so it can be used as an HTTP ETag. The form part of the hash is
+        computed once per compiled form.
+
+        :param title:
+            The form title, as passed to :meth:`render_html`.
+        :param form_data:
+            answers to show on the form for each question (for edit forms).
+        :param locale:
+            The locale, as passed to :meth:`render_html`.
+
+        :Returns:
+            The hexadecimal hash string.
+        """
+        title = self._title(title, locale)
+        parts = [self._compile().fingerprint(), str(title), self.html_id, self.action]
+        if locale:
+            parts.append(locale)
+        if form_data:
+            parts.append(json.dumps(form_data, sort_keys=True, default=str))
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def etag(
+        self,
+        title: str = None,
+        form_data: Dict[str, Any] = None,
+        locale: str = None,
+    ):
+        """
+        Get the form fingerprint as a quoted HTTP ETag value. Use
+        :func:`questions.utils.etag_matches` to compare it with an
+        `If-None-Match` request header.
+
+        :param title:
+            The form title, as passed to :meth:`render_html`.
+        :param form_data:
+            answers to show on the form for each question (for edit forms).
+        :param locale:
+            The locale, as passed to :meth:`render_html`.
+
+        :Returns:
+            The ETag string.
+        """
+        fingerprint = self.fingerprint(title=title, form_data=form_data, locale=locale)
+        return f'"{fingerprint}"'
+
+    def page_names(self):
+        """
+        Get the names of all the pages in this form, in order.
+
+        :Returns:
+            The list of page names.
+        """
+        return [page.name for page in self._compile().survey.pages]
+
+    def page_json(self, name: str, exclude_defaults: bool = False, locale: str = None):
+        """
+        Convert a single form page to JSON, in the SurveyJS format. This is
+        used to serve the pages of forms rendered with a `pages_url`, which
+        are loaded one at a time as the user moves through the form.
+
+        :param name:
+            The name of the page.
+        :param exclude_defaults:
+            Set to :data:`True` to leave out all properties that have their
+            default values.
+        :param locale:
+            If given, all translated texts are replaced with their text for
+            this locale.
+
+        :Returns:
+            JSON object with the page definition.
+
+        :Raises:
+            KeyError if the form has no page with that name.
+        """
+        started = hooks.start("on_serialize")
+        page_json = self._compile().page_json(name, exclude_defaults, locale)
+        hooks.finish("on_serialize", started, form=self.__class__.__name__, kind="page")
+        return page_json
+
+    def shell_json(self, exclude_defaults: bool = False, locale: str = None):
+        """
+        Convert the form to JSON, in the SurveyJS format, including only the
+        contents of the first page. All other pages are included with their
+        properties, but their questions are replaced with a placeholder until
+        they are loaded using :meth:`page_json`.
+
+        :param exclude_defaults:
+            Set to :data:`True` to leave out all properties that have their
+            default values.
+        :param locale:
+            If given, all translated texts are replaced with their text for
+            this locale.
+
+        :Returns:
+            JSON object with the form definition.
+        """
+        started = hooks.start("on_serialize")
+        shell_json = self._compile().shell_json(exclude_defaults, locale)
+        hooks.finish(
+            "on_serialize", started, form=self.__class__.__name__, kind="shell"
+        )
+        return shell_json
+
+    def _render_js(
+        self,
+        compiled,
+        form_data: Dict[str, Any] = None,
+        pages_url: str = None,
+        locale: str = None,
+    ):
+        if pages_url:
+            form_json = compiled.shell_json(locale=locale)
+        else:
+            form_json = compiled.to_json(locale=locale)
         return get_survey_js(
-            form_json=self.to_json(),
+            form_json=form_json,
             form_data=form_data,
             html_id=self.html_id,
             action=self.action,
             theme=self.theme,
             platform=self.platform,
+            pages_url=pages_url,
         )
 
-    def render_html(self, title: str = None, form_data: Dict[str, Any] = None):
+    def render_js(
+        self,
+        form_data: Dict[str, Any] = None,
+        pages_url: str = None,
+        locale: str = None,
+    ):
         """
-        Render a full HTML page showing this form.
+        Generate the SurveyJS initialization code for the chosen platform.
+
+        :param form_data: answers to show on the form for each
+            question (for edit forms).
+        :param pages_url:
+            If given, only the first page is sent with the form, and all
+            other pages are loaded from this URL, with the page name
+            appended, as the user moves through the form. The URL should
+            return the output of :meth:`page_json` for the page.
+        :param locale:
+            If given, only the texts for this locale are sent with the form.
+            See :meth:`to_json`.
+
+        :Returns:
+            String with the generated javascript.
+        """
+        return self._render_js(
+            self._compile(), form_data=form_data, pages_url=pages_url, locale=locale
+        )
+
+    def render(
+        self,
+        title: str = None,
+        form_data: Dict[str, Any] = None,
+        pages_url: str = None,
+        locale: str = None,
+    ):
+        """
+        Render this form in a single pass. The form is compiled once, and the
+        JSON, the resource lists, the SurveyJS code and the full HTML page are
+        all generated from that compiled form. Renders without answers are
+        cached with the compiled form.
 
         :param title:
             The form title.
         :param form_data:
             answers to show on the form for each question (for edit forms).
+        :param pages_url:
+            URL for loading form pages one at a time. See :meth:`render_js`.
+        :param locale:
+            Locale for the form texts. See :meth:`to_json`.
 
         :Returns:
-            String with the generated HTML.
+            A :class:`RenderResult` with all the generated outputs.
         """
-        if title is None:
-            title = self.params.get("title", self.name)
+        title = self._title(title, locale)
+        compiled = self._compile()
+        # Renders without answers are the same for all the forms that share
+        # the compiled survey and the rendering parameters. Only the most
+        # recent ones are kept, as titles and actions can change per request.
+        key = None
+        if not form_data:
+            key = (
+                str(title),
+                self.html_id,
+                self.action,
+                pages_url,
+                compiled.locale_key(locale),
+            )
+            with compiled._rendered_lock:
+                result = compiled._rendered.get(key)
+                if result is not None:
+                    compiled._rendered.move_to_end(key)
+                    return result
         if form_data is None:
             form_data = {}
-        survey_js = self.render_js(form_data=form_data)
-        return get_form_page(
+        survey_js = self._render_js(
+            compiled, form_data=form_data, pages_url=pages_url, locale=locale
+        )
+        html = get_form_page(
             title=title,
             html_id=self.html_id,
             platform=self.platform,
             survey_js=survey_js,
-            js_resources=self.js,
-            css_resources=self.css,
+            js_resources=compiled.js,
+            css_resources=compiled.css,
+        )
+        if pages_url:
+            form_json = compiled.shell_json(locale=locale)
+        else:
+            form_json = compiled.to_json(locale=locale)
+        result = RenderResult(
+            title=title,
+            json=form_json,
+            js=compiled.js,
+            css=compiled.css,
+            survey_js=survey_js,
+            html=html,
         )
+        if key is not None:
+            with compiled._rendered_lock:
+                compiled._rendered[key] = result
+                compiled._rendered.move_to_end(key)
+                while len(compiled._rendered) > RENDER_CACHE_SIZE:
+                    compiled._rendered.popitem(last=False)
+        return result
 
-    def validate(self, form_data: Dict[str, Any], set_errors: bool = False):
+    def render_html(
+        self,
+        title: str = None,
+        form_data: Dict[str, Any] = None,
+        pages_url: str = None,
+        locale: str = None,
+    ):
+        """
+        Render a full HTML page showing this form.
+
+        :param title:
+            The form title.
+        :param form_data:
+            answers to show on the form for each question (for edit forms).
+        :param pages_url:
+            URL for loading form pages one at a time. See :meth:`render_js`.
+        :param locale:
+            Locale for the form texts. See :meth:`to_json`.
+
+        :Returns:
+            String with the generated HTML.
+        """
+        return self.render(
+            title=title, form_data=form_data, pages_url=pages_url, locale=locale
+        ).html
+
+    def iter_html(
+        self,
+        title: str = None,
+        form_data: Dict[str, Any] = None,
+        pages_url: str = None,
+        locale: str = None,
+    ):
+        """
+        Render a full HTML page showing this form, in chunks. The form JSON,
+        the SurveyJS code and the page are all generated as the chunks are
+        consumed, so WSGI or ASGI servers can stream large forms without
+        holding the full page in memory.
+
+        :param title:
+            The form title.
+        :param form_data:
+            answers to show on the form for each question (for edit forms).
+        :param pages_url:
+            URL for loading form pages one at a time. See :meth:`render_js`.
+        :param locale:
+            Locale for the form texts. See :meth:`to_json`.
+
+        :Returns:
+            A generator of HTML string chunks.
+        """
+        title = self._title(title, locale)
+        compiled = self._compile()
+        if pages_url:
+            form_json = compiled.shell_json(locale=locale)
+        else:
+            form_json = compiled.iter_json(locale=locale)
+        survey_js = iter_survey_js(
+            form_json=form_json,
+            form_data=form_data,
+            html_id=self.html_id,
+            action=self.action,
+            theme=self.theme,
+            platform=self.platform,
+            pages_url=pages_url,
+        )
+        yield from iter_form_page(
+            title=title,
+            html_id=self.html_id,
+            platform=self.platform,
+            survey_js=survey_js,
+            js_resources=compiled.js,
+            css_resources=compiled.css,
+        )
+
+    def validate(
+        self,
+        form_data: Dict[str, Any],
+        set_errors: bool = False,
+        fail_fast: bool = False,
+        max_errors: int = None,
+        max_steps: int = VALIDATION_MAX_STEPS,
+        time_limit: float = VALIDATION_TIME_LIMIT,
+    ):
         """
         Server side validation mimics what client side validation should do. This
         means that any validation errors here are due to form data being sent from
         outside the SurveyJS form, possibly by directly posting the data to the form.
         Questions keeps track of the errors, even though the UI will show them anyway.
         Validation returns False if at least one validator doesn't pass.
+        The validation checks are built once for each compiled form, and reused
+        for all validations.
+
+        To reject bad submissions quickly, validation can stop at the first
+        error, or after a number of errors. In these modes, cheap checks, like
+        required answers and lengths, run before expensive ones, like regular
+        expressions, expressions and email addresses.
+
+        Each submission has a budget, so that a heavy form definition can't
+        block the server: validation stops with an error when it runs too many
+        steps, or for too long.
 
         :param form_data:
             A dictionary-like object with the form data to be validated.
         :param set_errors:
             set to :data:`True` to add an `__errors__` key to the
             form data dictionary, containing the validation errors.
+        :param fail_fast:
+            set to :data:`True` to stop validating at the first error.
+        :param max_errors:
+            Stop validating when this number of errors is found.
+        :param max_steps:
+            Maximum number of validation steps. Most checks are one step, and
+            expressions are one step per operation. :data:`None` for no limit.
+        :param time_limit:
+            Maximum number of seconds to validate for. :data:`None` for no
+            limit.
 
         :Returns:
             :data:`True` if the validation passes, :data:`False` otherwise.
+
+        :Raises:
+            questions.validators.ValidationBudgetError if validation exceeds
+            the step or time limits.
         """
-        validated = True
-        errors = []
-        self._construct_survey()
-        for name, element in self._form_elements.items():
-            value = form_data.get(name)
-            if value is None and element.required:
-                errors.append({"question": name, "message": "An answer is required"})
-                validated = False
-            for validator in element.validators:
-                if not call_validator(validator, value, form_data):
-                    errors.append({"question": name, "message": validator.message})
-                    validated = False
+        if fail_fast:
+            max_errors = 1
+        started = hooks.start("on_validate")
+        plan = self._compile().validation_plan
+        errors = plan.validate(form_data, max_errors, max_steps, time_limit)
+        hooks.finish(
+            "on_validate", started, form=self.__class__.__name__, errors=len(errors)
+        )
         if set_errors:
             form_data["__errors__"] = errors
-        return validated
+        return not errors
+
+    async def avalidate(
+        self,
+        form_data: Dict[str, Any],
+        set_errors: bool = False,
+        concurrency: int = ASYNC_VALIDATION_CONCURRENCY,
+        timeout: float = ASYNC_VALIDATION_TIMEOUT,
+    ):
+        """
+        Validate the form data without blocking the event loop, for use in
+        asynchronous servers. Checks that only do CPU work run inline, and
+        checks that need network access run concurrently, with a limit on the
+        number of checks that run at a time and a timeout for each one. The
+        network checks are email deliverability checks, and checks that the
+        answers of questions with `choices_by_url` are one of the choices
+        loaded from the URL. Loaded choices are cached, see
+        :func:`questions.validators.set_choices_fetcher`.
+
+        :param form_data:
+            A dictionary-like object with the form data to be validated.
+        :param set_errors:
+            set to :data:`True` to add an `__errors__` key to the
+            form data dictionary, containing the validation errors.
+        :param concurrency:
+            Maximum number of network checks that run at the same time.
+        :param timeout:
+            Seconds to wait for each network check. Checks that time out pass.
+
+        :Returns:
+            :data:`True` if the validation passes, :data:`False` otherwise.
+        """
+        started = hooks.start("on_validate")
+        plan = self._compile().validation_plan
+        errors = await plan.avalidate(form_data, concurrency, timeout)
+        hooks.finish(
+            "on_validate", started, form=self.__class__.__name__, errors=len(errors)
+        )
+        if set_errors:
+            form_data["__errors__"] = errors
+        return not errors
+
+    def validate_page(
+        self, page_name: str, form_data: Dict[str, Any], set_errors: bool = False
+    ):
+        """
+        Validate only the questions of one page, for forms that are submitted
+        page by page. Conditions can still use the answers from other pages.
+
+        :param page_name:
+            The name of the page to validate.
+        :param form_data:
+            A dictionary-like object with the form data to be validated.
+        :param set_errors:
+            set to :data:`True` to add an `__errors__` key to the
+            form data dictionary, containing the validation errors.
+
+        :Returns:
+            :data:`True` if the validation passes, :data:`False` otherwise.
+
+        :Raises:
+            KeyError if the form has no page with that name.
+        """
+        started = hooks.start("on_validate")
+        plan = self._compile().page_plan(page_name)
+        errors = plan.validate(
+            form_data, max_steps=VALIDATION_MAX_STEPS, time_limit=VALIDATION_TIME_LIMIT
+        )
+        hooks.finish(
+            "on_validate", started, form=self.__class__.__name__, errors=len(errors)
+        )
+        if set_errors:
+            form_data["__errors__"] = errors
+        return not errors
+
+    def validate_incremental(
+        self,
+        form_data: Dict[str, Any],
+        state: ValidationState = None,
+        changed: Iterable[str] = None,
+        set_errors: bool = False,
+    ):
+        """
+        Validate the whole form again after some answers changed, running only
+        the checks that depend on the changed answers. Pass the state returned
+        by the previous call for the same submission, and optionally the names
+        of the answers that changed. Without a state, all the checks are run.
+        States hold a reference to the validation plan of the compiled form,
+        so they are meant to be kept in memory between submissions.
+
+        :param form_data:
+            A dictionary-like object with all the answers so far.
+        :param state:
+            The :class:`questions.validators.ValidationState` returned by the
+            previous validation, or :data:`None`.
+        :param changed:
+            The names of the answers that changed. If :data:`None`, the
+            answers are compared with the previous ones.
+        :param set_errors:
+            set to :data:`True` to add an `__errors__` key to the
+            form data dictionary, containing the validation errors.
+
+        :Returns:
+            The updated :class:`questions.validators.ValidationState`. Its
+            `valid` attribute is :data:`True` if the validation passes.
+        """
+        plan = self._compile().validation_plan
+        state = plan.validate_incremental(form_data, state, changed)
+        if set_errors:
+            form_data["__errors__"] = state.errors
+        return state
+
+    def validate_many(
+        self,
+        submissions: Iterable[Dict[str, Any]],
+        workers: int = 1,
+        chunk_size: int = 256,
+        max_steps: int = VALIDATION_MAX_STEPS,
+        time_limit: float = VALIDATION_TIME_LIMIT,
+    ):
+        """
+        Validate a large number of submissions, for example when importing
+        responses collected elsewhere. The form is compiled once, and with
+        more than one worker the submissions are validated in parallel by a
+        pool of processes. Submissions are read from the iterable as they are
+        needed, so it can be a generator over a very large file.
+
+        :param submissions:
+            An iterable of dictionary-like objects with the form data.
+        :param workers:
+            The number of worker processes. With one worker, all validation
+            is done in the current process.
+        :param chunk_size:
+            The number of submissions sent to a worker process at a time.
+        :param max_steps:
+            The step limit for each submission, see :meth:`validate`.
+        :param time_limit:
+            The time limit for each submission, in seconds.
+
+        :Returns:
+            A generator of `(valid, errors)` tuples, one for each submission,
+            in the same order as the submissions. The errors have the same
+            format as the `__errors__` list set by :meth:`validate`. A
+            submission that exceeds its limits is invalid, and doesn't stop
+            the others.
+        """
+        plan = self._compile().validation_plan
+        return validate_many(
+            plan, submissions, workers, chunk_size, max_steps, time_limit
+        )
+
+    def validate_columns(self, columns: Mapping[str, Sequence], vectorize: bool = True):
+        """
+        Validate answers stored by column, with one list or NumPy array of
+        answers per question name. When NumPy is installed, the required,
+        numeric and text checks are vectorized over whole columns. The results
+        are the same as calling :meth:`validate` for each row.
+
+        :param columns:
+            Mapping of answer columns, by question name. All columns must have
+            the same length. NaN and :data:`None` are missing answers.
+        :param vectorize:
+            Set to :data:`False` to check each answer separately, even if
+            NumPy is installed.
+
+        :Returns:
+            A `(mask, errors)` tuple, with a boolean for each row that is
+            :data:`True` if the row is valid, and a dictionary with the indexes
+            of the failed rows for each question. See
+            :func:`questions.columns.validate_columns`.
+        """
+        plan = self._compile().validation_plan
+        return validate_columns(plan, columns, vectorize)
 
     def update_object(self, obj: Any, form_data: Dict[str, Any]):
         """
@@ -454,8 +1479,7 @@ class Form(object):
             questions.validators.ValidationError if validation does not pass.
         """
         if self.validate(form_data):
-            # call to validate sets the form elements beforehand
-            for name in self._form_elements.keys():
+            for name in self._compile().form_elements.keys():
                 setattr(obj, name, form_data[name])
         else:
             raise ValidationError
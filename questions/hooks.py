@@ -0,0 +1,381 @@
+"""
+Instrumentation hooks and latency histograms.
+
+Hooks are callbacks that are called with the duration of the main operations
+of forms: building the survey, serializing it to JSON, rendering templates,
+validating submissions and running each validator. Each event calls its hooks
+with keyword arguments: always `duration`, in seconds, and:
+
+- `on_construct`: `form`, the form class name.
+- `on_serialize`: `form`, and `kind`, which is `json`, `page` or `shell`.
+- `on_render_template`: `template`, the template file name.
+- `on_validate`: `form`, and `errors`, the number of errors.
+- `on_validator`: `kind`, the validator kind, and `question`.
+
+Timing only happens for events that have hooks, so with no hooks registered
+the cost is a dictionary lookup per operation. Validator timing wraps the
+checks of a validation plan only while there are `on_validator` hooks.
+
+:class:`LatencyHistograms` is a hook collector that keeps a histogram of the
+durations of each event, by form class, template or validator kind, and
+reports percentiles as JSON or in the Prometheus text format.
+"""
+import bisect
+import json
+import threading
+import time
+
+from typing import Any
+from typing import Callable
+
+EVENTS = (
+    "on_construct",
+    "on_serialize",
+    "on_render_template",
+    "on_validate",
+    "on_validator",
+)
+
+# The registered callbacks, by event. The tuples are replaced, never changed,
+# so they can be read without a lock.
+_hooks = {event: () for event in EVENTS}
+_hooks_lock = threading.Lock()
+
+
+def add_hook(event: str, callback: Callable[..., Any]):
+    """Register a callback for an event.
+
+    :param event:
+        The event name, one of :data:`EVENTS`.
+    :param callback:
+        The function to call, with the event data as keyword arguments.
+
+    :Raises:
+        ValueError if the event is unknown.
+    """
+    if event not in _hooks:
+        raise ValueError(f"Unknown event {event!r}")
+    with _hooks_lock:
+        _hooks[event] = _hooks[event] + (callback,)
+
+
+def remove_hook(event: str, callback: Callable[..., Any]):
+    """Remove a callback registered with :func:`add_hook`. Callbacks that are
+    not registered are ignored.
+
+    :param event:
+        The event name.
+    :param callback:
+        The registered function.
+    """
+    with _hooks_lock:
+        _hooks[event] = tuple(hook for hook in _hooks[event] if hook != callback)
+
+
+def has_hooks(event: str):
+    """Check if an event has any hooks.
+
+    :param event:
+        The event name.
+
+    :Returns:
+        :data:`True` if the event has hooks.
+    """
+    return bool(_hooks[event])
+
+
+def start(event: str):
+    """Start timing an operation, if its event has hooks.
+
+    :param event:
+        The event name.
+
+    :Returns:
+        The start time, to pass to :func:`finish`, or :data:`None` if the
+        event has no hooks.
+    """
+    if _hooks[event]:
+        return time.perf_counter()
+    return None
+
+
+def finish(event: str, started: float, **data: Any):
+    """Finish timing an operation, and call the hooks of its event with the
+    duration and the event data.
+
+    :param event:
+        The event name.
+    :param started:
+        The value returned by :func:`start`. If :data:`None`, nothing is done.
+    :param data:
+        The event data.
+    """
+    if started is None:
+        return
+    data["duration"] = time.perf_counter() - started
+    for hook in _hooks[event]:
+        hook(**data)
+
+
+def timed_check(check: Callable[[Any, Any], bool], kind: str, question: str):
+    """Wrap a validation check so that it calls the `on_validator` hooks.
+
+    :param check:
+        The check function, which takes the value and the form data.
+    :param kind:
+        The validator kind.
+    :param question:
+        The question name.
+
+    :Returns:
+        The wrapped check.
+    """
+
+    def timed(value: Any, form_data: Any):
+        started = time.perf_counter()
+        try:
+            return check(value, form_data)
+        finally:
+            duration = time.perf_counter() - started
+            for hook in _hooks["on_validator"]:
+                hook(kind=kind, question=question, duration=duration)
+
+    return timed
+
+
+def _bucket_bounds(
+    smallest: float = 1e-6, largest: float = 100.0, factor: float = 2**0.25
+):
+    bounds = []
+    bound = smallest
+    while bound < largest:
+        bounds.append(bound)
+        bound *= factor
+    bounds.append(bound)
+    return tuple(bounds)
+
+
+# Upper bounds of the histogram buckets, in seconds, each 19% larger than the
+# previous one, so percentiles are estimated within that margin.
+BUCKET_BOUNDS = _bucket_bounds()
+
+# Event data that labels the durations of each event.
+EVENT_LABELS = {
+    "on_construct": "form",
+    "on_serialize": "form",
+    "on_render_template": "template",
+    "on_validate": "form",
+    "on_validator": "kind",
+}
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram(object):
+    """
+    A histogram of durations, with fixed buckets. Recording a duration is a
+    binary search and a counter increment, without keeping the durations.
+
+    :param bounds:
+        The upper bounds of the buckets. Durations larger than the last bound
+        go to an overflow bucket.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total", "min", "max")
+
+    def __init__(self, bounds: tuple = BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        """Record a duration.
+
+        :param value:
+            The duration, in seconds.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float):
+        """Estimate a percentile, interpolating inside its bucket.
+
+        :param fraction:
+            The percentile, as a fraction between 0 and 1.
+
+        :Returns:
+            The estimated duration, or :data:`None` if there are none.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        """Get the count, sum, extremes and percentiles of the durations.
+
+        :Returns:
+            A dictionary.
+        """
+        summary = {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+        for fraction in PERCENTILES:
+            summary[f"p{round(fraction * 100)}"] = self.percentile(fraction)
+        return summary
+
+
+class LatencyHistograms(object):
+    """
+    Collects the durations of all the hook events in histograms: per form
+    class for building, serializing and validating forms, per template file
+    for rendering, and per validator kind for validators.
+
+    Use :meth:`install` to start collecting, and :meth:`to_json` or
+    :meth:`to_prometheus` to export the percentiles.
+
+    :param bounds:
+        The upper bounds of the histogram buckets, in seconds.
+    """
+
+    def __init__(self, bounds: tuple = BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._callbacks = {event: self._callback(event) for event in EVENTS}
+
+    def _callback(self, event: str):
+        metric = event[3:]
+        label = EVENT_LABELS[event]
+
+        def observe(duration: float, **data: Any):
+            self.observe(metric, data.get(label, ""), duration)
+
+        return observe
+
+    def observe(self, metric: str, label: str, duration: float):
+        """Record a duration.
+
+        :param metric:
+            The metric name, like `validate`.
+        :param label:
+            The form class name, template or validator kind.
+        :param duration:
+            The duration, in seconds.
+        """
+        key = (metric, label)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.bounds)
+            histogram.observe(duration)
+
+    def install(self):
+        """Register the collector hooks for all the events.
+
+        :Returns:
+            The collector.
+        """
+        for event, callback in self._callbacks.items():
+            add_hook(event, callback)
+        return self
+
+    def uninstall(self):
+        """Remove the collector hooks."""
+        for event, callback in self._callbacks.items():
+            remove_hook(event, callback)
+
+    def reset(self):
+        """Forget all the recorded durations."""
+        with self._lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        """Get the summaries of all the histograms.
+
+        :Returns:
+            A dictionary of metrics, each a dictionary of
+            :meth:`Histogram.summary` results by label.
+        """
+        with self._lock:
+            items = sorted(self.histograms.items())
+            snapshot = {}
+            for (metric, label), histogram in items:
+                snapshot.setdefault(metric, {})[label] = histogram.summary()
+        return snapshot
+
+    def to_json(self, **kwargs: Any):
+        """Export the summaries as JSON.
+
+        :param kwargs:
+            Arguments for :func:`json.dumps`.
+
+        :Returns:
+            The JSON text.
+        """
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "questions"):
+        """Export the summaries in the Prometheus text format, as one summary
+        metric per event, with the p50, p95 and p99 quantiles.
+
+        :param prefix:
+            The prefix of the metric names.
+
+        :Returns:
+            The metrics text.
+        """
+        lines = []
+        for metric, labels in self.snapshot().items():
+            name = f"{prefix}_{metric}_seconds"
+            label_name = EVENT_LABELS.get(f"on_{metric}", "label")
+            lines.append(f"# HELP {name} Duration of {metric} events.")
+            lines.append(f"# TYPE {name} summary")
+            for label, summary in labels.items():
+                value = _escape_label(label)
+                for fraction in PERCENTILES:
+                    quantile = summary[f"p{round(fraction * 100)}"]
+                    lines.append(
+                        f'{name}{{{label_name}="{value}",quantile="{fraction}"}} '
+                        f"{quantile!r}"
+                    )
+                lines.append(f'{name}_sum{{{label_name}="{value}"}} {summary["sum"]!r}')
+                lines.append(
+                    f'{name}_count{{{label_name}="{value}"}} {summary["count"]}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def collect_latencies(bounds: tuple = BUCKET_BOUNDS) -> "LatencyHistograms":
+    """Create a :class:`LatencyHistograms` collector and install its hooks.
+
+    :param bounds:
+        The upper bounds of the histogram buckets, in seconds.
+
+    :Returns:
+        The installed collector.
+    """
+    return LatencyHistograms(bounds).install()
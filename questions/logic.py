@@ -0,0 +1,501 @@
+"""
+Server side evaluation of the conditional logic of forms.
+
+SurveyJS shows, enables and requires questions depending on other answers,
+using the `visible_if`, `enable_if` and `required_if` conditions of questions,
+panels and pages, and calculates the `calculated_values` of the survey. This
+module evaluates the same logic on the server, so that validation skips the
+questions that the respondent never saw or could not change, as SurveyJS does.
+
+The logic of a form is compiled once into a dependency graph, built from the
+`{question}` references of each expression, and sorted so that each condition
+is evaluated after the answers and values it depends on. Elements inside a
+hidden panel or page are hidden without evaluating their own conditions. As
+with the default `clear_invisible_values` setting of SurveyJS, the answers of
+hidden questions are missing for the conditions that use them.
+
+Survey triggers are not run: their effects are already part of the submitted
+answers.
+"""
+import heapq
+
+from typing import Any
+from typing import Iterable
+from typing import Mapping
+
+from .expressions import compile_expression
+from .expressions import EXPRESSION_ERRORS
+from .expressions import ExpressionError
+from .expressions import is_true
+from .expressions import split_path
+from .questions import Page
+
+# Names that refer to the current row in matrix and dynamic panel expressions.
+ROW_VARIABLES = ("row", "panel")
+
+QUESTION_NODE = 0
+CONTAINER_NODE = 1
+CALCULATED_NODE = 2
+
+
+def compile_condition(expression: str):
+    """Compile a condition. Conditions that can't be compiled are ignored, as
+    SurveyJS does.
+
+    :param expression:
+        The expression text.
+
+    :Returns:
+        The compiled expression, or :data:`None` if the expression is empty
+        or not valid.
+    """
+    if not expression:
+        return None
+    try:
+        return compile_expression(expression)
+    except ExpressionError:
+        return None
+
+
+def check_condition(condition, values: Mapping, default: bool):
+    """Evaluate a condition. Conditions that fail with unexpected answer types
+    are false.
+
+    :param condition:
+        The compiled condition, or :data:`None`.
+    :param values:
+        The answers, by question name.
+    :param default:
+        The result if there is no condition.
+
+    :Returns:
+        :data:`True` if the condition is true.
+    """
+    if condition is None:
+        return default
+    try:
+        return is_true(condition.evaluate(values))
+    except EXPRESSION_ERRORS:
+        return False
+
+
+def _children(element: Any):
+    if isinstance(element, Page):
+        return element.questions
+    if getattr(element, "kind", None) == "panel":
+        return element.elements
+    return ()
+
+
+def _dependency(variable: str):
+    path = split_path(variable)
+    if len(path) > 1 and path[0] in ROW_VARIABLES:
+        path = path[1:]
+    if not path or not isinstance(path[0], str):
+        return None
+    return path[0].lower()
+
+
+class LogicNode(object):
+    """
+    A question, container or calculated value in the logic graph.
+
+    :param kind:
+        The node kind: `QUESTION_NODE`, `CONTAINER_NODE` or `CALCULATED_NODE`.
+    :param name:
+        The question or value name.
+    :param parent:
+        The index of the container node, or :data:`None`.
+    """
+
+    __slots__ = (
+        "kind",
+        "name",
+        "parent",
+        "visible",
+        "visible_if",
+        "enable_if",
+        "required_if",
+        "expression",
+    )
+
+    def __init__(self, kind: int, name: str, parent: int = None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.visible = True
+        self.visible_if = None
+        self.enable_if = None
+        self.required_if = None
+        self.expression = None
+
+    def conditions(self):
+        """The compiled expressions of the node."""
+        return [
+            condition
+            for condition in (
+                self.visible_if,
+                self.enable_if,
+                self.required_if,
+                self.expression,
+            )
+            if condition is not None
+        ]
+
+
+class LogicData(Mapping):
+    """
+    The answers seen by conditions and validators once the logic has been
+    evaluated: the calculated values are added, and the answers of hidden
+    questions are missing.
+
+    :param form_data:
+        The submitted answers.
+    :param calculated:
+        The calculated values, by name.
+    :param hidden:
+        The names of the questions whose answers are missing.
+    """
+
+    __slots__ = ("form_data", "calculated", "hidden", "folded")
+
+    def __init__(self, form_data: Mapping, calculated: dict, hidden: set):
+        self.form_data = form_data
+        self.calculated = calculated
+        self.hidden = hidden
+        # The answer names by their lower case name, built on the first lookup
+        # that needs it.
+        self.folded = None
+
+    def get_folded(self, name: str):
+        """Get a value by its lower case name, as the case insensitive
+        variable lookups of expressions do. The answer names are indexed once,
+        so lookups don't depend on the number of answers.
+
+        :param name:
+            The lower case name.
+
+        :Returns:
+            The value, or :data:`None` if it is missing.
+        """
+        if self.folded is None:
+            folded = {}
+            for key in self.form_data:
+                if isinstance(key, str):
+                    folded.setdefault(key.lower(), []).append(key)
+            self.folded = folded
+        for key in self.folded.get(name, ()):
+            if key not in self.hidden:
+                return self[key]
+        for key, value in self.calculated.items():
+            if isinstance(key, str) and key.lower() == name:
+                return value
+        return None
+
+    def __getitem__(self, name: str):
+        if name in self.hidden:
+            raise KeyError(name)
+        if name in self.calculated:
+            return self.calculated[name]
+        return self.form_data[name]
+
+    def __iter__(self):
+        for name in self.form_data:
+            if name not in self.hidden:
+                yield name
+        yield from self.calculated
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+
+class LogicState(object):
+    """
+    The result of evaluating the logic of a form for one submission. States
+    can be updated with :meth:`FormLogic.update` when some answers change.
+
+    :param size:
+        The number of nodes in the logic graph.
+    :param form_data:
+        The submitted answers.
+
+    .. attribute:: skip
+
+        Names of the questions that are hidden or disabled, which are not
+        validated.
+
+    .. attribute:: required
+
+        Names of the questions that are required by their `required_if`
+        condition.
+
+    .. attribute:: values
+
+        The answers to use for validation, as a :class:`LogicData`.
+    """
+
+    __slots__ = ("skip", "required", "values", "hidden", "disabled")
+
+    def __init__(self, size: int, form_data: Mapping):
+        self.skip = set()
+        self.required = set()
+        self.values = LogicData(form_data, {}, set())
+        self.hidden = [False] * size
+        self.disabled = [False] * size
+
+
+class FormLogic(object):
+    """
+    The compiled logic of a form. The dependency graph is built and sorted
+    once, and each call to :meth:`evaluate` walks it in that order.
+
+    :param elements:
+        The top level elements of the form: pages, panels or questions.
+    :param calculated_values:
+        The calculated values of the survey, as SurveyJS definitions with a
+        `name` and an `expression`.
+    :param clear_invisible_values:
+        Set to :data:`False` to keep the answers of hidden questions for the
+        conditions that use them, as with the `none` setting of SurveyJS.
+    """
+
+    def __init__(
+        self,
+        elements: Iterable[Any],
+        calculated_values: Iterable[Any] = (),
+        clear_invisible_values: bool = True,
+    ):
+        self.elements = list(elements)
+        self.calculated_values = list(calculated_values)
+        self.clear_invisible_values = clear_invisible_values
+        nodes = []
+
+        def add(element: Any, parent: int = None):
+            index = len(nodes)
+            if isinstance(element, Page) or element.kind == "panel":
+                kind = CONTAINER_NODE
+            else:
+                kind = QUESTION_NODE
+            node = LogicNode(kind, element.name, parent)
+            node.visible = getattr(element, "visible", True)
+            node.visible_if = compile_condition(getattr(element, "visible_if", ""))
+            node.enable_if = compile_condition(getattr(element, "enable_if", ""))
+            node.required_if = compile_condition(getattr(element, "required_if", ""))
+            nodes.append(node)
+            for child in _children(element):
+                add(child, index)
+
+        for element in self.elements:
+            add(element)
+        for value in self.calculated_values:
+            if isinstance(value, dict) and value.get("name"):
+                node = LogicNode(CALCULATED_NODE, value["name"])
+                node.expression = compile_condition(value.get("expression"))
+                nodes.append(node)
+        #: :data:`False` if the form has no conditions or calculated values.
+        self.active = any(
+            node.conditions() or not node.visible or node.kind == CALCULATED_NODE
+            for node in nodes
+        )
+        order = self._sort(nodes)
+        positions = {index: position for position, index in enumerate(order)}
+        # The nodes in evaluation order, with the position of their container.
+        self.order = tuple(
+            (
+                nodes[index],
+                None if nodes[index].parent is None else positions[nodes[index].parent],
+            )
+            for index in order
+        )
+        self.conditionally_required = frozenset(
+            node.name for node in nodes if node.required_if is not None
+        )
+        #: The compiled operations of all the conditions and calculated values.
+        self.steps = sum(
+            condition.steps for node in nodes for condition in node.conditions()
+        )
+        # Positions of the nodes whose expressions use each name, and of the
+        # nodes that must be evaluated again when a node changes.
+        self.readers = {}
+        for position, (node, parent) in enumerate(self.order):
+            for condition in node.conditions():
+                for variable in condition.variables:
+                    name = _dependency(variable)
+                    if name is not None:
+                        self.readers.setdefault(name, set()).add(position)
+        self.dependents = [set() for node in self.order]
+        for position, (node, parent) in enumerate(self.order):
+            if parent is not None:
+                self.dependents[parent].add(position)
+            if node.kind != CONTAINER_NODE:
+                readers = self.readers.get(node.name.lower(), ())
+                self.dependents[position].update(readers)
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self.elements, self.calculated_values, self.clear_invisible_values),
+        )
+
+    @staticmethod
+    def _sort(nodes: list):
+        """Sort the nodes so that each one comes after its container and the
+        answers and values its expressions use. Nodes in a dependency cycle
+        keep their form order, after all the others.
+        """
+        by_name = {}
+        for index, node in enumerate(nodes):
+            if node.kind != CONTAINER_NODE:
+                by_name.setdefault(node.name.lower(), index)
+        dependents = [[] for node in nodes]
+        pending = [0] * len(nodes)
+        for index, node in enumerate(nodes):
+            dependencies = set()
+            if node.parent is not None:
+                dependencies.add(node.parent)
+            for condition in node.conditions():
+                for variable in condition.variables:
+                    dependency = by_name.get(_dependency(variable))
+                    if dependency is not None and dependency != index:
+                        dependencies.add(dependency)
+            for dependency in dependencies:
+                dependents[dependency].append(index)
+            pending[index] = len(dependencies)
+        ready = [index for index, count in enumerate(pending) if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            index = heapq.heappop(ready)
+            order.append(index)
+            for dependent in dependents[index]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+        if len(order) < len(nodes):
+            done = set(order)
+            order.extend(index for index in range(len(nodes)) if index not in done)
+        return order
+
+    def _evaluate_node(self, position: int, state: LogicState):
+        node, parent = self.order[position]
+        values = state.values
+        if node.kind == CALCULATED_NODE:
+            if node.expression is not None:
+                try:
+                    values.calculated[node.name] = node.expression.evaluate(values)
+                except EXPRESSION_ERRORS:
+                    values.calculated[node.name] = None
+            return
+        if node.kind == QUESTION_NODE:
+            state.skip.discard(node.name)
+            state.required.discard(node.name)
+            values.hidden.discard(node.name)
+        if parent is not None and state.hidden[parent]:
+            visible = False
+        else:
+            visible = node.visible and check_condition(node.visible_if, values, True)
+        state.hidden[position] = not visible
+        if not visible:
+            state.disabled[position] = False
+            if node.kind == QUESTION_NODE:
+                state.skip.add(node.name)
+                if self.clear_invisible_values:
+                    values.hidden.add(node.name)
+            return
+        if parent is not None and state.disabled[parent]:
+            disabled = True
+        else:
+            disabled = not check_condition(node.enable_if, values, True)
+        state.disabled[position] = disabled
+        if node.kind != QUESTION_NODE:
+            return
+        if disabled:
+            state.skip.add(node.name)
+        elif check_condition(node.required_if, values, False):
+            state.required.add(node.name)
+
+    def evaluate(self, form_data: Mapping):
+        """Evaluate the logic for one submission.
+
+        :param form_data:
+            A dictionary-like object with the submitted answers.
+
+        :Returns:
+            A :class:`LogicState`.
+        """
+        state = LogicState(len(self.order), form_data)
+        for position in range(len(self.order)):
+            self._evaluate_node(position, state)
+        return state
+
+    def affected(self, changed: Iterable[str]):
+        """Find the nodes that must be evaluated again when some answers
+        change: the nodes whose expressions use the answers, and, following
+        the dependency graph, everything that depends on those nodes.
+
+        :param changed:
+            The names of the changed answers.
+
+        :Returns:
+            The sorted list of node positions.
+        """
+        pending = []
+        for name in changed:
+            pending.extend(self.readers.get(name.lower(), ()))
+        affected = set(pending)
+        while pending:
+            for dependent in self.dependents[pending.pop()]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    pending.append(dependent)
+        return sorted(affected)
+
+    def update(self, state: LogicState, form_data: Mapping, changed: Iterable[str]):
+        """Update a logic state when some answers change, evaluating only the
+        conditions and calculated values that depend on them. The state is
+        changed in place.
+
+        :param state:
+            The state from a previous evaluation of this logic.
+        :param form_data:
+            A dictionary-like object with all the submitted answers.
+        :param changed:
+            The names of the answers that changed since the state was
+            evaluated.
+
+        :Returns:
+            The names of the questions and calculated values that were
+            evaluated again, whose state or value may have changed.
+        """
+        state.values.form_data = form_data
+        state.values.folded = None
+        names = set()
+        for position in self.affected(changed):
+            self._evaluate_node(position, state)
+            node = self.order[position][0]
+            if node.kind != CONTAINER_NODE:
+                names.add(node.name)
+        return names
+
+
+def build_logic(
+    elements: Iterable[Any],
+    calculated_values: Iterable[Any] = (),
+    clear_invisible_values: bool = True,
+):
+    """Compile the logic of a form.
+
+    :param elements:
+        The top level elements of the form: pages, panels or questions.
+    :param calculated_values:
+        The calculated values of the survey.
+    :param clear_invisible_values:
+        Set to :data:`False` to keep the answers of hidden questions for
+        conditions.
+
+    :Returns:
+        A :class:`FormLogic`, or :data:`None` if the form has no conditional
+        logic.
+    """
+    logic = FormLogic(elements, calculated_values, clear_invisible_values)
+    return logic if logic.active else None
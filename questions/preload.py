@@ -0,0 +1,152 @@
+"""
+Warm-up support for pre-forking servers, like gunicorn or uwsgi.
+
+Calling :func:`warmup` in the master process, before the workers are forked,
+compiles the forms, loads the templates and builds the form JSON once. The
+workers then share these objects instead of each one building its own copy on
+its first requests.
+"""
+import gc
+
+from typing import Iterable
+from typing import List
+from typing import Type
+from typing import Union
+
+from .form import CompiledSurvey
+from .form import Form
+from .form import QUESTION_ELEMENT
+from .templates import env
+
+
+def iter_form_classes(base: Type[Form] = Form):
+    """
+    Get all the subclasses of a form class, including indirect subclasses.
+    Each class is returned only once, parents before their subclasses.
+
+    :param base:
+        The form class to start from. Defaults to :class:`questions.Form`.
+
+    :Returns:
+        A generator of form classes.
+    """
+    seen = set()
+    pending = list(base.__subclasses__())
+    while pending:
+        form_class = pending.pop(0)
+        if form_class in seen:
+            continue
+        seen.add(form_class)
+        yield form_class
+        pending.extend(form_class.__subclasses__())
+
+
+def iter_servable_forms(base: Type[Form] = Form):
+    """
+    Get the form classes that are rendered on their own: all the subclasses
+    of a form class, except the ones that are only used as pages or panels of
+    other forms, and the classes generated by :meth:`questions.Form.from_json`.
+
+    :param base:
+        The form class to start from. Defaults to :class:`questions.Form`.
+
+    :Returns:
+        A generator of form classes.
+    """
+    form_classes = list(iter_form_classes(base))
+    parts = set()
+    for form_class in form_classes:
+        for element, kind in form_class._elements:
+            if kind != QUESTION_ELEMENT:
+                parts.add(element.form.__class__)
+    for form_class in form_classes:
+        if form_class not in parts and not form_class.__dict__.get("_generated"):
+            yield form_class
+
+
+def load_templates(platforms: Iterable[str]):
+    """
+    Load and compile the Jinja templates used to render forms for the given
+    platforms.
+
+    :param platforms:
+        The platform names, like `jquery` or `react`.
+    """
+    for platform in platforms:
+        env.get_template(f"survey_js.{platform}.jinja")
+        env.get_template(f"survey_html.{platform}.jinja")
+    env.get_template("survey_lazy_pages.jinja")
+
+
+def warm_form(form: Form, locales: Iterable[str] = ()):
+    """
+    Compile a form and build all the outputs that are generated lazily: the
+    form JSON, the JSON for forms loaded one page at a time, the HTML page,
+    the validation plans for the form and each page, and the form
+    fingerprint.
+
+    :param form:
+        The form instance to warm up.
+    :param locales:
+        Locales to build the form JSON and HTML for, in addition to the
+        default ones.
+
+    :Returns:
+        The :class:`questions.form.CompiledSurvey` for the form.
+    """
+    compiled = form._compile()
+    for locale in [None] + list(locales):
+        compiled.to_json(locale=locale)
+        if len(compiled.pages) > 1:
+            compiled.shell_json(locale=locale)
+            for name in compiled.pages:
+                compiled.page_json(name, locale=locale)
+        form.render(locale=locale)
+    compiled.validation_plan
+    for name in compiled.pages:
+        compiled.page_plan(name)
+    compiled.fingerprint()
+    return compiled
+
+
+def warmup(
+    forms: Iterable[Union[Form, Type[Form]]] = None,
+    locales: Iterable[str] = (),
+    freeze: bool = True,
+) -> List[CompiledSurvey]:
+    """
+    Prepare forms for serving before the server workers are forked. Every form
+    is compiled, the templates for its platform are loaded and its JSON is
+    built. Finally, all objects are moved to the permanent garbage collector
+    generation with :func:`gc.freeze`, so that collections in the workers do
+    not write to the memory pages they share with the master process.
+
+    :param forms:
+        Form classes or instances to warm up. Classes are warmed up with their
+        default parameters, so pass an instance for forms that are rendered
+        with other parameters. If :data:`None`, the subclasses of
+        :class:`questions.Form` returned by :func:`iter_servable_forms` are
+        warmed up.
+    :param locales:
+        Locales to build the form JSON for. See :meth:`questions.Form.to_json`.
+    :param freeze:
+        Set to :data:`False` to skip freezing the garbage collector.
+
+    :Returns:
+        The list of compiled forms.
+    """
+    if forms is None:
+        forms = iter_servable_forms()
+    locales = list(locales)
+    compiled_forms = []
+    platforms = set()
+    for form in forms:
+        if isinstance(form, type):
+            form = form()
+        compiled_forms.append(warm_form(form, locales))
+        platforms.add(form.platform)
+    load_templates(sorted(platforms))
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return compiled_forms
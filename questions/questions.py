@@ -74,9 +74,11 @@ class NumericValidator(Validator):
 
 
 class EmailValidator(Validator):
-    """Checks if a value is a valid email address."""
+    """Checks if a value is a valid email address. On the server, only the
+    address syntax is checked, unless `check_deliverability` is set."""
 
     kind: str = "email"
+    check_deliverability: bool = False
 
 
 class RegexValidator(Validator):
@@ -89,7 +91,7 @@ class RegexValidator(Validator):
 class ExpressionValidator(Validator):
     """Checks if a question's answer matches a set of conditions."""
 
-    kind: str = "regex"
+    kind: str = "expression"
     expression: str = ""
 
 
@@ -823,3 +825,12 @@ QUESTION_NAMES_TO_TYPES = {
     "tagbox": TagBoxQuestion,
     "text": TextQuestion,
 }
+
+
+VALIDATOR_NAMES_TO_TYPES = {
+    "email": EmailValidator,
+    "expression": ExpressionValidator,
+    "numeric": NumericValidator,
+    "regex": RegexValidator,
+    "text": TextValidator,
+}
@@ -0,0 +1,487 @@
+"""
+Precompiled serializers for the SurveyJS models.
+
+Pydantic include masks have to be walked and merged for every model on every
+call, which gets expensive for large forms. The serializers in this module are
+built once per model class. Each one knows the alias and default value of every
+field it emits, so serializing a model is a single loop over its fields.
+
+All serializers can also slice translated texts to a single locale. Texts that
+SurveyJS accepts as dictionaries of translations are replaced with the text for
+the requested locale, so that respondents only get their own language.
+"""
+import json
+import re
+
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import Type
+from typing import Union
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from .questions import BooleanQuestion
+from .questions import ChoicesQuestion
+from .questions import CommentQuestion
+from .questions import FileQuestion
+from .questions import ImageBlock
+from .questions import ImagePickerQuestion
+from .questions import MatrixDropdownQuestion
+from .questions import MatrixDynamicQuestion
+from .questions import MultipleTextQuestion
+from .questions import Page
+from .questions import PanelBlock
+from .questions import PanelDynamicBlock
+from .questions import Question
+from .questions import Survey
+from .questions import Validator
+from .settings import INCLUDE_KEYS
+from .settings import LOCALE_CHAIN_CACHE_SIZE
+from .settings import LOCALES
+
+
+SURVEY_KEYS = frozenset(key for key in INCLUDE_KEYS if key != "pages")
+PAGE_KEYS = frozenset(
+    key for key in INCLUDE_KEYS["pages"]["__all__"] if key != "questions"
+)
+QUESTION_KEYS = frozenset(INCLUDE_KEYS["pages"]["__all__"]["questions"]["__all__"])
+
+# Keys that SurveyJS needs even when they have their default values.
+REQUIRED_KEYS = frozenset(["kind", "name"])
+
+# Fields whose defaults are not the SurveyJS defaults, by model class. They are
+# kept when defaults are excluded, or SurveyJS would use its own default and
+# render the form differently. Subclasses inherit the fields of their bases.
+SURVEYJS_DEFAULT_MISMATCHES = {
+    Validator: frozenset(["message"]),
+    Question: frozenset(["hide_number", "max_width"]),
+    ChoicesQuestion: frozenset(["col_count", "hide_if_choices_empty", "other_text"]),
+    ImagePickerQuestion: frozenset(["image_fit", "image_height", "image_width"]),
+    BooleanQuestion: frozenset(["value_true", "value_false"]),
+    MultipleTextQuestion: frozenset(["col_count", "item_size"]),
+    CommentQuestion: frozenset(["rows"]),
+    FileQuestion: frozenset(["image_height", "image_width", "wait_for_upload"]),
+    MatrixDropdownQuestion: frozenset(["column_col_count"]),
+    MatrixDynamicQuestion: frozenset(
+        ["column_col_count", "max_row_count", "min_row_count", "row_count"]
+    ),
+    ImageBlock: frozenset(["image_fit", "image_height", "image_width"]),
+    PanelBlock: frozenset(["inner_indent"]),
+    PanelDynamicBlock: frozenset(["inner_indent", "min_panel_count", "panel_count"]),
+    Survey: frozenset(
+        [
+            "logo_height",
+            "logo_width",
+            "show_completed_page",
+            "show_page_numbers",
+            "survey_show_data_saving",
+        ]
+    ),
+}
+
+# Validator options that are only used on the server.
+SERVER_VALIDATOR_KEYS = frozenset(["check_deliverability"])
+
+# Lists of models that are streamed one element at a time by iter_json.
+STREAMED_KEYS = frozenset(["pages", "questions"])
+
+# Translatable keys inside choices, columns, rows and other item dictionaries.
+LOCALIZABLE_ITEM_KEYS = frozenset(["html", "placeHolder", "text", "title"])
+
+LOCALE_KEY = re.compile(r"^([a-z]{2,3}(-[a-z0-9]{2,4})?|default)$", re.IGNORECASE)
+
+LOCALIZABLE_TYPE = Union[str, Dict[str, str]]
+
+_serializers = {}
+
+
+@lru_cache(maxsize=LOCALE_CHAIN_CACHE_SIZE)
+def get_locale_chain(locale: str):
+    """
+    Get the fallback chain for a locale. A regional locale falls back to its
+    language, and all locales fall back to the SurveyJS default texts.
+
+    :param locale:
+        The locale code, like `de` or `zh-cn`.
+
+    :Returns:
+        A tuple of locale keys, in the order they are tried.
+    """
+    chain = [locale]
+    if "-" in locale:
+        chain.append(locale.split("-")[0])
+    chain.extend(["default", "en"])
+    return tuple(dict.fromkeys(chain))
+
+
+def localize(texts: Dict[str, str], locale: str):
+    """
+    Get the text for a locale from a dictionary of translations, following the
+    locale fallback chain. If no text is found, the first translation is used.
+
+    :param texts:
+        Dictionary of translations, keyed by locale.
+    :param locale:
+        The locale code.
+
+    :Returns:
+        The translated text.
+    """
+    for key in get_locale_chain(locale):
+        text = texts.get(key)
+        if text is not None:
+            return text
+    for text in texts.values():
+        return text
+    return ""
+
+
+def translation_locales(value: Any):
+    """
+    Find all the locale keys used in the translated texts of a model. Any
+    dictionary key that looks like a locale is included, so the result may
+    have more locales than the translations really use, but never less.
+
+    :param value:
+        The model, or any value that may contain models.
+
+    :Returns:
+        A frozenset of locale keys.
+    """
+    locales = set()
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, BaseModel):
+            pending.extend(value.__dict__.values())
+        elif isinstance(value, list):
+            pending.extend(value)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if isinstance(key, str) and LOCALE_KEY.match(key):
+                    locales.add(key)
+                pending.append(item)
+    return frozenset(locales)
+
+
+def locale_key(locale: str, locales: frozenset):
+    """
+    Get a cache key for the output of a model sliced to a locale. Locales that
+    pick the same translations give the same output, so they get the same
+    key, and the number of keys is bounded by the locales the model uses,
+    whatever locales are requested.
+
+    :param locale:
+        The requested locale, or :data:`None`.
+    :param locales:
+        The locales used by the model, see :func:`translation_locales`.
+
+    :Returns:
+        The key, or :data:`None` if no locale is given.
+    """
+    if not locale:
+        return None
+    chain = tuple(key for key in get_locale_chain(locale) if key in locales)
+    # SurveyJS locales are also set on the survey, so they always differ.
+    return (locale if locale in LOCALES else None, chain)
+
+
+def _is_translation(value: Any):
+    return (
+        isinstance(value, dict)
+        and len(value) > 0
+        and all(isinstance(key, str) and LOCALE_KEY.match(key) for key in value)
+    )
+
+
+def _to_data(value: Any, exclude_defaults: bool = False, locale: str = None):
+    """
+    Convert any value that may contain models to plain JSON serializable data.
+    """
+    if isinstance(value, BaseModel):
+        serializer = get_serializer(value.__class__)
+        return serializer.to_data(value, exclude_defaults, locale)
+    if isinstance(value, list):
+        return [_to_data(item, exclude_defaults, locale) for item in value]
+    if isinstance(value, dict):
+        data = {}
+        for key, item in value.items():
+            if locale and key in LOCALIZABLE_ITEM_KEYS and _is_translation(item):
+                data[key] = localize(item, locale)
+            else:
+                data[key] = _to_data(item, exclude_defaults, locale)
+        return data
+    return value
+
+
+class ModelSerializer(object):
+    """
+    Serializer for one model class. The list of emitted fields is computed when
+    the serializer is created, along with their aliases and default values.
+
+    :param model_class:
+        The model class to be serialized.
+    :param keys:
+        The names of the fields to emit. If :data:`None`, all fields are
+        emitted.
+    :param exclude:
+        The names of fields that are never emitted.
+    """
+
+    def __init__(
+        self,
+        model_class: Type[BaseModel],
+        keys: frozenset = None,
+        exclude: frozenset = frozenset(),
+    ):
+        self.model_class = model_class
+        self.keys = keys
+        self.exclude = exclude
+        self.field_count = len(model_class.__fields__)
+        kept = set(REQUIRED_KEYS)
+        for base in model_class.__mro__:
+            kept.update(SURVEYJS_DEFAULT_MISMATCHES.get(base, ()))
+        self.fields = []
+        for name, field in model_class.__fields__.items():
+            if keys is not None and name not in keys or name in exclude:
+                continue
+            model_type = isinstance(field.type_, type) and issubclass(
+                field.type_, BaseModel
+            )
+            plain = not field.sub_fields and not model_type
+            required = name in kept
+            localizable = field.outer_type_ == LOCALIZABLE_TYPE
+            self.fields.append(
+                (name, field.alias, field.default, plain, required, localizable)
+            )
+        self.streamed = any(field[0] in STREAMED_KEYS for field in self.fields)
+
+    def to_data(
+        self, model: BaseModel, exclude_defaults: bool = False, locale: str = None
+    ):
+        """
+        Get a dictionary with the serializable data for a model.
+
+        :param model:
+            The model instance to serialize.
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+
+        :Returns:
+            A dictionary that uses the SurveyJS names as keys.
+        """
+        data = {}
+        values = model.__dict__
+        for name, alias, default, plain, required, localizable in self.fields:
+            value = values[name]
+            if exclude_defaults and not required and value == default:
+                continue
+            if not plain:
+                if localizable and locale and isinstance(value, dict):
+                    value = localize(value, locale)
+                else:
+                    value = _to_data(value, exclude_defaults, locale)
+            data[alias] = value
+        for name, value in self._extra_items(values):
+            data[name] = _to_data(value, exclude_defaults, locale)
+        return data
+
+    def _extra_items(self, values: Dict[str, Any]):
+        """
+        Extra attributes are emitted under their own names.
+        """
+        if len(values) <= self.field_count:
+            return
+        fields = self.model_class.__fields__
+        for name, value in values.items():
+            if name in fields or self.keys is not None and name not in self.keys:
+                continue
+            if name in self.exclude:
+                continue
+            yield name, value
+
+    def to_json(
+        self, model: BaseModel, exclude_defaults: bool = False, locale: str = None
+    ):
+        """
+        Serialize a model to JSON.
+
+        :param model:
+            The model instance to serialize.
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+
+        :Returns:
+            The JSON string.
+        """
+        return dumps(self.to_data(model, exclude_defaults, locale))
+
+    def iter_json(
+        self, model: BaseModel, exclude_defaults: bool = False, locale: str = None
+    ):
+        """
+        Serialize a model to JSON in chunks. Surveys and pages are streamed
+        field by field and question by question, so the full JSON string is
+        never built. The joined chunks are identical to the output of
+        :meth:`to_json`.
+
+        :param model:
+            The model instance to serialize.
+        :param exclude_defaults:
+            Set to :data:`True` to leave out fields that have their default
+            values.
+        :param locale:
+            If given, translated texts are replaced with the text for this
+            locale.
+
+        :Returns:
+            A generator of JSON string chunks.
+        """
+        if not self.streamed:
+            yield self.to_json(model, exclude_defaults, locale)
+            return
+        separator = "{"
+        values = model.__dict__
+        for name, alias, default, plain, required, localizable in self.fields:
+            value = values[name]
+            if exclude_defaults and not required and value == default:
+                continue
+            key = f"{separator}{dumps(alias)}: "
+            separator = ", "
+            if name in STREAMED_KEYS and isinstance(value, list):
+                yield key + "["
+                for index, item in enumerate(value):
+                    if index > 0:
+                        yield ", "
+                    serializer = get_serializer(item.__class__)
+                    yield from serializer.iter_json(item, exclude_defaults, locale)
+                yield "]"
+            else:
+                if not plain:
+                    if localizable and locale and isinstance(value, dict):
+                        value = localize(value, locale)
+                    else:
+                        value = _to_data(value, exclude_defaults, locale)
+                yield key + dumps(value)
+        for name, value in self._extra_items(values):
+            value = _to_data(value, exclude_defaults, locale)
+            yield f"{separator}{dumps(name)}: {dumps(value)}"
+            separator = ", "
+        yield "{}" if separator == "{" else "}"
+
+
+def get_serializer(model_class: Type[BaseModel]):
+    """
+    Get the serializer for a model class, creating it the first time it is
+    requested. Questions only emit the question keys known to SurveyJS, while
+    pages and surveys use their own key sets. Any other model, like the
+    validators, emits all its fields, except for server side validator
+    options.
+
+    :param model_class:
+        The model class to be serialized.
+
+    :Returns:
+        The :class:`ModelSerializer` for the class.
+    """
+    serializer = _serializers.get(model_class)
+    if serializer is None:
+        keys = None
+        exclude = frozenset()
+        if issubclass(model_class, Question):
+            keys = QUESTION_KEYS
+        elif issubclass(model_class, Page):
+            keys = PAGE_KEYS | {"questions"}
+        elif issubclass(model_class, Survey):
+            keys = SURVEY_KEYS | {"pages"}
+        elif issubclass(model_class, Validator):
+            exclude = SERVER_VALIDATOR_KEYS
+        serializer = ModelSerializer(model_class, keys, exclude)
+        _serializers[model_class] = serializer
+    return serializer
+
+
+def to_data(
+    model: BaseModel, exclude_defaults: bool = False, locale: str = None
+) -> Dict[str, Any]:
+    """
+    Get a dictionary with the serializable data for any questions model.
+
+    :param model:
+        The model instance to serialize.
+    :param exclude_defaults:
+        Set to :data:`True` to leave out fields that have their default
+        values.
+    :param locale:
+        If given, translated texts are replaced with the text for this locale.
+
+    :Returns:
+        A dictionary that uses the SurveyJS names as keys.
+    """
+    return get_serializer(model.__class__).to_data(model, exclude_defaults, locale)
+
+
+def dumps(data: Any, canonical: bool = False):
+    """
+    Dump serializable data to JSON, encoding any special types the same way
+    pydantic does. Canonical JSON has sorted keys and no extra whitespace, so
+    equal data always produces the same bytes.
+    """
+    if canonical:
+        return json.dumps(
+            data, default=pydantic_encoder, sort_keys=True, separators=(",", ":")
+        )
+    return json.dumps(data, default=pydantic_encoder)
+
+
+def to_json(
+    model: BaseModel,
+    exclude_defaults: bool = False,
+    canonical: bool = False,
+    locale: str = None,
+) -> str:
+    """
+    Serialize any questions model to JSON.
+
+    :param model:
+        The model instance to serialize.
+    :param exclude_defaults:
+        Set to :data:`True` to leave out fields that have their default
+        values.
+    :param canonical:
+        Set to :data:`True` to sort the keys and leave out extra whitespace.
+    :param locale:
+        If given, translated texts are replaced with the text for this locale.
+
+    :Returns:
+        The JSON string.
+    """
+    return dumps(to_data(model, exclude_defaults, locale), canonical)
+
+
+def iter_json(model: BaseModel, exclude_defaults: bool = False, locale: str = None):
+    """
+    Serialize any questions model to JSON in chunks.
+
+    :param model:
+        The model instance to serialize.
+    :param exclude_defaults:
+        Set to :data:`True` to leave out fields that have their default
+        values.
+    :param locale:
+        If given, translated texts are replaced with the text for this locale.
+
+    :Returns:
+        A generator of JSON string chunks.
+    """
+    return get_serializer(model.__class__).iter_json(model, exclude_defaults, locale)
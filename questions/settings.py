@@ -575,3 +575,37 @@ BAR_RATING_THEMES = (
     "bars-horizontal",
     "fontawesome-stars-o",
 )
+
+COMPILED_SURVEY_CACHE_SIZE = 32
+
+EXPRESSION_CACHE_SIZE = 4096
+
+LOCALE_CHAIN_CACHE_SIZE = 256
+
+RENDER_CACHE_SIZE = 16
+
+MAX_EXPRESSION_STEPS = 500
+
+UNSAFE_REGEX_POLICY = "warn"
+
+VALIDATION_MAX_STEPS = 1000000
+
+VALIDATION_TIME_LIMIT = 5
+
+EMAIL_DOMAIN_CACHE_SIZE = 1024
+
+EMAIL_DOMAIN_CACHE_TTL = 3600
+
+CHOICES_BY_URL_CACHE_SIZE = 256
+
+CHOICES_BY_URL_CACHE_TTL = 300
+
+CHOICES_BY_URL_TIMEOUT = 10
+
+ASYNC_VALIDATION_CONCURRENCY = 10
+
+ASYNC_VALIDATION_TIMEOUT = 5
+
+LAZY_PAGE_PREFIX = "questions_lazy_page_"
+
+LAZY_PAGE_LOADING_HTML = "Loading..."
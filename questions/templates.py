@@ -1,13 +1,17 @@
 import json
 from typing import Any
 from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Union
 
 from jinja2 import Environment
 from jinja2 import PackageLoader
 from jinja2 import select_autoescape
 
+from . import hooks
 from .settings import BOOTSTRAP_URL
+from .settings import LAZY_PAGE_PREFIX
 from .settings import SUGGESTED_JS_BY_PLATFORM
 from .settings import SURVEY_JS_CDN
 from .settings import SURVEY_JS_THEMES
@@ -26,8 +30,38 @@ def _render_template(
     **context_data: Dict,
 ):
     filename = f"survey_{kind}.{platform}.jinja"
+    started = hooks.start("on_render_template")
     template = env.get_template(filename)
-    return template.render(**context_data)
+    rendered = template.render(**context_data)
+    hooks.finish("on_render_template", started, template=filename)
+    return rendered
+
+
+def _generate_template(
+    kind: str = "js",
+    platform: str = "jquery",
+    **context_data: Dict,
+):
+    filename = f"survey_{kind}.{platform}.jinja"
+    template = env.get_template(filename)
+    return template.generate(**context_data)
+
+
+def _chunks(value: Union[str, Iterable[str]]):
+    if isinstance(value, str):
+        return [value]
+    return value
+
+
+def _format_resources(js_resources: List = None, css_resources: List = None):
+    resources = []
+    for resource in js_resources or []:
+        resources.append(f'<script src="{resource}"></script>\n')
+    for resource in css_resources or []:
+        resources.append(
+            f'<link href="{resource}" type="text/css" rel="stylesheet" />\n'
+        )
+    return "".join(resources)
 
 
 def get_platform_js_resources(
@@ -90,6 +124,7 @@ def get_survey_js(
     action: str = "",
     theme: str = "defaultV2",
     platform: str = "jquery",
+    pages_url: str = "",
 ):
     """
     Get the SurveyJS initialization script and form definition.
@@ -106,6 +141,9 @@ def get_survey_js(
         The name of the SurveyJS theme to use.
     :param platform:
         The name of the supported SurveyJS platform to use.
+    :param pages_url:
+        If given, pages after the first one are loaded from this URL, with
+        the page name appended, as the user moves through the form.
 
     :Returns:
         The rendered JS as string.
@@ -117,10 +155,62 @@ def get_survey_js(
         kind="js",
         platform=platform,
         theme=theme,
-        json=form_json,
+        json_chunks=[form_json],
         data=data,
         action=action,
         html_id=html_id,
+        pages_url=pages_url,
+        lazy_page_prefix=LAZY_PAGE_PREFIX,
+    )
+
+
+def iter_survey_js(
+    form_json: Union[str, Iterable[str]] = "",
+    form_data: Dict[str, Any] = None,
+    html_id: str = "questions_form",
+    action: str = "",
+    theme: str = "defaultV2",
+    platform: str = "jquery",
+    pages_url: str = "",
+):
+    """
+    Generate the SurveyJS initialization script and form definition in chunks,
+    using the Jinja streaming API. The form JSON can itself be an iterable of
+    chunks, which are only consumed as the script is generated.
+
+    :param form_json:
+        The JSON generated from the questions form, or an iterable of JSON
+        chunks.
+    :param form_data:
+        Any form data to set on the rendered form.
+    :param html_id:
+        The HTML id of the form placeholder.
+    :param action:
+        The URL where the submitted form data will be posted.
+    :param theme:
+        The name of the SurveyJS theme to use.
+    :param platform:
+        The name of the supported SurveyJS platform to use.
+    :param pages_url:
+        If given, pages after the first one are loaded from this URL, with
+        the page name appended, as the user moves through the form.
+
+    :Returns:
+        A generator of JS string chunks.
+    """
+    if form_data is None:
+        form_data = {}
+    data = json.dumps(form_data)
+    return _generate_template(
+        kind="js",
+        platform=platform,
+        theme=theme,
+        json_chunks=_chunks(form_json),
+        data=data,
+        action=action,
+        html_id=html_id,
+        pages_url=pages_url,
+        lazy_page_prefix=LAZY_PAGE_PREFIX,
     )
 
 
@@ -151,20 +241,51 @@ def get_form_page(
     :Returns:
         The rendered HTML as string.
     """
-    resources = ""
-    if js_resources is None:
-        js_resources = []
-    if css_resources is None:
-        css_resources = []
-    for resource in js_resources:
-        resources += f'<script src="{resource}"></script>\n'
-    for resource in css_resources:
-        resources += f'<link href="{resource}" type="text/css" rel="stylesheet" />\n'
     return _render_template(
         kind="html",
         platform=platform,
         title=title,
-        resources=resources,
+        resources=_format_resources(js_resources, css_resources),
+        html_id=html_id,
+        survey_js_chunks=[survey_js],
+    )
+
+
+def iter_form_page(
+    title: str = "",
+    html_id: str = "questions_form",
+    platform: str = "jquery",
+    survey_js: Union[str, Iterable[str]] = "",
+    js_resources: List = None,
+    css_resources: List = None,
+):
+    """
+    Generate a standalone SurveyJS HTML page in chunks, using the Jinja
+    streaming API. The generated JS can itself be an iterable of chunks, like
+    the one returned by :func:`iter_survey_js`, so the page can be sent to the
+    client without ever holding all of it in memory.
+
+    :param title:
+        The form title to display.
+    :param html_id:
+        The HTML id of the form placeholder.
+    :param platform:
+        The name of the supported SurveyJS platform to use.
+    :param survey_js:
+        The generated JS to put in the form, or an iterable of JS chunks.
+    :param js_resources:
+        The list of JS resources to add to the HTMl head.
+    :param css_resources:
+        The list of CSS resources to add to the HTMl head.
+
+    :Returns:
+        A generator of HTML string chunks.
+    """
+    return _generate_template(
+        kind="html",
+        platform=platform,
+        title=title,
+        resources=_format_resources(js_resources, css_resources),
         html_id=html_id,
-        survey_js=survey_js,
+        survey_js_chunks=_chunks(survey_js),
     )
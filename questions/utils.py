@@ -1,9 +1,31 @@
 import json
+import re
+
+# SurveyJS JSON keys that don't match the snake case field names.
+RENAMED_FIELDS = {
+    "type": "kind",
+    "isAllRowRequired": "all_rows_required",
+    "format": "expression_format",
+    "max": "max_value",
+    "min": "min_value",
+    "isRequired": "required",
+}
+
+
+def to_camel_case(name):
+    name = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
+    return re.sub("([a-z0-9])([A-Z])", r"\1_\2", name).lower()
 
 
 def get_params_for_repr(params):
     param_list = []
     for name, param in sorted(params.items()):
+        if isinstance(param, list) and any(
+            hasattr(item, "__fields__") for item in param
+        ):
+            # Lists of models, like validators, use their own repr.
+            param_list.append(f"{name}=[{', '.join(repr(item) for item in param)}]")
+            continue
         param_str = json.dumps(param)
         if param_str == "true":
             param_str = "True"
@@ -11,3 +33,30 @@ def get_params_for_repr(params):
             param_str = "False"
         param_list.append(f"{name}={param_str}")
     return "\n        " + ",\n        ".join(param_list)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check if an ETag matches the value of an `If-None-Match` HTTP header. When
+    it does, the server can answer with a 304 (Not Modified) response.
+
+    :param if_none_match:
+        The value of the `If-None-Match` request header. Can be empty.
+    :param etag:
+        The current ETag for the resource, as returned by
+        :meth:`questions.Form.etag`.
+
+    :Returns:
+        :data:`True` if the ETag matches, :data:`False` otherwise.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -1,13 +1,115 @@
+import asyncio
 import re
+import threading
+import time
+import warnings
+
+from collections import deque
+from copy import copy
+from copy import deepcopy
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Mapping
+from typing import Optional
+
+import requests
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
 
 from email_validator import EmailNotValidError
+from email_validator import EmailUndeliverableError
 from email_validator import validate_email
-from simpleeval import EvalWithCompoundTypes as Evaluator
-from simpleeval import InvalidExpression
+from email_validator.deliverability import validate_email_deliverability
 
+from . import hooks
+from .expressions import compile_expression
+from .expressions import EXPRESSION_ERRORS
+from .expressions import ExpressionError
+from .expressions import is_empty
+from .expressions import is_true
+from .logic import build_logic
+from .logic import _dependency
+from .logic import check_condition
+from .logic import compile_condition
+from .logic import FormLogic
+from .logic import ROW_VARIABLES
+from .questions import ChoicesQuestion
+from .questions import Question
 from .questions import Validator
+from .questions import VALIDATOR_NAMES_TO_TYPES
+from .settings import ASYNC_VALIDATION_CONCURRENCY
+from .settings import ASYNC_VALIDATION_TIMEOUT
+from .settings import CHOICES_BY_URL_CACHE_SIZE
+from .settings import CHOICES_BY_URL_CACHE_TTL
+from .settings import CHOICES_BY_URL_TIMEOUT
+from .settings import EMAIL_DOMAIN_CACHE_SIZE
+from .settings import EMAIL_DOMAIN_CACHE_TTL
+from .settings import UNSAFE_REGEX_POLICY
+from .utils import RENAMED_FIELDS
+from .utils import to_camel_case
+
+
+DIGITS = frozenset("0123456789")
+
+REQUIRED_MESSAGE = "An answer is required"
+
+CHOICE_MESSAGE = "The answer is not one of the choices"
+
+ROWS_MESSAGE = "Invalid rows"
+
+# Answers for the "other" and "none" items of choice questions.
+OTHER_CHOICE = "other"
+NONE_CHOICE = "none"
+EXTRA_CHOICES = frozenset([OTHER_CHOICE, NONE_CHOICE])
+
+# Matrix cell types that are answered with one of the column choices.
+CHOICE_CELL_TYPES = frozenset(["checkbox", "dropdown", "radiogroup", "tagbox"])
+
+# Question types whose answers have one row per matrix row, checked with
+# the column validators. Dynamic panels have one row per panel.
+ROW_QUESTION_TYPES = frozenset(["matrixdropdown", "matrixdynamic"])
+
+# Validator types that also check empty answers. As in SurveyJS, all other
+# validators only check questions that have an answer.
+EMPTY_VALUE_VALIDATORS = frozenset(["expression"])
+
+# Relative cost of the checks of each validator type. When validation stops
+# early, cheaper checks run first, so that bad submissions are rejected with
+# as little work as possible. Required checks cost 0.
+VALIDATOR_COSTS = {
+    "numeric": 1,
+    "text": 1,
+    "regex": 2,
+    "expression": 3,
+    "email": 4,
+    "choices": 1,
+}
+
+# Cost of checking the rows of matrix questions and dynamic panels.
+ROWS_COST = 5
+
+BUDGET_MESSAGE = "The validation budget was exceeded"
+
+INVALID_SUBMISSION_MESSAGE = "The submission could not be validated"
+
+REPEATS = frozenset([sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT])
+
+# The compiled classes of the categories, like \\d, by parser code.
+CATEGORY_CLASSES = {
+    av[0][1]: re.compile(escape)
+    for escape, (op, av) in sre_parse.CATEGORIES.items()
+    if op == sre_constants.IN and av[0][0] == sre_constants.CATEGORY
+}
 
 
 class ValidationError(Exception):
@@ -16,6 +118,614 @@ class ValidationError(Exception):
     """
 
 
+class ValidationBudgetError(ValidationError):
+    """
+    Raised when validating a submission takes more steps or more time than
+    its budget allows.
+    """
+
+
+class UnsafeRegexError(ValueError):
+    """
+    Raised for regular expressions that can take exponential time to match,
+    when the regular expression policy is `reject`.
+    """
+
+
+class ValidationBudget(object):
+    """
+    The cost limits for validating one submission. Each check is charged a
+    number of steps: one for most checks, and the number of compiled
+    operations for expressions. The clock is checked between checks, so a
+    single check is never interrupted.
+
+    :param max_steps:
+        Maximum number of steps, or :data:`None` for no limit.
+    :param time_limit:
+        Maximum number of seconds, or :data:`None` for no limit.
+    """
+
+    __slots__ = ("steps", "deadline")
+
+    def __init__(self, max_steps: int = None, time_limit: float = None):
+        self.steps = max_steps
+        self.deadline = None
+        if time_limit is not None:
+            self.deadline = time.monotonic() + time_limit
+
+    def charge(self, steps: int):
+        """Charge a number of steps to the budget.
+
+        :Raises:
+            ValidationBudgetError if the steps or the time run out.
+        """
+        if self.steps is not None:
+            self.steps -= steps
+            if self.steps < 0:
+                raise ValidationBudgetError("Too many validation steps")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ValidationBudgetError("Validation took too long")
+
+
+# Character sets are tuples of the code points they contain, the compiled
+# classes of categories and wide ranges they contain, and, if they contain
+# every character above Latin-1 that is not listed, the classes they exclude.
+LATIN_CHARACTERS = frozenset(range(256))
+WIDE_CHARACTERS = list("\u0100\u0394\u0416\u0660\u2014\u2028\u2192\u3000\u4e2d\uff10")
+SAMPLE_CHARACTERS = [chr(code) for code in range(256)] + WIDE_CHARACTERS
+NO_CHARACTERS = (frozenset(), (), None)
+
+
+def _matches(classes: tuple, characters: Iterable[str]):
+    return any(pattern.match(char) for pattern in classes for char in characters)
+
+
+def _wide_overlap(excluded: tuple, points: frozenset, classes: tuple):
+    wide = [chr(point) for point in points if point > 255]
+    wide.extend(char for char in WIDE_CHARACTERS if _matches(classes, char))
+    return any(not _matches(excluded, char) for char in wide)
+
+
+def _overlap(first: tuple, second: tuple):
+    points, classes, other = first
+    second_points, second_classes, second_other = second
+    if points & second_points:
+        return True
+    if other is not None and second_other is not None:
+        return True
+    if _matches(second_classes, map(chr, points)):
+        return True
+    if _matches(classes, map(chr, second_points)):
+        return True
+    if classes and second_classes:
+        for char in SAMPLE_CHARACTERS:
+            if _matches(classes, char) and _matches(second_classes, char):
+                return True
+    if other is not None and _wide_overlap(other, second_points, second_classes):
+        return True
+    return second_other is not None and _wide_overlap(second_other, points, classes)
+
+
+def _union(first: tuple, second: tuple):
+    other = first[2] if second[2] is None else second[2]
+    if first[2] is not None and second[2] is not None:
+        other = ()
+    return (first[0] | second[0], first[1] + second[1], other)
+
+
+def _character_class(op: Any, av: Any):
+    """Find the characters matched by a single character item, or
+    :data:`None` if the item is not one."""
+    if op == sre_constants.LITERAL:
+        return (frozenset([av]), (), None)
+    if op == sre_constants.NOT_LITERAL:
+        return (LATIN_CHARACTERS - {av}, (), ())
+    if op == sre_constants.ANY:
+        return (LATIN_CHARACTERS - {ord("\n")}, (), ())
+    if op != sre_constants.IN:
+        return None
+    negate = False
+    characters = NO_CHARACTERS
+    for kind, value in av:
+        if kind == sre_constants.NEGATE:
+            negate = True
+        elif kind == sre_constants.LITERAL:
+            characters = _union(characters, (frozenset([value]), (), None))
+        elif kind == sre_constants.RANGE and value[1] < 256:
+            points = frozenset(range(value[0], value[1] + 1))
+            characters = _union(characters, (points, (), None))
+        elif kind == sre_constants.RANGE:
+            pattern = re.compile(
+                f"[{re.escape(chr(value[0]))}-{re.escape(chr(value[1]))}]"
+            )
+            characters = _union(characters, (frozenset(), (pattern,), None))
+        elif kind == sre_constants.CATEGORY and value in CATEGORY_CLASSES:
+            characters = _union(
+                characters, (frozenset(), (CATEGORY_CLASSES[value],), None)
+            )
+        else:
+            return None
+    if negate:
+        points, classes, other = characters
+        latin = [char for char in SAMPLE_CHARACTERS[:256] if _matches(classes, char)]
+        excluded = points | {ord(char) for char in latin}
+        return (LATIN_CHARACTERS - excluded, (), classes)
+    return characters
+
+
+def _first_characters(items: Any):
+    """Find the characters that a parsed pattern can start with, or
+    :data:`None` if they are unknown or the pattern can be empty."""
+    for op, av in items:
+        if op == sre_constants.AT:
+            continue
+        characters = _character_class(op, av)
+        if characters is not None:
+            return characters
+        if op == sre_constants.SUBPATTERN:
+            return _first_characters(av[-1])
+        if op == sre_constants.BRANCH:
+            characters = NO_CHARACTERS
+            for branch in av[1]:
+                first = _first_characters(branch)
+                if first is None:
+                    return None
+                characters = _union(characters, first)
+            return characters
+        if op in REPEATS and av[0] > 0:
+            return _first_characters(av[2])
+        return None
+    return None
+
+
+def _subpatterns(op: Any, av: Any):
+    if op == sre_constants.SUBPATTERN:
+        return [av[-1]]
+    if op == sre_constants.BRANCH:
+        return av[1]
+    if op in REPEATS:
+        return [av[2]]
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if op == sre_constants.GROUPREF_EXISTS:
+        return [branch for branch in av[1:] if branch is not None]
+    return []
+
+
+def _has_unbounded_repeat(op: Any, av: Any):
+    if op in REPEATS and av[1] == sre_constants.MAXREPEAT:
+        return True
+    return any(
+        _has_unbounded_repeat(inner_op, inner_av)
+        for subpattern in _subpatterns(op, av)
+        for inner_op, inner_av in subpattern
+    )
+
+
+def _flatten(items: Any):
+    flat = []
+    for op, av in items:
+        if op == sre_constants.SUBPATTERN:
+            flat.extend(_flatten(av[-1]))
+        else:
+            flat.append((op, av))
+    return flat
+
+
+def _following_characters(items: list, start: int):
+    """Find the characters that can follow an item of a repeated pattern,
+    including the start of the next repetition, or :data:`None` if they are
+    unknown."""
+    characters = NO_CHARACTERS
+    for op, av in items[start:]:
+        if op == sre_constants.AT:
+            continue
+        optional = op in REPEATS and av[0] == 0
+        first = _first_characters(av[2] if optional else [(op, av)])
+        if first is None:
+            return None
+        characters = _union(characters, first)
+        if not optional:
+            return characters
+    first = _first_characters(items)
+    if first is None:
+        return None
+    return _union(characters, first)
+
+
+def _ambiguous_repetition(items: Any):
+    """Check if a repeated pattern has an unbounded quantifier that can match
+    the text of the next repetition, so that the same text can be split
+    between repetitions in many ways, like `(a+)+`. Quantifiers that must be
+    followed by a character they can't match, like `(-[a-z]+)*`, are safe."""
+    items = _flatten(items)
+    for index, (op, av) in enumerate(items):
+        if op in REPEATS and av[1] == sre_constants.MAXREPEAT:
+            repeated = _flatten(av[2])
+            characters = None
+            if len(repeated) == 1:
+                characters = _character_class(*repeated[0])
+            if characters is None:
+                return True
+            following = _following_characters(items, index + 1)
+            if following is None or _overlap(characters, following):
+                return True
+        elif _has_unbounded_repeat(op, av):
+            return True
+    return False
+
+
+def _regex_problems(items: Any, repeated: bool, problems: list):
+    for op, av in items:
+        if op in REPEATS and av[1] > 1 and _ambiguous_repetition(av[2]):
+            problems.append("nested quantifier")
+        if repeated and op == sre_constants.BRANCH:
+            seen = NO_CHARACTERS
+            for branch in av[1]:
+                first = _first_characters(branch)
+                if first is None or _overlap(first, seen):
+                    problems.append("overlapping alternatives in a quantifier")
+                    break
+                seen = _union(seen, first)
+        inner = repeated or (op in REPEATS and av[1] > 1)
+        for subpattern in _subpatterns(op, av):
+            _regex_problems(subpattern, inner, problems)
+    return problems
+
+
+def analyze_regex(pattern: str):
+    """Look for the constructs that make regular expressions take exponential
+    time to match some inputs, because of catastrophic backtracking: repeated
+    groups with an unbounded quantifier that can also match the start of the
+    next repetition, like `(a+)+` or `(\\w+\\s?)*`, and repeated alternatives
+    that can match the same text, like `(a|ab)*`.
+
+    :param pattern:
+        The regular expression.
+
+    :Returns:
+        A list with the problems found, empty if the expression is safe.
+
+    :Raises:
+        re.error if the expression is not valid.
+    """
+    return list(dict.fromkeys(_regex_problems(sre_parse.parse(pattern), False, [])))
+
+
+# What to do with unsafe regular expressions: "reject", "warn" or "allow".
+regex_policy = UNSAFE_REGEX_POLICY
+
+
+def set_regex_policy(policy: str):
+    """Set what to do with regular expression validators that can take
+    exponential time to match: `reject` raises an error when the form is
+    loaded from JSON or its checks are built, `warn` issues a warning, and
+    `allow` does nothing.
+
+    :param policy:
+        The policy name.
+    """
+    global regex_policy
+    if policy not in ("reject", "warn", "allow"):
+        raise ValueError(f"Unknown regular expression policy {policy!r}")
+    regex_policy = policy
+
+
+def check_regex(pattern: str):
+    """Apply the regular expression policy to a pattern. See
+    :func:`set_regex_policy`.
+
+    :param pattern:
+        The regular expression.
+
+    :Raises:
+        UnsafeRegexError if the expression is unsafe and the policy is
+        `reject`.
+    """
+    if regex_policy == "allow":
+        return
+    try:
+        problems = analyze_regex(pattern)
+    except re.error:
+        return
+    if not problems:
+        return
+    message = f"Unsafe regular expression {pattern!r}: {', '.join(problems)}"
+    if regex_policy == "reject":
+        raise UnsafeRegexError(message)
+    warnings.warn(message, RuntimeWarning, stacklevel=2)
+
+
+def dns_resolver(domain: str) -> Optional[bool]:
+    """Check if a domain accepts email, by looking up its MX records, or its
+    address records if there are no MX records.
+
+    :param domain:
+        The ASCII domain name.
+
+    :Returns:
+        :data:`True` if the domain accepts email, :data:`False` if it does
+        not, and :data:`None` if it could not be checked.
+    """
+    try:
+        result = validate_email_deliverability(domain, domain)
+    except EmailUndeliverableError:
+        return False
+    return None if "unknown-deliverability" in result else True
+
+
+class LookupCache(object):
+    """
+    Thread safe cache of lookup results, for checks that need network access.
+    Results are kept for a limited time, and the least recently used keys are
+    dropped when the cache is full. Concurrent lookups of the same key wait
+    for a single resolver call. Results that could not be determined, which
+    the resolver returns as :data:`None`, are not cached.
+
+    :param resolver:
+        Function that takes a key and returns the lookup result, or
+        :data:`None` if it is unknown.
+    :param ttl:
+        Seconds to keep each result.
+    :param max_size:
+        Maximum number of keys in the cache.
+    """
+
+    def __init__(self, resolver: Callable[[Any], Any], ttl: float, max_size: int):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Any):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def peek(self, key: Any):
+        """Get the cached result for a key, without calling the resolver.
+
+        :Returns:
+            The result, or :data:`None` if the key is not cached.
+        """
+        with self._lock:
+            return self._cached(key)
+
+    def get(self, key: Any):
+        """Get the result for a key, calling the resolver if it is not cached.
+
+        :Returns:
+            The result, or :data:`None` if it could not be determined.
+        """
+        with self._lock:
+            result = self._cached(key)
+            if result is not None:
+                return result
+            event = self._pending.get(key)
+            if event is None:
+                self._pending[key] = threading.Event()
+        if event is not None:
+            event.wait()
+            return self.peek(key)
+        result = None
+        try:
+            result = self.resolver(key)
+        finally:
+            with self._lock:
+                if result is not None:
+                    self._results[key] = (time.monotonic() + self.ttl, result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_size:
+                        self._results.popitem(last=False)
+                self._pending.pop(key).set()
+        return result
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._results.clear()
+
+
+class EmailDomainCache(LookupCache):
+    """
+    Cache of email domain deliverability results. Domains that could not be
+    checked count as deliverable. See :class:`LookupCache`.
+
+    :param resolver:
+        Function that takes a domain and returns :data:`True` if it accepts
+        email, :data:`False` if it doesn't, or :data:`None` if unknown.
+        Defaults to :func:`dns_resolver`.
+    :param ttl:
+        Seconds to keep each result.
+    :param max_size:
+        Maximum number of domains in the cache.
+    """
+
+    def __init__(
+        self,
+        resolver: Callable[[str], Optional[bool]] = None,
+        ttl: float = EMAIL_DOMAIN_CACHE_TTL,
+        max_size: int = EMAIL_DOMAIN_CACHE_SIZE,
+    ):
+        super().__init__(resolver or dns_resolver, ttl, max_size)
+
+    def is_deliverable(self, domain: str):
+        """Check if a domain accepts email, using the cached result if there
+        is one.
+
+        :param domain:
+            The ASCII domain name.
+
+        :Returns:
+            :data:`False` if the domain is known not to accept email,
+            :data:`True` otherwise.
+        """
+        result = self.get(domain.lower())
+        return True if result is None else result
+
+
+# Domain cache used by email validators that check deliverability.
+email_domains = EmailDomainCache()
+
+
+def set_email_resolver(
+    resolver: Callable[[str], Optional[bool]] = None,
+    ttl: float = EMAIL_DOMAIN_CACHE_TTL,
+    max_size: int = EMAIL_DOMAIN_CACHE_SIZE,
+):
+    """Replace the domain cache used by email validators that check
+    deliverability, for example to use a custom DNS resolver, or a local
+    stand-in for tests.
+
+    :param resolver:
+        The resolver function. See :class:`EmailDomainCache`.
+    :param ttl:
+        Seconds to keep each result.
+    :param max_size:
+        Maximum number of domains in the cache.
+
+    :Returns:
+        The new :class:`EmailDomainCache`.
+    """
+    global email_domains
+    email_domains = EmailDomainCache(resolver, ttl, max_size)
+    return email_domains
+
+
+def check_email(value: Any, check_deliverability: bool = False):
+    """Check if a value is a valid email address. The address syntax is
+    always checked offline. With `check_deliverability`, the domain is also
+    checked with the email domain cache.
+
+    :param value:
+        The value to be validated.
+    :param check_deliverability:
+        Set to :data:`True` to check that the domain accepts email.
+
+    :Returns:
+        If validation passes, :data:`True`, else :data:`False`. Values that
+        are not text are never valid addresses.
+    """
+    if not isinstance(value, str):
+        return False
+    try:
+        address = validate_email(value, check_deliverability=False)
+    except EmailNotValidError:
+        return False
+    if check_deliverability:
+        return email_domains.is_deliverable(address.ascii_domain)
+    return True
+
+
+def fetch_choices(url: str, path: str = "", value_name: str = ""):
+    """Load the choices of a question from a `choices_by_url` source, the way
+    SurveyJS does. The URL must return a JSON array of choices, or an object
+    that contains the array at the given path.
+
+    :param url:
+        The URL for the choices.
+    :param path:
+        Path to the array in the response, with the property names separated
+        by semicolons or commas.
+    :param value_name:
+        The property that has the value of each choice. Choices that are not
+        objects are used as values.
+
+    :Returns:
+        A frozenset with the choice values, as strings, or :data:`None` if the
+        choices could not be loaded.
+    """
+    try:
+        response = requests.get(url, timeout=CHOICES_BY_URL_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    for name in re.split("[;,]", path) if path else ():
+        if not isinstance(data, dict):
+            return None
+        data = data.get(name)
+    if not isinstance(data, list):
+        return None
+    values = set()
+    for item in data:
+        if isinstance(item, dict):
+            item = item.get(value_name or "value")
+        if item is not None:
+            values.add(str(item))
+    return frozenset(values)
+
+
+class ChoicesCache(LookupCache):
+    """
+    Cache of the choices loaded from `choices_by_url` sources. See
+    :class:`LookupCache`.
+
+    :param fetcher:
+        Function that takes the URL, path and value name of a source, and
+        returns the set of choice values as strings, or :data:`None` if they
+        could not be loaded. Defaults to :func:`fetch_choices`.
+    :param ttl:
+        Seconds to keep the choices of each source.
+    :param max_size:
+        Maximum number of sources in the cache.
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, str, str], Optional[frozenset]] = None,
+        ttl: float = CHOICES_BY_URL_CACHE_TTL,
+        max_size: int = CHOICES_BY_URL_CACHE_SIZE,
+    ):
+        fetcher = fetcher or fetch_choices
+        super().__init__(lambda source: fetcher(*source), ttl, max_size)
+
+    def choices(self, url: str, path: str = "", value_name: str = ""):
+        """Get the choices of a source, using the cached choices if there are
+        any.
+
+        :Returns:
+            A frozenset with the choice values, as strings, or :data:`None`
+            if the choices could not be loaded.
+        """
+        return self.get((url, path, value_name))
+
+
+# Choices cache used by asynchronous validation of choices_by_url questions.
+url_choices = ChoicesCache()
+
+
+def set_choices_fetcher(
+    fetcher: Callable[[str, str, str], Optional[frozenset]] = None,
+    ttl: float = CHOICES_BY_URL_CACHE_TTL,
+    max_size: int = CHOICES_BY_URL_CACHE_SIZE,
+):
+    """Replace the cache used to check answers against `choices_by_url`
+    sources, for example to load the choices with custom authentication.
+
+    :param fetcher:
+        The fetcher function. See :class:`ChoicesCache`.
+    :param ttl:
+        Seconds to keep the choices of each source.
+    :param max_size:
+        Maximum number of sources in the cache.
+
+    :Returns:
+        The new :class:`ChoicesCache`.
+    """
+    global url_choices
+    url_choices = ChoicesCache(fetcher, ttl, max_size)
+    return url_choices
+
+
 def text_validator(validator: Validator, value: Any, form_data: Dict[str, Any]):
     """Validate length of a text value, and whether digits are allowed.
 
@@ -60,7 +770,10 @@ def numeric_validator(validator: Validator, value: Any, form_data: Dict[str, Any
     max_value = float(validator.max_value)
     min_value = float(validator.min_value)
     result = True
-    value = float(value)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return False
     if value < min_value or max_value > 0 and value > max_value:
         result = False
     return result
@@ -79,12 +792,8 @@ def email_validator(validator: Validator, value: Any, form_data: Dict[str, Any])
     :Returns:
         If validation passes, :data:`True`, else :data:`False`.
     """
-    result = True
-    try:
-        validate_email(value)
-    except EmailNotValidError:
-        result = False
-    return result
+    check_deliverability = getattr(validator, "check_deliverability", False)
+    return check_email(value, check_deliverability)
 
 
 def regex_validator(validator: Validator, value: Any, form_data: Dict[str, Any]):
@@ -102,7 +811,7 @@ def regex_validator(validator: Validator, value: Any, form_data: Dict[str, Any])
     """
     regex = validator.regex
     regex = re.compile(regex)
-    return regex.match(value) is not None
+    return regex.match(str(value)) is not None
 
 
 def expression_validator(validator: Validator, value: Any, form_data: Dict[str, Any]):
@@ -121,14 +830,9 @@ def expression_validator(validator: Validator, value: Any, form_data: Dict[str,
     expression = validator.expression
     result = True
     if expression:
-        expression = expression.replace("{", "").replace("}", "")
-        expression = expression.replace(" empty", " in [[], {}]")
-        expression = expression.replace(" notempty", " not in [[], {}]")
-        expression = expression.replace(" anyof ", " in ")
         try:
-            evaluator = Evaluator(names=form_data)
-            result = evaluator.eval(expression) is True
-        except (ValueError, TypeError, SyntaxError, KeyError, InvalidExpression):
+            result = is_true(compile_expression(expression)(form_data))
+        except (ExpressionError,) + EXPRESSION_ERRORS:
             result = False
     return result
 
@@ -157,3 +861,1253 @@ def call_validator(validator: Validator, value: Any, form_data: Dict[str, Any]):
     """
     validator_method = VALIDATORS[validator.kind]
     return validator_method(validator, value, form_data)
+
+
+def compile_text_validator(validator: Validator):
+    """Build a text validation check, with the length limits converted once.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data.
+    """
+    max_length = int(validator.max_length)
+    min_length = int(validator.min_length)
+    allow_digits = validator.allow_digits
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        value = str(value)
+        length = len(value)
+        if length < min_length or max_length > 0 and length > max_length:
+            return False
+        return allow_digits or DIGITS.isdisjoint(value)
+
+    return check
+
+
+def compile_numeric_validator(validator: Validator):
+    """Build a numeric validation check, with the limits converted once.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data.
+    """
+    max_value = float(validator.max_value)
+    min_value = float(validator.min_value)
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        return not (value < min_value or max_value > 0 and value > max_value)
+
+    return check
+
+
+def compile_email_validator(validator: Validator):
+    """Build an email validation check.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data.
+    """
+    check_deliverability = getattr(validator, "check_deliverability", False)
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        return check_email(value, check_deliverability)
+
+    return check
+
+
+def compile_regex_validator(validator: Validator):
+    """Build a regular expression check, with the expression compiled once.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data.
+
+    :Raises:
+        UnsafeRegexError if the expression can take exponential time, see
+        :func:`check_regex`.
+    """
+    check_regex(validator.regex)
+    match = re.compile(validator.regex).match
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        return match(value if isinstance(value, str) else str(value)) is not None
+
+    return check
+
+
+def compile_expression_validator(validator: Validator):
+    """Build an expression check, using the shared compiled expression.
+    Expressions that can't be compiled always fail.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data.
+    """
+    expression = validator.expression
+    if not expression:
+        return lambda value, form_data: True
+    try:
+        evaluate = compile_expression(expression).evaluate
+    except ExpressionError:
+        return lambda value, form_data: False
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        try:
+            return is_true(evaluate(form_data))
+        except EXPRESSION_ERRORS:
+            return False
+
+    return check
+
+
+VALIDATOR_COMPILERS = {
+    "text": compile_text_validator,
+    "numeric": compile_numeric_validator,
+    "email": compile_email_validator,
+    "regex": compile_regex_validator,
+    "expression": compile_expression_validator,
+}
+
+
+def validator_steps(validator: Validator):
+    """Get the budget steps charged for running a validator: the number of
+    compiled operations for expressions, and one for other validators.
+
+    :param validator:
+        The validator.
+
+    :Returns:
+        The number of steps.
+    """
+    if validator.kind == "expression" and validator.expression:
+        try:
+            return compile_expression(validator.expression).steps
+        except ExpressionError:
+            pass
+    return 1
+
+
+def compile_validator(validator: Validator) -> Callable[[Any, Dict[str, Any]], bool]:
+    """Build the check function for a validator, depending on validator type.
+    The check gives the same results as :func:`call_validator`, but all the
+    work that only depends on the validator is done once. Validators that have
+    no server side check, like custom SurveyJS validators, always pass.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The check function, which takes the value and the form data, and
+        returns :data:`True` if validation passes.
+    """
+    compiler = VALIDATOR_COMPILERS.get(validator.kind)
+    if compiler is None:
+        return lambda value, form_data: True
+    return compiler(validator)
+
+
+def choice_values(choices: list):
+    """Get the values of a list of choices, as strings. Choices can be plain
+    values, or dictionaries with a `value` and a `text`. Dictionaries with no
+    value use their text as value.
+
+    :param choices:
+        The question choices.
+
+    :Returns:
+        A set with the choice values.
+    """
+    values = set()
+    for choice in choices:
+        if isinstance(choice, dict):
+            choice = choice.get("value", choice.get("text"))
+            if choice is None or isinstance(choice, dict):
+                continue
+        values.add(str(choice))
+    return values
+
+
+def choice_numbers(element: Question):
+    """Get the numbers that SurveyJS adds to the choices of a dropdown
+    question, from `choices_min` to `choices_max`, every `choices_step`.
+
+    :param element:
+        The question.
+
+    :Returns:
+        A range with the numbers, or :data:`None` if the question adds none.
+    """
+    minimum = getattr(element, "choices_min", 0)
+    maximum = getattr(element, "choices_max", 0)
+    if maximum <= minimum:
+        return None
+    return range(minimum, maximum + 1, max(getattr(element, "choices_step", 1), 1))
+
+
+def _in_numbers(text: str, numbers: Optional[range]):
+    if numbers is None:
+        return False
+    try:
+        number = float(text)
+    except ValueError:
+        return False
+    return number.is_integer() and int(number) in numbers
+
+
+class ItemData(Mapping):
+    """
+    The form data seen by `choices_visible_if` conditions, with the choice
+    being checked as `item`.
+
+    :param item:
+        The choice value.
+    :param form_data:
+        The form data.
+    """
+
+    __slots__ = ("item", "form_data")
+
+    def __init__(self, item: Any, form_data: Mapping):
+        self.item = item
+        self.form_data = form_data
+
+    def __getitem__(self, name: str):
+        if name == "item":
+            return self.item
+        return self.form_data[name]
+
+    def __iter__(self):
+        yield "item"
+        yield from self.form_data
+
+    def __len__(self):
+        return len(self.form_data) + 1
+
+
+def compile_choices_check(element: Question):
+    """Build a check that answers are one of the choices of a question. The
+    choice values are put in a frozenset once, so each answer is checked with
+    a single lookup, however long the list of choices is. Multiple answers,
+    as given by checkbox and tag box questions, are checked one by one. If
+    the question has a `choices_visible_if` condition, answers must also be
+    visible choices, with the answer as `{item}`. The numbers that dropdown
+    questions add to their choices with `choices_min` and `choices_max` are
+    checked as a range, so large ranges need no memory.
+
+    :param element:
+        The question.
+
+    :Returns:
+        The check function, which takes the value and the form data, or
+        :data:`None` if the question has no fixed choices. Questions that load
+        their choices with `choices_by_url` have no fixed choices.
+    """
+    if (
+        not isinstance(element, ChoicesQuestion)
+        and element.kind not in CHOICE_CELL_TYPES
+    ):
+        return None
+    source = getattr(element, "choices_by_url", None)
+    if source and source.get("url"):
+        return None
+    choices = getattr(element, "choices", None)
+    numbers = choice_numbers(element)
+    if not choices and numbers is None:
+        return None
+    values = choice_values(choices or [])
+    if getattr(element, "has_other", False):
+        values.add(OTHER_CHOICE)
+    if getattr(element, "has_none", False):
+        values.add(NONE_CHOICE)
+    values = frozenset(values)
+    condition = compile_condition(getattr(element, "choices_visible_if", ""))
+
+    def check(value: Any, form_data: Dict[str, Any]):
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            text = str(item)
+            if text not in values and not _in_numbers(text, numbers):
+                return False
+            if condition is not None and text not in EXTRA_CHOICES:
+                if not check_condition(condition, ItemData(item, form_data), True):
+                    return False
+        return True
+
+    return check
+
+
+def compile_async_email_validator(validator: Validator):
+    """Build an asynchronous email check, for validators that check
+    deliverability. The syntax is checked inline, and domains that are not
+    in the domain cache are looked up in the default executor of the event
+    loop.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The coroutine check function, which takes the value and the form data,
+        or :data:`None` if the validator does no network checks.
+    """
+    if not getattr(validator, "check_deliverability", False):
+        return None
+
+    async def check(value: Any, form_data: Dict[str, Any]):
+        if not isinstance(value, str):
+            return False
+        try:
+            address = validate_email(value, check_deliverability=False)
+        except EmailNotValidError:
+            return False
+        domain = address.ascii_domain.lower()
+        result = email_domains.peek(domain)
+        if result is not None:
+            return result
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, email_domains.is_deliverable, domain)
+
+    return check
+
+
+ASYNC_VALIDATOR_COMPILERS = {
+    "email": compile_async_email_validator,
+}
+
+
+def compile_async_validator(validator: Validator):
+    """Build the asynchronous check for a validator that needs network
+    access. Validators that only do CPU work have no asynchronous check, and
+    run their regular check inline.
+
+    :param validator:
+        The validator instance for the current question.
+
+    :Returns:
+        The coroutine check function, which takes the value and the form data,
+        or :data:`None`.
+    """
+    compiler = ASYNC_VALIDATOR_COMPILERS.get(validator.kind)
+    if compiler is None:
+        return None
+    return compiler(validator)
+
+
+def get_choices_source(element: Question):
+    """Get the `choices_by_url` source of a question, with the values that
+    are allowed in addition to the loaded choices.
+
+    :param element:
+        The question.
+
+    :Returns:
+        A `(url, path, value_name, extra_values)` tuple, or :data:`None` if
+        the question does not load its choices from a URL.
+    """
+    source = getattr(element, "choices_by_url", None)
+    if not source or not source.get("url"):
+        return None
+    extra_values = set()
+    if getattr(element, "has_other", False):
+        extra_values.add(OTHER_CHOICE)
+    if getattr(element, "has_none", False):
+        extra_values.add(NONE_CHOICE)
+    return (
+        source["url"],
+        source.get("path", ""),
+        source.get("valueName", ""),
+        frozenset(extra_values),
+    )
+
+
+async def check_url_choices(source: tuple, value: Any):
+    """Check that an answer is one of the choices loaded from a URL. Choices
+    that are not in the choices cache are loaded in the default executor of
+    the event loop. Answers pass if the choices could not be loaded.
+
+    :param source:
+        The choices source, as returned by :func:`get_choices_source`.
+    :param value:
+        The answer, or list of answers for questions with many answers.
+
+    :Returns:
+        If validation passes, :data:`True`, else :data:`False`.
+    """
+    url, path, value_name, extra_values = source
+    choices = url_choices.peek((url, path, value_name))
+    if choices is None:
+        loop = asyncio.get_running_loop()
+        choices = await loop.run_in_executor(
+            None, url_choices.choices, url, path, value_name
+        )
+    if choices is None:
+        return True
+    values = value if isinstance(value, list) else [value]
+    return all(str(item) in choices or item in extra_values for item in values)
+
+
+async def _limited(semaphore: asyncio.Semaphore, timeout: float, check):
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(check, timeout)
+        except asyncio.TimeoutError:
+            return True
+
+
+def validator_from_json(validator: Dict[str, Any]):
+    """Create a validator object from its SurveyJS JSON definition, as used
+    in questions and matrix columns. Unknown validator types get the base
+    validator class.
+
+    :param validator:
+        The validator definition.
+
+    :Returns:
+        The validator instance.
+
+    :Raises:
+        UnsafeRegexError if the validator has an unsafe regular expression
+        and the regular expression policy is `reject`.
+    """
+    params = {}
+    for key, value in validator.items():
+        if key == "text":
+            new_key = "message"
+        elif key in RENAMED_FIELDS:
+            new_key = RENAMED_FIELDS[key]
+        else:
+            new_key = to_camel_case(key)
+        params[new_key] = value
+    validator_type = VALIDATOR_NAMES_TO_TYPES.get(validator.get("type"))
+    if validator_type is None:
+        validator_type = Validator
+        params["type"] = params.pop("kind", "")
+    validator = validator_type(**params)
+    if validator.kind == "regex":
+        check_regex(validator.regex)
+    return validator
+
+
+def column_question(column: Any, cell_type: str, choices: list = ()):
+    """Get a question for a matrix column, with the column validators and,
+    for cells that select from a list, the column choices.
+
+    :param column:
+        The column definition, as a SurveyJS JSON dictionary or a question.
+    :param cell_type:
+        The cell type of the matrix, for columns that don't set their own.
+    :param choices:
+        The choices of the matrix, for columns that don't set their own.
+
+    :Returns:
+        The question, or :data:`None` if the column has no name.
+    """
+    if isinstance(column, Question):
+        return column
+    if not isinstance(column, dict) or not column.get("name"):
+        return None
+    kind = column.get("cellType", "default")
+    if kind == "default":
+        kind = cell_type
+    params = {}
+    if kind in CHOICE_CELL_TYPES:
+        params["choices"] = column.get("choices") or choices
+        params["has_other"] = column.get("hasOther", False)
+        params["has_none"] = column.get("hasNone", False)
+    return Question(
+        type=kind,
+        name=column["name"],
+        isRequired=column.get("isRequired", False),
+        visibleIf=column.get("visibleIf", ""),
+        enableIf=column.get("enableIf", ""),
+        requiredIf=column.get("requiredIf", ""),
+        validators=[
+            validator_from_json(validator) if isinstance(validator, dict) else validator
+            for validator in column.get("validators", [])
+        ],
+        **params,
+    )
+
+
+def _add_template_elements(elements: Dict[str, Question], template_elements: list):
+    for element in template_elements:
+        if element.kind == "panel":
+            _add_template_elements(elements, element.elements)
+        else:
+            elements[element.name] = element
+
+
+def row_elements(element: Question):
+    """Get the questions that are answered once per row, for matrix questions
+    with cell inputs, or once per panel, for dynamic panels.
+
+    :param element:
+        The question.
+
+    :Returns:
+        A dictionary of questions, by name, or :data:`None` if the question
+        has no rows.
+    """
+    if element.kind == "paneldynamic":
+        elements = {}
+        _add_template_elements(elements, element.template_elements)
+        return elements
+    if element.kind in ROW_QUESTION_TYPES:
+        elements = {}
+        for column in element.columns:
+            question = column_question(column, element.cell_type, element.choices)
+            if question is not None:
+                elements[question.name] = question
+        return elements
+    return None
+
+
+class RowData(Mapping):
+    """
+    The form data seen by the checks for one matrix row or dynamic panel.
+    Answers in the row come first, and the whole row can also be used as
+    `row` or `panel`, as in SurveyJS expressions. Other names are looked up
+    in the form data.
+
+    :param row:
+        The row answers.
+    :param form_data:
+        The form data of the question that has the rows.
+    """
+
+    __slots__ = ("row", "form_data")
+
+    def __init__(self, row: Mapping, form_data: Mapping):
+        self.row = row
+        self.form_data = form_data
+
+    def __getitem__(self, name: str):
+        if name in ROW_VARIABLES:
+            return self.row
+        if name in self.row:
+            return self.row[name]
+        return self.form_data[name]
+
+    def __iter__(self):
+        yield from self.row
+        yield from ROW_VARIABLES
+        yield from self.form_data
+
+    def __len__(self):
+        return len(self.row) + len(ROW_VARIABLES) + len(self.form_data)
+
+
+def entry_variables(element: Question):
+    """Find the answers used by the checks of a question, other than its own
+    answer: the variables of its expression validators and of its
+    `choices_visible_if` condition.
+
+    :param element:
+        The question.
+
+    :Returns:
+        A set with the lowercase names of the answers.
+    """
+    conditions = []
+    for validator in element.validators:
+        if validator.kind == "expression" and validator.expression:
+            try:
+                conditions.append(compile_expression(validator.expression))
+            except ExpressionError:
+                pass
+    condition = compile_condition(getattr(element, "choices_visible_if", ""))
+    if condition is not None:
+        conditions.append(condition)
+    names = set()
+    for condition in conditions:
+        for variable in condition.variables:
+            name = _dependency(variable)
+            if name is not None and name != "item":
+                names.add(name)
+    return names
+
+
+def _iter_rows(value: Any):
+    if isinstance(value, Mapping):
+        return iter(value.items())
+    if isinstance(value, (list, tuple)):
+        return enumerate(value)
+    return None
+
+
+class ValidationPlan(object):
+    """
+    A flat list of prebuilt checks for the questions of a form. Plans are
+    built once per compiled form and reused for every validation. Plans can
+    be pickled; the checks are built again from the questions when the plan
+    is loaded.
+
+    Each entry of the plan has the question name, whether an answer is
+    required, and the checks for its validators, as (check, message,
+    check_empty) tuples. Questions with fixed choices get one more check, for
+    the answer being one of the choices. Empty answers fail required
+    questions, and are only checked by the validators that have `check_empty`
+    set.
+
+    Matrix questions with cell inputs and dynamic panels also get a plan for
+    their rows, built from the column validators or the template questions,
+    which checks each row in a single pass. Row errors use paths like
+    `orders[17].quantity` as the question name.
+
+    If the form has conditional logic, it is evaluated before the checks:
+    hidden and disabled questions are not validated, and questions are also
+    required when their `required_if` condition is true.
+
+    :param form_elements:
+        Dictionary of all question elements in the form, by name.
+    :param logic:
+        The :class:`questions.logic.FormLogic` of the form. If :data:`None`,
+        it is built from the conditions of the questions, which is enough for
+        forms that have no conditions on panels, pages or calculated values.
+    """
+
+    def __init__(self, form_elements: Dict[str, Question], logic: FormLogic = None):
+        self.form_elements = dict(form_elements)
+        if logic is None:
+            logic = build_logic(self.form_elements.values())
+        self.logic = logic
+        self.async_checks = {}
+        self.choices_sources = {}
+        self.row_plans = {}
+        for position, (name, element) in enumerate(self.form_elements.items()):
+            for index, validator in enumerate(element.validators):
+                async_check = compile_async_validator(validator)
+                if async_check is not None:
+                    self.async_checks[position, index] = async_check
+            source = get_choices_source(element)
+            if source is not None:
+                self.choices_sources[name] = source
+            elements = row_elements(element)
+            if elements:
+                row_logic = None
+                if element.kind == "paneldynamic":
+                    row_logic = build_logic(element.template_elements)
+                self.row_plans[name] = ValidationPlan(elements, row_logic)
+        self.positions = {
+            name: position for position, name in enumerate(self.form_elements)
+        }
+        # Positions of the entries whose checks use each answer, by lowercase
+        # name, for incremental validation.
+        self.readers = {}
+        for position, (name, element) in enumerate(self.form_elements.items()):
+            variables = entry_variables(element)
+            if name in self.row_plans:
+                variables.update(self.row_plans[name].variables)
+            for variable in variables:
+                self.readers.setdefault(variable, set()).add(position)
+        #: The lowercase names of all the answers used by checks and logic.
+        self.variables = frozenset(self.readers).union(
+            logic.readers if logic is not None else ()
+        )
+        self.has_network_checks = bool(
+            self.async_checks
+            or self.choices_sources
+            or any(plan.has_network_checks for plan in self.row_plans.values())
+        )
+        entries = []
+        kinds = {}
+        check_steps = {}
+        for name, element in self.form_elements.items():
+            check_steps[name] = [
+                validator_steps(validator) for validator in element.validators
+            ]
+            checks = [
+                (
+                    compile_validator(validator),
+                    validator.message,
+                    validator.kind in EMPTY_VALUE_VALIDATORS,
+                )
+                for validator in element.validators
+            ]
+            kinds[name] = [validator.kind for validator in element.validators]
+            choices_check = compile_choices_check(element)
+            if choices_check is not None:
+                checks.append((choices_check, CHOICE_MESSAGE, False))
+                kinds[name].append("choices")
+                condition = compile_condition(
+                    getattr(element, "choices_visible_if", "")
+                )
+                check_steps[name].append(1 + (condition.steps if condition else 0))
+            entries.append((name, element.required, tuple(checks)))
+        self.entries = tuple(entries)
+
+        conditionally_required = frozenset()
+        if logic is not None:
+            conditionally_required = logic.conditionally_required
+        # The budget steps charged for each entry. Rows are charged one by
+        # one by the row plans.
+        self.entry_steps = tuple(
+            1 + sum(check_steps[name]) for name, required, checks in self.entries
+        )
+        steps = []
+        for position, (name, required, checks) in enumerate(self.entries):
+            # Required steps have no check, and keep the static required flag
+            # in place of check_empty. The last item is the budget steps.
+            if required or name in conditionally_required:
+                steps.append(
+                    (0, position, -1, name, None, REQUIRED_MESSAGE, required, 1)
+                )
+            for index, (check, message, check_empty) in enumerate(checks):
+                cost = VALIDATOR_COSTS.get(kinds[name][index], 0)
+                steps.append(
+                    (
+                        cost,
+                        position,
+                        index,
+                        name,
+                        check,
+                        message,
+                        check_empty,
+                        check_steps[name][index],
+                    )
+                )
+            row_plan = self.row_plans.get(name)
+            if row_plan is not None:
+                steps.append(
+                    (ROWS_COST, position, len(checks), name, row_plan, None, False, 0)
+                )
+        self.steps = tuple(sorted(steps, key=lambda step: step[:3]))
+        #: The validator kinds of the checks of each entry.
+        self.check_kinds = tuple(
+            tuple(kinds[name]) for name, required, checks in self.entries
+        )
+        self._timed = None
+
+    def __reduce__(self):
+        return (self.__class__, (self.form_elements, self.logic))
+
+    def _row_errors(
+        self,
+        name: str,
+        value: Any,
+        form_data: Dict[str, Any],
+        max_errors: int = None,
+        budget: ValidationBudget = None,
+    ):
+        rows = _iter_rows(value)
+        if rows is None:
+            return [{"question": name, "message": ROWS_MESSAGE}]
+        plan = self.row_plans[name]
+        errors = []
+        for key, row in rows:
+            path = f"{name}[{key}]"
+            if not isinstance(row, Mapping):
+                errors.append({"question": path, "message": ROWS_MESSAGE})
+            else:
+                remaining = None if max_errors is None else max_errors - len(errors)
+                row_data = RowData(row, form_data)
+                for error in plan._validate(row, row_data, remaining, budget):
+                    error["question"] = f"{path}.{error['question']}"
+                    errors.append(error)
+            if max_errors is not None and len(errors) >= max_errors:
+                break
+        return errors
+
+    def _validate_bounded(
+        self,
+        answers: Mapping,
+        form_data: Mapping,
+        max_errors: int,
+        skip=frozenset(),
+        required=frozenset(),
+        budget: ValidationBudget = None,
+    ):
+        found = []
+        get = answers.get
+        for step in self.steps:
+            cost, position, index, name, check, message, check_empty, steps = step
+            if name in skip:
+                continue
+            if budget is not None:
+                budget.charge(steps)
+            value = get(name)
+            if is_empty(value):
+                if check is None:
+                    if check_empty or name in required:
+                        found.append((position, index, name, message))
+                elif check_empty and not check(value, form_data):
+                    found.append((position, index, name, message))
+            elif message is None:
+                remaining = max_errors - len(found)
+                row_errors = self._row_errors(name, value, form_data, remaining, budget)
+                for error in row_errors:
+                    found.append((position, index, error["question"], error["message"]))
+            elif check is not None and not check(value, form_data):
+                found.append((position, index, name, message))
+            if len(found) >= max_errors:
+                break
+        found.sort(key=lambda error: error[:2])
+        return [{"question": name, "message": message} for _, _, name, message in found]
+
+    def _evaluate_logic(self, form_data: Mapping, budget: ValidationBudget = None):
+        if self.logic is None:
+            return frozenset(), frozenset(), form_data
+        if budget is not None:
+            budget.charge(self.logic.steps)
+        state = self.logic.evaluate(form_data)
+        return state.skip, state.required, state.values
+
+    def _timed_plan(self):
+        """Get a copy of the plan with checks that call the `on_validator`
+        hooks. It is built the first time a validator hook is registered."""
+        if self._timed is None:
+            timed = copy(self)
+            timed.entries = tuple(
+                (
+                    name,
+                    required,
+                    tuple(
+                        (hooks.timed_check(check, kind, name), message, check_empty)
+                        for (check, message, check_empty), kind in zip(checks, kinds)
+                    ),
+                )
+                for (name, required, checks), kinds in zip(
+                    self.entries, self.check_kinds
+                )
+            )
+            steps = []
+            for step in self.steps:
+                position, index, name, check = step[1:5]
+                if check is not None and step[5] is not None:
+                    kind = self.check_kinds[position][index]
+                    check = hooks.timed_check(check, kind, name)
+                steps.append(step[:4] + (check,) + step[5:])
+            timed.steps = tuple(steps)
+            timed._timed = timed
+            self._timed = timed
+        return self._timed
+
+    def _entry_errors(
+        self,
+        position: int,
+        answers: Mapping,
+        form_data: Mapping,
+        skip=frozenset(),
+        conditionally_required=frozenset(),
+    ):
+        name, required, checks = self.entries[position]
+        if name in skip:
+            return []
+        errors = []
+        value = answers.get(name)
+        empty = is_empty(value)
+        if empty and (required or name in conditionally_required):
+            errors.append({"question": name, "message": REQUIRED_MESSAGE})
+        for check, message, check_empty in checks:
+            if empty and not check_empty:
+                continue
+            if not check(value, form_data):
+                errors.append({"question": name, "message": message})
+        if not empty and name in self.row_plans:
+            errors.extend(self._row_errors(name, value, form_data))
+        return errors
+
+    def _validate(
+        self,
+        answers: Mapping,
+        form_data: Mapping,
+        max_errors: int = None,
+        budget: ValidationBudget = None,
+    ):
+        if hooks.has_hooks("on_validator") and self._timed is not self:
+            timed = self._timed_plan()
+            return timed._validate(answers, form_data, max_errors, budget)
+        skip, conditionally_required, form_data = self._evaluate_logic(
+            form_data, budget
+        )
+        if max_errors is not None:
+            return self._validate_bounded(
+                answers, form_data, max_errors, skip, conditionally_required, budget
+            )
+        errors = []
+        get = answers.get
+        row_plans = self.row_plans
+        entry_steps = self.entry_steps
+        for position, (name, required, checks) in enumerate(self.entries):
+            if name in skip:
+                continue
+            if budget is not None:
+                budget.charge(entry_steps[position])
+            value = get(name)
+            empty = is_empty(value)
+            if empty and (required or name in conditionally_required):
+                errors.append({"question": name, "message": REQUIRED_MESSAGE})
+            for check, message, check_empty in checks:
+                if empty and not check_empty:
+                    continue
+                if not check(value, form_data):
+                    errors.append({"question": name, "message": message})
+            if not empty and name in row_plans:
+                errors.extend(self._row_errors(name, value, form_data, None, budget))
+        return errors
+
+    def validate(
+        self,
+        form_data: Dict[str, Any],
+        max_errors: int = None,
+        max_steps: int = None,
+        time_limit: float = None,
+    ):
+        """Run all the checks in the plan, or stop after a number of errors.
+        When validation stops early, the checks run from the cheapest to the
+        most expensive, with required checks first, so the errors that are
+        returned are not always the first ones in the form.
+
+        :param form_data:
+            A dictionary-like object with the form data to be validated.
+        :param max_errors:
+            Stop validating when this number of errors is found. If
+            :data:`None`, all the checks are run.
+        :param max_steps:
+            The step budget for the submission, see :class:`ValidationBudget`.
+            If :data:`None`, steps are not limited.
+        :param time_limit:
+            The time budget for the submission, in seconds. If :data:`None`,
+            time is not limited.
+
+        :Returns:
+            A list of errors, as dictionaries with the question name and the
+            error message, in form order. The list is empty if all the checks
+            pass.
+
+        :Raises:
+            ValueError if `max_errors` is less than 1.
+            ValidationBudgetError if the submission exceeds its budget.
+        """
+        if max_errors is not None and max_errors < 1:
+            raise ValueError("max_errors must be at least 1")
+        budget = None
+        if max_steps is not None or time_limit is not None:
+            budget = ValidationBudget(max_steps, time_limit)
+        return self._validate(form_data, form_data, max_errors, budget)
+
+    def validate_incremental(
+        self,
+        form_data: Dict[str, Any],
+        state: "ValidationState" = None,
+        changed: Iterable[str] = None,
+    ):
+        """Validate a submission again after some answers changed, as when a
+        form is submitted page by page. Only the checks that can give a
+        different result are run: the checks of the changed answers, of the
+        questions whose visibility or required state depends on them, and of
+        the questions whose expressions use them. The conditional logic is
+        updated in the same way.
+
+        :param form_data:
+            A dictionary-like object with all the answers so far.
+        :param state:
+            The :class:`ValidationState` from the previous validation of the
+            submission. If :data:`None`, or if the state comes from another
+            plan, all the checks are run.
+        :param changed:
+            The names of the answers that changed since the previous
+            validation. If :data:`None`, the answers are compared with the
+            ones kept by the state.
+
+        :Returns:
+            The updated :class:`ValidationState`. The state passed in is
+            changed in place.
+        """
+        if state is None or state.plan is not self:
+            state = ValidationState(self)
+            state.answers = deepcopy(dict(form_data))
+            if self.logic is not None:
+                state.logic = self.logic.evaluate(form_data)
+            positions = range(len(self.entries))
+        else:
+            answers = state.answers
+            if changed is None:
+                changed = [
+                    name
+                    for name in set(answers).union(form_data)
+                    if name not in answers
+                    or name not in form_data
+                    or answers[name] != form_data[name]
+                ]
+            for name in changed:
+                if name in form_data:
+                    answers[name] = deepcopy(form_data[name])
+                else:
+                    answers.pop(name, None)
+            names = set(changed)
+            if state.logic is not None:
+                names.update(self.logic.update(state.logic, form_data, changed))
+            positions = set()
+            for name in names:
+                if name in self.positions:
+                    positions.add(self.positions[name])
+                positions.update(self.readers.get(name.lower(), ()))
+        skip = required = frozenset()
+        values = form_data
+        if state.logic is not None:
+            skip, required, values = (
+                state.logic.skip,
+                state.logic.required,
+                state.logic.values,
+            )
+        question_errors = state.question_errors
+        for position in positions:
+            errors = self._entry_errors(position, form_data, values, skip, required)
+            if errors:
+                question_errors[position] = errors
+            else:
+                question_errors.pop(position, None)
+        return state
+
+    async def _arow_errors(self, name, value, form_data, semaphore, timeout):
+        rows = _iter_rows(value)
+        if rows is None:
+            return [{"question": name, "message": ROWS_MESSAGE}]
+        plan = self.row_plans[name]
+        rows = list(rows)
+        results = await asyncio.gather(
+            *(
+                plan._avalidate(row, RowData(row, form_data), semaphore, timeout)
+                for key, row in rows
+                if isinstance(row, Mapping)
+            )
+        )
+        results = iter(results)
+        errors = []
+        for key, row in rows:
+            path = f"{name}[{key}]"
+            if not isinstance(row, Mapping):
+                errors.append({"question": path, "message": ROWS_MESSAGE})
+                continue
+            for error in next(results):
+                error["question"] = f"{path}.{error['question']}"
+                errors.append(error)
+        return errors
+
+    async def _avalidate(self, answers, form_data, semaphore, timeout):
+        skip, conditionally_required, form_data = self._evaluate_logic(form_data)
+        errors = []
+        pending = []
+        get = answers.get
+        for position, (name, required, checks) in enumerate(self.entries):
+            if name in skip:
+                continue
+            value = get(name)
+            empty = is_empty(value)
+            if empty and (required or name in conditionally_required):
+                errors.append({"question": name, "message": REQUIRED_MESSAGE})
+            for index, (check, message, check_empty) in enumerate(checks):
+                if empty and not check_empty:
+                    continue
+                async_check = self.async_checks.get((position, index))
+                if async_check is not None:
+                    check = _limited(semaphore, timeout, async_check(value, form_data))
+                    pending.append((len(errors), name, message, check))
+                    errors.append(None)
+                elif not check(value, form_data):
+                    errors.append({"question": name, "message": message})
+            if empty:
+                continue
+            source = self.choices_sources.get(name)
+            if source is not None:
+                check = _limited(semaphore, timeout, check_url_choices(source, value))
+                pending.append((len(errors), name, CHOICE_MESSAGE, check))
+                errors.append(None)
+            row_plan = self.row_plans.get(name)
+            if row_plan is not None and row_plan.has_network_checks:
+                check = self._arow_errors(name, value, form_data, semaphore, timeout)
+                pending.append((len(errors), name, None, check))
+                errors.append(None)
+            elif row_plan is not None:
+                errors.extend(self._row_errors(name, value, form_data))
+        if not pending:
+            return errors
+        results = await asyncio.gather(*(check for _, _, _, check in pending))
+        for (slot, name, message, _), result in zip(pending, results):
+            if message is None:
+                errors[slot] = result
+            elif not result:
+                errors[slot] = [{"question": name, "message": message}]
+        return [
+            error
+            for item in errors
+            if item is not None
+            for error in (item if isinstance(item, list) else [item])
+        ]
+
+    async def avalidate(
+        self,
+        form_data: Dict[str, Any],
+        concurrency: int = ASYNC_VALIDATION_CONCURRENCY,
+        timeout: float = ASYNC_VALIDATION_TIMEOUT,
+    ):
+        """Run all the checks in the plan, running the checks that need
+        network access concurrently. CPU only checks run inline. Network
+        checks are the deliverability checks of email validators, and the
+        checks of questions that load their choices with `choices_by_url`,
+        which are only run by this method.
+
+        :param form_data:
+            A dictionary-like object with the form data to be validated.
+        :param concurrency:
+            Maximum number of network checks that run at the same time.
+        :param timeout:
+            Seconds to wait for each network check. Checks that time out pass,
+            like checks that can't get an answer from the network.
+
+        :Returns:
+            A list of errors, in the same order as :meth:`validate`.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        return await self._avalidate(form_data, form_data, semaphore, timeout)
+
+
+class ValidationState(object):
+    """
+    The result of validating a submission with
+    :meth:`ValidationPlan.validate_incremental`, kept between validations so
+    that only the checks affected by new answers are run again.
+
+    :param plan:
+        The plan that validated the submission.
+
+    .. attribute:: answers
+
+        A copy of the validated answers, used to find the answers that
+        changed.
+
+    .. attribute:: logic
+
+        The :class:`questions.logic.LogicState` of the submission, or
+        :data:`None` if the form has no conditional logic.
+    """
+
+    __slots__ = ("plan", "answers", "logic", "question_errors")
+
+    def __init__(self, plan: ValidationPlan):
+        self.plan = plan
+        self.answers = {}
+        self.logic = None
+        # The errors of each question with errors, by plan entry position.
+        self.question_errors = {}
+
+    @property
+    def errors(self):
+        """The validation errors, in the same order as
+        :meth:`ValidationPlan.validate`."""
+        return [
+            error
+            for position in sorted(self.question_errors)
+            for error in self.question_errors[position]
+        ]
+
+    @property
+    def valid(self):
+        """:data:`True` if the answers passed all the checks."""
+        return not self.question_errors
+
+
+# The validation plan used by the current batch validation worker process.
+_worker_plan = None
+
+
+def _init_worker(plan: ValidationPlan):
+    global _worker_plan
+    _worker_plan = plan
+
+
+def _validate_budgeted(
+    plan: ValidationPlan, form_data: Dict[str, Any], max_steps: int, time_limit: float
+):
+    try:
+        errors = plan.validate(form_data, max_steps=max_steps, time_limit=time_limit)
+    except ValidationBudgetError:
+        errors = [{"question": "", "message": BUDGET_MESSAGE}]
+    except Exception as error:
+        # A submission with unexpected data never stops the other ones.
+        message = f"{INVALID_SUBMISSION_MESSAGE}: {type(error).__name__}: {error}"
+        errors = [{"question": "", "message": message}]
+    return not errors, errors
+
+
+def _validate_chunk(chunk: list, max_steps: int = None, time_limit: float = None):
+    return [
+        _validate_budgeted(_worker_plan, form_data, max_steps, time_limit)
+        for form_data in chunk
+    ]
+
+
+def _chunks(submissions: Iterable[Dict[str, Any]], chunk_size: int):
+    submissions = iter(submissions)
+    while True:
+        chunk = list(islice(submissions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_many(
+    plan: ValidationPlan,
+    submissions: Iterable[Dict[str, Any]],
+    workers: int = 1,
+    chunk_size: int = 256,
+    max_steps: int = None,
+    time_limit: float = None,
+):
+    """Validate many submissions with a validation plan. With more than one
+    worker, chunks of submissions are validated by a pool of processes. Each
+    process gets the plan once, when it starts, and only a bounded number of
+    chunks is sent ahead, so the submissions can be read lazily from a very
+    large source.
+
+    :param plan:
+        The validation plan.
+    :param submissions:
+        An iterable of form data dictionaries.
+    :param workers:
+        The number of worker processes. With one worker, the submissions are
+        validated in the current process.
+    :param chunk_size:
+        The number of submissions sent to a worker at a time.
+    :param max_steps:
+        The step budget for each submission.
+    :param time_limit:
+        The time budget for each submission, in seconds.
+
+    :Returns:
+        A generator of (valid, errors) tuples, in the same order as the
+        submissions. Submissions that exceed their budget, or that can't be
+        validated at all, like form data that is not a dictionary, are
+        invalid, with a single error that has an empty question name.
+    """
+    if workers <= 1:
+        for form_data in submissions:
+            yield _validate_budgeted(plan, form_data, max_steps, time_limit)
+        return
+    max_pending = workers * 2
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(plan,)
+    ) as executor:
+        for chunk in _chunks(submissions, chunk_size):
+            pending.append(
+                executor.submit(_validate_chunk, chunk, max_steps, time_limit)
+            )
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -16,7 +16,6 @@ requirements = [
     "Jinja2",
     "pydantic==1.10.11",
     "requests",
-    "simpleeval",
 ]
 
 setup(
@@ -41,8 +40,10 @@ setup(
             "download_surveyjs=questions.cli:download_surveyjs",
             "list_resources=questions.cli:list_resources",
             "generate_code=questions.cli:generate_code",
+            "questions=questions.cli:main",
         ],
     },
+    extras_require={"numpy": ["numpy"]},
     install_requires=requirements,
     license="MIT license",
     long_description=readme + "\n\n" + history,
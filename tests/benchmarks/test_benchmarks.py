@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Benchmark suite for questions.
+
+The suite runs small forms by default, so that it is fast enough for every
+test run. Set `QUESTIONS_BENCH_SIZES` to a comma separated list of numbers of
+questions to benchmark bigger forms, and `QUESTIONS_BENCH_OUTPUT` to a file
+path to save the results as JSON, for example::
+
+    QUESTIONS_BENCH_SIZES=100,10000 QUESTIONS_BENCH_OUTPUT=bench.json \\
+        pytest tests/benchmarks
+"""
+
+import json
+import os
+
+import pytest
+
+from questions import benchmarks
+from questions.questions import QUESTION_TYPES
+
+SIZES = [
+    int(size)
+    for size in os.environ.get("QUESTIONS_BENCH_SIZES", "10,50").split(",")
+    if size.strip()
+]
+
+
+def test_synthetic_form_uses_all_question_types():
+    form_class = benchmarks.synthetic_form(len(QUESTION_TYPES), depth=0)
+    elements = form_class()._form_elements
+    assert len(elements) == len(QUESTION_TYPES)
+    assert {type(element) for element in elements.values()} == set(QUESTION_TYPES)
+
+
+def test_synthetic_form_nesting():
+    form_class = benchmarks.synthetic_form(200, depth=3, branching=4)
+    test_form = form_class()
+    assert len(test_form._form_elements) == 200
+    assert test_form.page_names() == ["page0", "page1", "page2", "page3"]
+    page = test_form._construct_survey().pages[0]
+    panel = page.questions[0]
+    assert panel.kind == "panel"
+    assert panel.elements[0].kind == "panel"
+    assert len(panel.elements[0].elements) == 4
+
+
+def test_synthetic_form_locales():
+    form_class = benchmarks.synthetic_form(5, choices=3, locales=["fr", "de"])
+    form_json = json.loads(form_class().to_json(locale="fr"))
+    question = form_json["pages"][0]["questions"][0]
+    assert question["title"] == "Question 0 (fr)"
+    assert question["choices"] == ["choice0", "choice1", "choice2"]
+
+
+def test_synthetic_submission_is_valid():
+    test_form = benchmarks.synthetic_form(len(QUESTION_TYPES) * 2)()
+    form_data = benchmarks.synthetic_submission(test_form)
+    assert test_form.validate(form_data, set_errors=True), form_data["__errors__"]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_benchmark_form(size):
+    result = benchmarks.benchmark_form(size, repeat=1, submissions=5)
+    assert result["questions"] == size
+    assert list(result["operations"]) == list(benchmarks.OPERATIONS)
+    for timing in result["operations"].values():
+        assert 0 < timing["best"] <= timing["mean"]
+    assert result["operations"]["validate"]["per_second"] > 0
+    assert result["peak_memory"] > 0
+
+
+def test_run_benchmarks():
+    results = benchmarks.run_benchmarks(SIZES, locales=["es"], repeat=1)
+    assert [result["questions"] for result in results["results"]] == SIZES
+    assert results["parameters"]["locales"] == ["es"]
+    assert benchmarks.compare_results(results, results) == []
+    output = os.environ.get("QUESTIONS_BENCH_OUTPUT")
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+def test_compare_results():
+    def run(construct, memory):
+        operations = {"construct": {"best": construct}}
+        return {
+            "results": [
+                {"questions": 10, "operations": operations, "peak_memory": memory}
+            ]
+        }
+
+    assert benchmarks.compare_results(run(1.0, 100), run(1.1, 110)) == []
+    regressions = benchmarks.compare_results(run(1.0, 100), run(2.0, 100))
+    assert regressions == [
+        {
+            "questions": 10,
+            "measure": "construct",
+            "baseline": 1.0,
+            "current": 2.0,
+            "change": 1.0,
+        }
+    ]
+    regressions = benchmarks.compare_results(run(1.0, 100), run(1.0, 200), 0.5)
+    assert [regression["measure"] for regression in regressions] == ["peak_memory"]
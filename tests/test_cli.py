@@ -2,6 +2,7 @@
 
 """Tests for `cli` package."""
 
+import json
 import os
 
 from click.testing import CliRunner
@@ -36,3 +37,171 @@ def test_command_download_surveyjs():
         result = runner.invoke(cli.download_surveyjs, ["_tmp_", "jquery", "default"])
         assert result.exit_code == 0
         assert "Downloaded " in result.output
+
+
+VALIDATE_FORM_JSON = {
+    "pages": [
+        {
+            "name": "page1",
+            "elements": [
+                {"type": "text", "name": "name", "isRequired": True},
+                {
+                    "type": "text",
+                    "name": "age",
+                    "validators": [
+                        {
+                            "type": "numeric",
+                            "minValue": 18,
+                            "text": "Too young",
+                        }
+                    ],
+                },
+            ],
+        }
+    ]
+}
+
+
+def test_command_validate_ndjson():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("form.json", "w") as form_file:
+            json.dump(VALIDATE_FORM_JSON, form_file)
+        with open("answers.ndjson", "w") as answers:
+            answers.write('{"name": "Ann", "age": 30}\n')
+            answers.write('{"age": 10}\n')
+            answers.write("\n")
+            answers.write('{"name": "Bob"}\n')
+        result = runner.invoke(
+            cli.main,
+            ["validate", "form.json", "answers.ndjson", "--errors", "errors.ndjson"],
+        )
+        assert result.exit_code == 1
+        assert "3 submissions, 2 valid, 1 invalid" in result.output
+        with open("errors.ndjson") as errors_file:
+            errors = [json.loads(line) for line in errors_file]
+        assert errors == [
+            {
+                "record": 2,
+                "errors": [
+                    {"question": "name", "message": "An answer is required"},
+                    {"question": "age", "message": "Too young"},
+                ],
+            }
+        ]
+
+
+def test_command_validate_csv_module_form():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("cli_test_forms.py", "w") as module:
+            module.write(
+                "from questions import Form, TextQuestion\n\n"
+                "class AnswersForm(Form):\n"
+                "    name = TextQuestion(required=True)\n"
+                "    age = TextQuestion()\n"
+            )
+        with open("answers.csv", "w") as answers:
+            answers.write("name,age\nAnn,30\nBob,\nCarl,40\n")
+        result = runner.invoke(
+            cli.main,
+            [
+                "validate",
+                "cli_test_forms:AnswersForm",
+                "answers.csv",
+                "--workers",
+                "2",
+                "--chunk-size",
+                "1",
+            ],
+        )
+        assert result.exit_code == 0
+        assert "3 submissions, 3 valid, 0 invalid" in result.output
+
+
+def test_command_validate_csv_answers():
+    form_json = {
+        "elements": [
+            {
+                "type": "text",
+                "name": "qty",
+                "validators": [{"type": "numeric", "text": "Not a number"}],
+            },
+            {"type": "checkbox", "name": "tags", "choices": ["a", "b", "c, d"]},
+            {
+                "type": "matrix",
+                "name": "grid",
+                "columns": ["1", "2"],
+                "rows": ["r1"],
+            },
+        ]
+    }
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("form.json", "w") as form_file:
+            json.dump(form_json, form_file)
+        with open("answers.csv", "w") as answers:
+            answers.write("qty,tags,grid\n")
+            answers.write('abc,"a,b",\n')
+            answers.write('3,"[""c, d""]","{""r1"": ""2""}"\n')
+            answers.write("4,a;b,\n")
+        result = runner.invoke(
+            cli.main, ["validate", "form.json", "answers.csv", "--errors", "errors"]
+        )
+        assert result.exit_code == 1
+        assert "3 submissions, 1 valid, 2 invalid" in result.output
+        with open("errors") as errors_file:
+            errors = [json.loads(line) for line in errors_file]
+        assert [error["record"] for error in errors] == [1, 3]
+        assert errors[0]["errors"] == [{"question": "qty", "message": "Not a number"}]
+        result = runner.invoke(
+            cli.main, ["validate", "form.json", "answers.csv", "--separator", ";"]
+        )
+        assert "3 submissions, 2 valid, 1 invalid" in result.output
+
+
+def test_command_validate_bad_form():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("answers.ndjson", "w") as answers:
+            answers.write("{}\n")
+        result = runner.invoke(cli.main, ["validate", "missing", "answers.ndjson"])
+        assert result.exit_code == 2
+        result = runner.invoke(cli.main, ["validate", "os:path", "answers.ndjson"])
+        assert result.exit_code == 2
+        assert "is not a form" in result.output
+
+
+def test_command_generate_code_with_validators():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("form.json", "w") as form_file:
+            json.dump(VALIDATE_FORM_JSON, form_file)
+        result = runner.invoke(cli.generate_code, ["NewForm", "form.json"])
+    assert result.exit_code == 0
+    assert "from questions import NumericValidator" in result.output
+    assert "validators=[NumericValidator(" in result.output
+
+
+def test_command_bench():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        arguments = ["bench", "--sizes", "10", "--repeat", "1", "--submissions", "2"]
+        result = runner.invoke(cli.main, arguments + ["--output", "baseline.json"])
+        assert result.exit_code == 0
+        assert "10 questions: construct" in result.output
+        with open("baseline.json") as baseline_file:
+            baseline = json.load(baseline_file)
+        assert [result["questions"] for result in baseline["results"]] == [10]
+        # Make the baseline much faster, to get regressions.
+        for timing in baseline["results"][0]["operations"].values():
+            timing["best"] /= 100
+        with open("baseline.json", "w") as baseline_file:
+            json.dump(baseline, baseline_file)
+        result = runner.invoke(
+            cli.main, arguments + ["--output", "run.json", "--compare", "baseline.json"]
+        )
+        assert result.exit_code == 1
+        assert "Regression: construct with 10 questions" in result.output
+        result = runner.invoke(cli.main, ["bench", "--sizes", "ten"])
+        assert result.exit_code == 2
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""Tests for `columns` package."""
+
+import pytest
+
+try:
+    import numpy
+except ImportError:  # pragma: NO COVER
+    numpy = None
+
+from questions import columns
+from questions import ExpressionValidator
+from questions import form
+from questions import NumericValidator
+from questions import questions
+from questions import RegexValidator
+from questions import TextValidator
+from questions import validators
+
+
+requires_numpy = pytest.mark.skipif(numpy is None, reason="NumPy is not installed")
+
+
+class ColumnsForm(form.Form):
+    name = questions.TextQuestion(
+        required=True,
+        validators=[TextValidator(min_length=2, max_length=5, allow_digits=False)],
+    )
+    age = questions.TextQuestion(
+        validators=[NumericValidator(min_value=18, max_value=99)]
+    )
+    code = questions.TextQuestion(validators=[RegexValidator(regex="[A-Z]+$")])
+    total = questions.TextQuestion(
+        validators=[ExpressionValidator(expression="{age} empty or {age} < 90")]
+    )
+
+
+COLUMNS = {
+    "name": ["Ann", "B", "Carl0", None, "Dave", "Edwardo", ""],
+    "age": [20, 17, 45, 30, float("nan"), 100, 95],
+    "code": ["ABC", "abc", None, "X", "Y", "Z", "Q"],
+    "total": [1, 2, 3, 4, 5, 6, 7],
+}
+
+
+def _rows(data):
+    rows = []
+    for index in range(len(data["name"])):
+        row = {name: columns.to_python(data[name][index]) for name in data}
+        rows.append({key: value for key, value in row.items() if value is not None})
+    return rows
+
+
+def _expected(data):
+    test_form = ColumnsForm()
+    mask = []
+    failures = {}
+    for index, row in enumerate(_rows(data)):
+        row_errors = test_form._compile().validation_plan.validate(row)
+        mask.append(not row_errors)
+        for error in row_errors:
+            failures.setdefault(error["question"], [])
+            if index not in failures[error["question"]]:
+                failures[error["question"]].append(index)
+    return mask, failures
+
+
+def _check_matches_rows(data, vectorize):
+    expected_mask, expected_failures = _expected(COLUMNS)
+    mask, failures = ColumnsForm().validate_columns(data, vectorize=vectorize)
+    assert list(mask) == expected_mask
+    assert {name: list(failed) for name, failed in failures.items()} == (
+        expected_failures
+    )
+
+
+@pytest.mark.parametrize("vectorize", [True, False])
+def test_validate_columns_matches_rows(vectorize):
+    _check_matches_rows(COLUMNS, vectorize)
+
+
+@requires_numpy
+@pytest.mark.parametrize("vectorize", [True, False])
+def test_validate_numpy_columns_matches_rows(vectorize):
+    data = {name: numpy.array(values) for name, values in COLUMNS.items()}
+    data["name"] = numpy.array(COLUMNS["name"], dtype=object)
+    _check_matches_rows(data, vectorize)
+
+
+@requires_numpy
+def test_validate_columns_vectorized_text():
+    data = {"name": numpy.array(["Ann", "B", "Carl0", "", "Dave"])}
+    data["age"] = numpy.array([20, 20, 20, 20, 20])
+    mask, failures = ColumnsForm().validate_columns(data)
+    assert mask.tolist() == [True, False, False, False, True]
+    assert failures["name"].tolist() == [1, 2, 3]
+
+
+def test_validate_columns_without_numpy(monkeypatch):
+    monkeypatch.setattr(columns, "numpy", None)
+    mask, failures = ColumnsForm().validate_columns(COLUMNS)
+    assert mask == _expected(COLUMNS)[0]
+    assert isinstance(failures["name"], list)
+
+
+def test_validate_columns_length_mismatch():
+    with pytest.raises(ValueError):
+        ColumnsForm().validate_columns({"name": ["a"], "age": [1, 2]})
+
+
+def test_errors_by_row():
+    mask, failures = ColumnsForm().validate_columns(COLUMNS)
+    rows = columns.errors_by_row(failures)
+    assert sorted(rows) == [index for index, valid in enumerate(mask) if not valid]
+    assert "name" in rows[1]
+
+
+@pytest.mark.parametrize("vectorize", [True, False])
+def test_validate_columns_choices(vectorize):
+    plan = validators.ValidationPlan(
+        {"color": questions.DropdownQuestion(name="color", choices=["red", "green"])}
+    )
+    mask, errors = columns.validate_columns(
+        plan, {"color": ["red", "blue", None]}, vectorize=vectorize
+    )
+    assert list(mask) == [True, False, True]
+    assert list(errors["color"]) == [1]
+
+
+@pytest.mark.parametrize("vectorize", [True, False])
+@pytest.mark.parametrize(
+    "column,expected",
+    [
+        ([["red"], ["blue"], ["green"]], [True, False, True]),
+        ([["red", "green"], ["blue"], [], None], [True, False, False, False]),
+    ],
+)
+def test_validate_columns_checkbox(vectorize, column, expected):
+    plan = validators.ValidationPlan(
+        {
+            "colors": questions.CheckboxQuestion(
+                name="colors", required=True, choices=["red", "green"]
+            )
+        }
+    )
+    mask, errors = columns.validate_columns(
+        plan, {"colors": column}, vectorize=vectorize
+    )
+    assert list(mask) == expected
+    assert list(errors["colors"]) == [
+        index for index, valid in enumerate(expected) if not valid
+    ]
+    if numpy is not None and len({len(row or ()) for row in column}) == 1:
+        mask, errors = columns.validate_columns(
+            plan, {"colors": numpy.array(column)}, vectorize=vectorize
+        )
+        assert list(mask) == expected
+
+
+@pytest.mark.parametrize("vectorize", [True, False])
+def test_validate_columns_with_logic(vectorize):
+    plan = validators.ValidationPlan(
+        {
+            "smoker": questions.TextQuestion(name="smoker"),
+            "per_day": questions.TextQuestion(
+                name="per_day", required=True, visible_if="{smoker} = 'yes'"
+            ),
+        }
+    )
+    mask, errors = columns.validate_columns(
+        plan,
+        {"smoker": ["yes", "no", "yes"], "per_day": [10, None, None]},
+        vectorize=vectorize,
+    )
+    assert list(mask) == [True, True, False]
+    assert list(errors["per_day"]) == [2]
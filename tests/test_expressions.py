@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""Tests for `expressions` package."""
+
+import datetime
+import math
+import pickle
+
+import pytest
+
+from questions import expressions
+
+
+def test_tokenize():
+    tokens = expressions.tokenize("{q1} >= 5 AND {q2} notempty")
+    assert tokens == [
+        ("variable", "q1"),
+        ("operator", ">="),
+        ("number", 5),
+        ("operator", "and"),
+        ("variable", "q2"),
+        ("operator", "notempty"),
+        ("end", None),
+    ]
+
+
+def test_parse_precedence():
+    assert expressions.evaluate("1 + 2 * 3") == 7
+    assert expressions.evaluate("(1 + 2) * 3") == 9
+    assert expressions.evaluate("2 ^ 3 ^ 2") == 512
+    assert expressions.evaluate("-{a} + 2", {"a": 1}) == 1
+    assert expressions.evaluate("!{a} = 1 or {b}", {"a": 1, "b": 0}) is False
+
+
+@pytest.mark.parametrize(
+    "expression", ["", "1 +", "(1", "1 $ 2", "unknown(1)", "iif(1, 2)"]
+)
+def test_compile_errors(expression):
+    with pytest.raises(expressions.ExpressionError):
+        expressions.compile_expression(expression)
+
+
+def test_comparisons():
+    values = {"name": "Yes", "age": "42", "tags": ["a", "b"], "empty": ""}
+    assert expressions.evaluate("{name} = 'yes'", values) is True
+    assert expressions.evaluate("{age} > 9", values) is True
+    assert expressions.evaluate("{age} equal 42", values) is True
+    assert expressions.evaluate("{missing} < 5", values) is False
+    assert expressions.evaluate("{missing} empty", values) is True
+    assert expressions.evaluate("{empty} = {missing}", values) is True
+    assert expressions.evaluate("{tags} notempty", values) is True
+
+
+def test_list_operators():
+    values = {"tags": ["a", "b", "c"], "text": "Hello World", "choice": "b"}
+    assert expressions.evaluate("{tags} contains 'B'", values) is True
+    assert expressions.evaluate("{tags} notcontains 'd'", values) is True
+    assert expressions.evaluate("{text} contains 'world'", values) is True
+    assert expressions.evaluate("{tags} allof ['a', 'c']", values) is True
+    assert expressions.evaluate("{tags} allof ['a', 'd']", values) is False
+    assert expressions.evaluate("{choice} anyof ['a', 'b']", values) is True
+    assert expressions.evaluate("{choice} noneof ['a', 'b']", values) is False
+
+
+def test_variables():
+    values = {
+        "orders": [{"quantity": 1}, {"quantity": "3"}],
+        "address.city": "Paris",
+        "Name": "Ann",
+    }
+    assert expressions.evaluate("{orders[1].quantity}", values) == "3"
+    assert expressions.evaluate("{address.city}", values) == "Paris"
+    assert expressions.evaluate("{name}", values) == "Ann"
+    assert expressions.evaluate("{orders[5].quantity}", values) is None
+    expression = expressions.compile_expression("{a} + {b.c} > {a}")
+    assert expression.variables == ("a", "b.c")
+
+
+def test_functions():
+    values = {"a": 1, "b": "2", "rows": [{"x": 1}, {"x": "2"}, {}]}
+    assert expressions.evaluate("iif({a} > 0, 'yes', 'no')", values) == "yes"
+    assert expressions.evaluate("sum({a}, {b}, 3)", values) == 6
+    assert expressions.evaluate("max({a}, {b})", values) == 2
+    assert expressions.evaluate("avg([1, 2, 3])") == 2
+    assert expressions.evaluate("sumInArray({rows}, 'x')", values) == 3
+    assert expressions.evaluate("countInArray({rows}, 'x')", values) == 2
+    assert expressions.evaluate("round(2.456, 2)") == 2.46
+    assert expressions.evaluate("dateDiff('2020-01-31', '2021-03-01', 'months')") == 13
+    birth_date = datetime.date.today().replace(year=datetime.date.today().year - 30)
+    assert expressions.evaluate("age({birth})", {"birth": birth_date.isoformat()}) == 30
+    assert expressions.evaluate("{d} > today()", {"d": "2999-01-01"}) is True
+
+
+def test_iif_only_evaluates_selected_branch():
+    calls = []
+    expressions.register_function("track", lambda value: calls.append(value))
+    try:
+        assert expressions.evaluate("iif(true, 1, track(2))") == 1
+        assert calls == []
+    finally:
+        del expressions.FUNCTIONS["track"]
+
+
+def test_register_function():
+    expressions.register_function("Double", lambda value: value * 2)
+    try:
+        assert expressions.evaluate("double({a})", {"a": 4}) == 8
+    finally:
+        del expressions.FUNCTIONS["double"]
+
+
+def test_compile_expression_is_cached():
+    expression = expressions.compile_expression("{q1} > 1 + 2")
+    assert expressions.compile_expression("{q1} > 1 + 2") is expression
+    assert pickle.loads(pickle.dumps(expression)) is expression
+    assert expressions.compile_expression("1 + 2").constant is True
+    assert expression.constant is False
+
+
+def test_expression_steps_are_limited():
+    assert expressions.compile_expression("{a} + 1").steps == 3
+    text = "[" + ", ".join(["{a}"] * 500) + "]"
+    with pytest.raises(expressions.ExpressionError):
+        expressions.compile_expression(text)
+    text = " + ".join(["{a}"] * 5000)
+    with pytest.raises(expressions.ExpressionError):
+        expressions.compile_expression(text)
+    # Large powers are calculated with floats, and text is not a number.
+    assert expressions.evaluate("2 ^ {a}", {"a": 100}) == 2.0**100
+    assert expressions.evaluate("2 ^ {a}", {"a": 10}) == 1024
+    text = "(((((({a}^64)^64)^64)^64)^64)^64) > 0"
+    assert expressions.evaluate(text, {"a": "2"}) is True
+    assert expressions.evaluate("((((((2^64)^64)^64)^64)^64)^64)", {}) == math.inf
+    assert expressions.evaluate("(-2 ^ 3) ^ 1001", {}) == -math.inf
+    assert expressions.evaluate("{a} * 1000000000", {"a": "text"}) is None
+    # Lists and booleans are not numbers either.
+    assert expressions.evaluate("{a} * 100000000", {"a": [1]}) is None
+    assert expressions.evaluate("{a} * 2", {"a": True}) is None
+    assert expressions.evaluate("{a} - 1", {"a": {"b": 1}}) is None
+    # Precisions are clamped, whatever the answers.
+    assert expressions.evaluate("trunc(1.25, {b})", {"b": 10000000}) == 1.25
+    assert expressions.evaluate("round(1.25, {b})", {"b": "-10000000"}) == 0
@@ -1,13 +1,23 @@
 #!/usr/bin/env python
 
 """Tests for `form` package."""
+import asyncio
+import json
+import threading
+import time
+
 import pytest
 
 from questions import form
 from questions import questions
+from questions import settings
+from questions import validators
 from questions import TextValidator
+from questions import ValidationBudgetError
 from questions import ValidationError
 from questions.settings import SURVEY_JS_CDN
+from questions.settings import SURVEY_JS_WIDGETS
+from questions.settings import UNSAFE_REGEX_POLICY
 
 
 def test_initialize():
@@ -281,3 +291,635 @@ def test_update_object_validation_error():
     with pytest.raises(ValidationError):
         test_form.update_object(anyobj, form_data)
     assert anyobj.text1 == "xxx"
+
+
+def test_construct_survey_is_cached_per_class():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    first = TestForm(name="testing")
+    second = TestForm(name="other")
+    survey = first._construct_survey()
+    assert first._construct_survey() is survey
+    assert second._construct_survey() is survey
+
+
+def test_construct_survey_cache_depends_on_params():
+    class TestForm(form.Form):
+        text1 = questions.Select2Question()
+
+    survey = TestForm()._construct_survey()
+    assert TestForm(title="Title")._construct_survey() is not survey
+    static_form = TestForm(resource_url="static")
+    assert static_form._construct_survey() is not survey
+    assert "static/select2.min.js" in static_form.extra_js[0]
+
+
+def test_construct_survey_cache_invalidated_on_class_change():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    test_form = TestForm()
+    survey = test_form._construct_survey()
+    TestForm.text2 = questions.TextQuestion()
+    new_survey = test_form._construct_survey()
+    assert new_survey is not survey
+    assert "text2" in test_form._form_elements
+
+
+def test_construct_survey_cache_invalidated_on_page_change():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm)
+
+    test_form = TestForm()
+    test_form._construct_survey()
+    PageForm.text2 = questions.TextQuestion()
+    survey = test_form._construct_survey()
+    assert [q.name for q in survey.pages[0].questions] == ["text1", "text2"]
+
+
+def test_construct_survey_cache_invalidated_on_base_change():
+    class BaseForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class TestForm(BaseForm):
+        text2 = questions.TextQuestion()
+
+    class OtherForm(form.Form):
+        text3 = questions.TextQuestion()
+
+    test_form = TestForm()
+    survey = test_form._construct_survey()
+    other = OtherForm()._construct_survey()
+    BaseForm.text4 = questions.TextQuestion()
+    assert test_form._construct_survey() is not survey
+    assert OtherForm()._construct_survey() is other
+
+
+def test_from_json_keeps_compiled_surveys():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    compiled = TestForm()._compile()
+    form_json = {
+        "pages": [{"name": "page1", "elements": [{"type": "text", "name": "a"}]}]
+    }
+    form.Form.from_json(json.dumps(form_json), "NewForm")
+    assert TestForm()._compile() is compiled
+
+
+def test_render():
+    class TestForm(form.Form):
+        text1 = questions.Select2Question()
+
+    test_form = TestForm(name="testing")
+    result = test_form.render(title="My Form")
+    assert isinstance(result, form.RenderResult)
+    assert result.title == "My Form"
+    assert result.json == test_form.to_json()
+    assert result.js == test_form.js
+    assert result.css == test_form.css
+    assert result.survey_js in result.html
+    assert str(result) == result.html == test_form.render_html(title="My Form")
+    assert test_form.render(title="My Form") is result
+    assert test_form.render(title="Other") is not result
+    assert TestForm(html_id="other").render(title="My Form") is not result
+    assert test_form.render(title="My Form", form_data={"text1": "a"}) is not result
+
+
+def test_render_compiles_once(monkeypatch):
+    class TestForm(form.Form):
+        text1 = questions.Select2Question()
+
+    calls = []
+    build_survey = form.Form._build_survey
+
+    def counting_build_survey(self):
+        calls.append(self)
+        return build_survey(self)
+
+    monkeypatch.setattr(form.Form, "_build_survey", counting_build_survey)
+    test_form = TestForm(name="testing")
+    test_form.render_html()
+    test_form.render_html()
+    assert len(calls) == 1
+
+
+def test_to_json_canonical():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    form_json = TestForm(title="Testing").to_json(canonical=True)
+    assert form_json == json.dumps(
+        json.loads(form_json), sort_keys=True, separators=(",", ":")
+    )
+
+
+def test_extra_resources_keep_declaration_order():
+    class TestForm(form.Form):
+        slider = questions.NoUISliderQuestion()
+        editor = questions.CKEditorQuestion()
+
+    extra_js = TestForm().extra_js
+    assert "jquery.js" not in extra_js[0]
+    assert extra_js.index(
+        "https://unpkg.com/nouislider@9.2.0/distribute/nouislider.js"
+    ) < extra_js.index("https://cdn.ckeditor.com/4.14.1/standard/ckeditor.js")
+    assert extra_js[-1].endswith(SURVEY_JS_WIDGETS)
+
+
+def test_fingerprint():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    fingerprint = TestForm().fingerprint()
+    assert TestForm().fingerprint() == fingerprint
+    assert TestForm().fingerprint(form_data={"text1": "hello"}) != fingerprint
+    assert TestForm(html_id="other").fingerprint() != fingerprint
+    assert TestForm(platform="vue").fingerprint() != fingerprint
+    assert TestForm().etag() == f'"{fingerprint}"'
+    TestForm.text2 = questions.TextQuestion()
+    assert TestForm().fingerprint() != fingerprint
+
+
+def test_iter_json():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm)
+        page2 = form.FormPage(PageForm, name="Page2")
+
+    test_form = TestForm(title="Testing")
+    chunks = list(test_form.iter_json())
+    assert len(chunks) > 4
+    assert "".join(chunks) == test_form.to_json()
+    chunks = list(test_form.iter_json(exclude_defaults=True))
+    assert "".join(chunks) == test_form.to_json(exclude_defaults=True)
+
+
+def test_iter_html():
+    class TestForm(form.Form):
+        text1 = questions.Select2Question()
+
+    test_form = TestForm(name="testing")
+    chunks = list(test_form.iter_html(form_data={"text1": "a"}))
+    assert len(chunks) > 1
+    assert "".join(chunks) == test_form.render_html(form_data={"text1": "a"})
+
+
+def test_page_json():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class OtherPageForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+        page2 = form.FormPage(OtherPageForm, name="Page2")
+
+    test_form = TestForm()
+    assert test_form.page_names() == ["Page1", "Page2"]
+    full_json = json.loads(test_form.to_json())
+    assert json.loads(test_form.page_json("Page2")) == full_json["pages"][1]
+    with pytest.raises(KeyError):
+        test_form.page_json("Page3")
+
+
+def test_shell_json():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class OtherPageForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+        page2 = form.FormPage(OtherPageForm, name="Page2", title="Second")
+
+    shell = json.loads(TestForm(title="Testing").shell_json())
+    assert shell["title"] == "Testing"
+    assert shell["pages"][0]["questions"][0]["name"] == "text1"
+    assert shell["pages"][1]["title"] == "Second"
+    placeholder = shell["pages"][1]["questions"]
+    assert placeholder == [
+        {"type": "html", "name": "questions_lazy_page_Page2", "html": "Loading..."}
+    ]
+
+
+def test_render_html_with_pages_url():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class OtherPageForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+        page2 = form.FormPage(OtherPageForm, name="Page2")
+
+    test_form = TestForm()
+    html = test_form.render_html(pages_url="/form/pages/")
+    assert 'var pagesUrl = "/form/pages/";' in html
+    assert '"name": "text2"' not in html
+    assert "".join(test_form.iter_html(pages_url="/form/pages/")) == html
+    assert "pagesUrl" not in test_form.render_html()
+
+
+def test_to_json_locale():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(title={"default": "Name", "de": "Vorname"})
+
+    test_form = TestForm(title={"default": "Test", "de": "Prüfung"})
+    data = json.loads(test_form.to_json(locale="de"))
+    assert data["locale"] == "de"
+    assert data["title"] == "Prüfung"
+    assert data["pages"][0]["questions"][0]["title"] == "Vorname"
+    assert "".join(test_form.iter_json(locale="de")) == test_form.to_json(locale="de")
+    data = json.loads(test_form.to_json())
+    assert data["title"] == {"default": "Test", "de": "Prüfung"}
+    assert test_form.etag(locale="de") != test_form.etag()
+    html = test_form.render_html(locale="de")
+    assert "<title>Prüfung</title>" in html
+    assert "".join(test_form.iter_html(locale="de")) == html
+
+
+def test_to_json_locale_cache_is_bounded():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(title={"default": "Name", "de": "Vorname"})
+
+    test_form = TestForm()
+    compiled = test_form._compile()
+    default = test_form.to_json(locale="x0")
+    for index in range(1000):
+        assert test_form.to_json(locale=f"x{index}") is default
+        test_form.render_html(locale=f"x{index}")
+    assert json.loads(default)["pages"][0]["questions"][0]["title"] == "Name"
+    assert test_form.to_json(locale="de-at") is test_form.to_json(locale="de-ch")
+    assert json.loads(test_form.to_json(locale="de-at"))["locale"] == ""
+    assert json.loads(test_form.to_json(locale="de"))["locale"] == "de"
+    assert json.loads(test_form.to_json(locale="fr"))["locale"] == "fr"
+    assert len(compiled._json) == 4
+    assert len(compiled._rendered) == 1
+
+
+def test_render_cache_is_bounded():
+    class TestForm(form.Form):
+        name = questions.TextQuestion()
+
+    test_form = TestForm()
+    compiled = test_form._compile()
+    first = test_form.render(title="Form 0")
+    assert test_form.render(title="Form 0") is first
+    for index in range(1000):
+        test_form.action = f"/submit/{index}"
+        test_form.render(title=f"Form {index}")
+    assert len(compiled._rendered) == settings.RENDER_CACHE_SIZE
+    test_form.action = ""
+    assert test_form.render(title="Form 0") is not first
+    assert test_form.render(title="Form 0").html == first.html
+
+
+def test_form_elements_registry():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+        text2 = questions.TextQuestion(name="other")
+
+    assert [element.name for element, kind in TestForm._elements] == [
+        "text1",
+        "other",
+    ]
+    assert [kind for element, kind in TestForm._elements] == [
+        form.QUESTION_ELEMENT,
+        form.QUESTION_ELEMENT,
+    ]
+
+
+def test_form_inheritance():
+    class BaseForm(form.Form):
+        text1 = questions.TextQuestion()
+        text2 = questions.TextQuestion()
+        text3 = questions.TextQuestion()
+
+    class TestForm(BaseForm):
+        text2 = questions.CommentQuestion()
+        text3 = None
+        text4 = questions.TextQuestion()
+
+    data = json.loads(TestForm().to_json())
+    elements = data["pages"][0]["questions"]
+    assert [element["name"] for element in elements] == ["text1", "text2", "text4"]
+    assert elements[1]["type"] == "comment"
+    data = json.loads(BaseForm().to_json())
+    assert len(data["pages"][0]["questions"]) == 3
+
+
+def test_form_inheritance_setattr():
+    class BaseForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class TestForm(BaseForm):
+        text2 = questions.TextQuestion()
+
+    assert len(json.loads(TestForm().to_json())["pages"][0]["questions"]) == 2
+    BaseForm.text3 = questions.TextQuestion()
+    names = [element.name for element, kind in TestForm._elements]
+    assert names == ["text1", "text3", "text2"]
+    del BaseForm.text1
+    data = json.loads(TestForm().to_json())
+    assert [element["name"] for element in data["pages"][0]["questions"]] == [
+        "text3",
+        "text2",
+    ]
+
+
+def test_shared_form_concurrent_rendering():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(required=True)
+        select1 = questions.Select2Question(choices=["a", "b"])
+
+    test_form = TestForm(title="Shared")
+    expected_html = TestForm(title="Shared").render_html()
+    results = []
+
+    def render():
+        for index in range(20):
+            if index % 5 == 0:
+                TestForm._compiled_surveys.clear()
+            html = test_form.render_html()
+            valid = test_form.validate({"text1": "x", "select1": "a"})
+            results.append((html == expected_html, valid, test_form.extra_js))
+
+    threads = [threading.Thread(target=render) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 160
+    assert all(same and valid for same, valid, extra_js in results)
+    assert all(extra_js == test_form.extra_js for same, valid, extra_js in results)
+
+
+def test_compiled_form_elements_are_read_only():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    form_elements = TestForm()._form_elements
+    with pytest.raises(TypeError):
+        form_elements["text2"] = questions.TextQuestion()
+
+
+def test_from_json_params_are_not_shared():
+    NewForm = form.Form.from_json(json.dumps({"title": "From JSON"}), "NewForm")
+    assert NewForm.default_params == {"title": "From JSON"}
+    assert form.Form.default_params == {}
+
+
+def test_validation_plan_is_reused():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(
+            validators=[TextValidator(max_length=3, message="Too long")]
+        )
+
+    plan = TestForm()._compile().validation_plan
+    assert TestForm()._compile().validation_plan is plan
+    form_data = {"text1": "abcd"}
+    assert TestForm().validate(form_data, set_errors=True) is False
+    assert form_data["__errors__"] == [{"question": "text1", "message": "Too long"}]
+
+
+def test_validate_many():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(
+            required=True,
+            validators=[TextValidator(max_length=3, message="Too long")],
+        )
+
+    submissions = [{"text1": "a" * (index % 5 + 1)} for index in range(50)]
+    submissions.append({})
+    expected = []
+    for form_data in submissions:
+        valid = TestForm().validate(form_data, set_errors=True)
+        expected.append((valid, form_data.pop("__errors__")))
+    test_form = TestForm()
+    assert list(test_form.validate_many(iter(submissions))) == expected
+    results = test_form.validate_many(iter(submissions), workers=2, chunk_size=4)
+    assert list(results) == expected
+
+
+def test_validate_many_unexpected_values():
+    class TestForm(form.Form):
+        n = questions.TextQuestion(
+            validators=[questions.NumericValidator(max_value=10, message="Number")]
+        )
+        r = questions.TextQuestion(
+            validators=[questions.RegexValidator(regex="^[0-9]+$", message="Digits")]
+        )
+        e = questions.TextQuestion(
+            validators=[questions.EmailValidator(message="Email")]
+        )
+
+    submissions = [{"n": "abc"}, {"r": 123}, {"e": 123}, {"n": "5"}, ["n"]]
+    test_form = TestForm()
+    for workers in (1, 2):
+        results = list(test_form.validate_many(submissions, workers=workers))
+        assert results[:4] == [
+            (False, [{"question": "n", "message": "Number"}]),
+            (True, []),
+            (False, [{"question": "e", "message": "Email"}]),
+            (True, []),
+        ]
+        valid, errors = results[4]
+        assert valid is False
+        assert errors[0]["question"] == ""
+        assert errors[0]["message"].startswith(validators.INVALID_SUBMISSION_MESSAGE)
+    assert test_form.validate({"n": "abc"}) is False
+
+
+def test_from_json_validators():
+    form_json = {
+        "elements": [
+            {
+                "type": "text",
+                "name": "code",
+                "validators": [
+                    {"type": "regex", "regex": "[A-Z]+$", "text": "Upper case only"},
+                    {"type": "custom", "text": "Checked in the browser"},
+                ],
+            }
+        ]
+    }
+    NewForm = form.Form.from_json(json.dumps(form_json), "NewForm")
+    validators = NewForm.code.validators
+    assert isinstance(validators[0], questions.RegexValidator)
+    assert validators[0].message == "Upper case only"
+    assert NewForm().validate({"code": "ABC"}) is True
+    form_data = {"code": "abc"}
+    assert NewForm().validate(form_data, set_errors=True) is False
+    assert form_data["__errors__"] == [
+        {"question": "code", "message": "Upper case only"}
+    ]
+
+
+def test_avalidate():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(
+            required=True,
+            validators=[TextValidator(max_length=3, message="Too long")],
+        )
+
+    form_data = {"text1": "abcd"}
+    assert asyncio.run(TestForm().avalidate(form_data, set_errors=True)) is False
+    assert form_data["__errors__"] == [{"question": "text1", "message": "Too long"}]
+    assert asyncio.run(TestForm().avalidate({"text1": "abc"})) is True
+
+
+def test_validate_fail_fast():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(
+            validators=[questions.RegexValidator(regex="[a-z]+$", message="Lower case")]
+        )
+        text2 = questions.TextQuestion(
+            validators=[TextValidator(max_length=3, message="Too long")]
+        )
+
+    form_data = {"text1": "ABCD", "text2": "abcd"}
+    assert TestForm().validate(form_data, set_errors=True, fail_fast=True) is False
+    assert form_data["__errors__"] == [{"question": "text2", "message": "Too long"}]
+    assert TestForm().validate(form_data, set_errors=True, max_errors=5) is False
+    assert len(form_data["__errors__"]) == 2
+    assert TestForm().validate({"text1": "abc"}, fail_fast=True) is True
+
+
+def test_validate_dynamic_panel_rows():
+    class OrderForm(form.Form):
+        product = questions.TextQuestion(required=True)
+        quantity = questions.TextQuestion(
+            validators=[questions.NumericValidator(min_value=1, message="At least one")]
+        )
+
+    class TestForm(form.Form):
+        customer = questions.TextQuestion()
+        orders = form.FormPanel(OrderForm, name="orders", dynamic=True)
+
+    test_form = TestForm()
+    assert list(test_form._form_elements) == ["customer", "orders"]
+    rows = [{"product": "tea", "quantity": 1} for index in range(1000)]
+    rows[17]["quantity"] = 0
+    form_data = {"orders": rows}
+    assert test_form.validate(form_data, set_errors=True) is False
+    assert form_data["__errors__"] == [
+        {"question": "orders[17].quantity", "message": "At least one"}
+    ]
+
+
+def test_validate_page_and_incremental():
+    class PetsPanel(form.Form):
+        pet_name = questions.TextQuestion(required=True)
+
+    class StartPage(form.Form):
+        age = questions.TextQuestion(required=True)
+        has_pets = questions.BooleanQuestion()
+        pets = form.FormPanel(PetsPanel, visible_if="{has_pets} = true")
+
+    class AdultPage(form.Form):
+        employer = questions.TextQuestion(required=True)
+
+    class TestForm(form.Form):
+        start = form.FormPage(StartPage, name="start")
+        adult = form.FormPage(AdultPage, name="adult", visible_if="{age} >= 18")
+
+    test_form = TestForm()
+    form_data = {"has_pets": True}
+    assert test_form.validate_page("start", form_data, set_errors=True) is False
+    assert form_data["__errors__"] == [
+        {"question": "age", "message": "An answer is required"},
+        {"question": "pet_name", "message": "An answer is required"},
+    ]
+    assert test_form.validate_page("adult", {"age": 12}) is True
+    assert test_form.validate_page("adult", {"age": 30}) is False
+    with pytest.raises(KeyError):
+        test_form.validate_page("missing", {})
+
+    form_data = {"age": 30, "has_pets": False}
+    state = test_form.validate_incremental(form_data)
+    assert state.errors == [
+        {"question": "employer", "message": "An answer is required"}
+    ]
+    form_data = {"age": 30, "has_pets": False, "employer": "ACME"}
+    state = test_form.validate_incremental(form_data, state, ["employer"])
+    assert state.valid
+    form_data = {"age": 30, "has_pets": True, "employer": "ACME"}
+    state = test_form.validate_incremental(form_data, state, set_errors=True)
+    assert form_data["__errors__"] == [
+        {"question": "pet_name", "message": "An answer is required"}
+    ]
+
+
+def test_from_json_checks_unsafe_regex():
+    form_json = {
+        "elements": [
+            {
+                "type": "text",
+                "name": "code",
+                "validators": [{"type": "regex", "regex": "^(\\w+\\s?)*$"}],
+            }
+        ]
+    }
+    with pytest.warns(RuntimeWarning):
+        form.Form.from_json(json.dumps(form_json), "NewForm")
+    try:
+        validators.set_regex_policy("reject")
+        with pytest.raises(ValueError):
+            form.Form.from_json(json.dumps(form_json), "NewForm")
+    finally:
+        validators.set_regex_policy(UNSAFE_REGEX_POLICY)
+
+
+def test_validate_budget():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(required=True)
+
+    with pytest.raises(ValidationBudgetError):
+        TestForm().validate({"text1": "a"}, max_steps=0)
+    assert TestForm().validate({"text1": "a"}, max_steps=1) is True
+
+
+def test_validate_large_powers():
+    class PowerForm(form.Form):
+        a = questions.TextQuestion(
+            validators=[
+                questions.ExpressionValidator(
+                    expression="(((((({a}^64)^64)^64)^64)^64)^64) > 0"
+                )
+            ]
+        )
+
+    started = time.perf_counter()
+    assert PowerForm().validate({"a": "2"}) is True
+    assert time.perf_counter() - started < 1
+
+
+@pytest.mark.parametrize(
+    "expression,answers",
+    [
+        ("{x} * 100000000 > 0", {"x": [1]}),
+        ("{x} * 100000000 > 0", {"x": "1" * 1000}),
+        ("trunc(1, {b}) > 0", {"b": 10000000}),
+        ("round(1, {b}) > 0", {"b": -10000000}),
+    ],
+)
+def test_validate_hostile_answers(expression, answers):
+    class HostileForm(form.Form):
+        x = questions.TextQuestion(
+            validators=[questions.ExpressionValidator(expression=expression)]
+        )
+
+    started = time.perf_counter()
+    HostileForm().validate(answers, time_limit=0.1)
+    assert time.perf_counter() - started < 0.1
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""Tests for `hooks` package."""
+
+import json
+
+import pytest
+
+from questions import form
+from questions import hooks
+from questions import TextQuestion
+from questions import TextValidator
+
+
+@pytest.fixture
+def events():
+    recorded = []
+    callbacks = {}
+    for event in hooks.EVENTS:
+
+        def callback(event=event, **data):
+            recorded.append((event, data))
+
+        callbacks[event] = callback
+        hooks.add_hook(event, callback)
+    yield recorded
+    for event, callback in callbacks.items():
+        hooks.remove_hook(event, callback)
+
+
+def test_add_and_remove_hooks():
+    with pytest.raises(ValueError):
+        hooks.add_hook("on_unknown", print)
+    assert hooks.start("on_validate") is None
+    hooks.add_hook("on_validate", print)
+    assert hooks.has_hooks("on_validate")
+    assert hooks.start("on_validate") is not None
+    hooks.remove_hook("on_validate", print)
+    assert not hooks.has_hooks("on_validate")
+
+
+def test_form_events(events):
+    class HookedForm(form.Form):
+        name = TextQuestion(validators=[TextValidator(max_length=3)])
+
+    test_form = HookedForm()
+    test_form.to_json()
+    test_form.render_js()
+    assert test_form.validate({"name": "Joe"}) is True
+    names = [event for event, data in events]
+    assert names == [
+        "on_construct",
+        "on_serialize",
+        "on_render_template",
+        "on_validator",
+        "on_validate",
+    ]
+    data = dict(events)
+    assert data["on_construct"]["form"] == "HookedForm"
+    assert data["on_serialize"]["kind"] == "json"
+    assert data["on_render_template"]["template"] == "survey_js.jquery.jinja"
+    assert data["on_validator"]["kind"] == "text"
+    assert data["on_validator"]["question"] == "name"
+    assert data["on_validate"]["errors"] == 0
+    assert all(data[event]["duration"] >= 0 for event in data)
+    # Without validator hooks, the checks are not wrapped.
+    hooks.remove_hook("on_validator", hooks._hooks["on_validator"][0])
+    del events[:]
+    test_form.validate({"name": "Joe"})
+    assert [event for event, data in events] == ["on_validate"]
+
+
+def test_histogram_percentiles():
+    histogram = hooks.Histogram()
+    assert histogram.percentile(0.5) is None
+    for millisecond in range(1, 1001):
+        histogram.observe(millisecond / 1000)
+    summary = histogram.summary()
+    assert summary["count"] == 1000
+    assert summary["min"] == 0.001
+    assert summary["max"] == 1.0
+    assert summary["p50"] == pytest.approx(0.5, rel=0.2)
+    assert summary["p95"] == pytest.approx(0.95, rel=0.2)
+    assert summary["p99"] == pytest.approx(0.99, rel=0.2)
+
+
+def test_latency_histograms():
+    class MeasuredForm(form.Form):
+        name = TextQuestion(validators=[TextValidator(max_length=3)])
+
+    collector = hooks.collect_latencies()
+    try:
+        for index in range(10):
+            MeasuredForm().validate({"name": "Ann"})
+    finally:
+        collector.uninstall()
+    MeasuredForm().validate({"name": "Ann"})
+    snapshot = json.loads(collector.to_json())
+    assert snapshot["validate"]["MeasuredForm"]["count"] == 10
+    assert snapshot["validator"]["text"]["count"] == 10
+    assert snapshot["construct"]["MeasuredForm"]["count"] <= 1
+    text = collector.to_prometheus()
+    assert "# TYPE questions_validate_seconds summary" in text
+    assert 'questions_validate_seconds_count{form="MeasuredForm"} 10' in text
+    assert 'questions_validator_seconds{kind="text",quantile="0.95"}' in text
+    collector.reset()
+    assert collector.snapshot() == {}
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""Tests for `logic` package."""
+
+import time
+
+from questions import CheckboxQuestion
+from questions import form
+from questions import logic
+from questions import questions
+from questions import TextQuestion
+from questions import validators
+from questions.expressions import register_function
+from questions.questions import Page
+from questions.questions import PanelBlock
+
+
+def test_visible_if_skips_hidden_questions():
+    plan = validators.ValidationPlan(
+        {
+            "has_pet": TextQuestion(name="has_pet"),
+            "pet_name": TextQuestion(
+                name="pet_name", required=True, visible_if="{has_pet} = 'yes'"
+            ),
+        }
+    )
+    assert plan.logic is not None
+    assert plan.validate({"has_pet": "no"}) == []
+    assert plan.validate({"has_pet": "yes"}) == [
+        {"question": "pet_name", "message": validators.REQUIRED_MESSAGE}
+    ]
+
+
+def test_no_logic():
+    assert logic.build_logic([TextQuestion(name="text1")]) is None
+    plan = validators.ValidationPlan({"text1": TextQuestion(name="text1")})
+    assert plan.logic is None
+
+
+def test_dependency_order_and_hidden_answers():
+    # "details" comes first, but depends on "reason", which depends on "other".
+    elements = [
+        TextQuestion(name="details", required=True, visible_if="{reason} notempty"),
+        TextQuestion(name="reason", visible_if="{other} = 'yes'"),
+        TextQuestion(name="other"),
+    ]
+    form_logic = logic.build_logic(elements)
+    assert [node.name for node, parent in form_logic.order] == [
+        "other",
+        "reason",
+        "details",
+    ]
+    # The answer to the hidden "reason" question is missing for "details".
+    state = form_logic.evaluate({"other": "no", "reason": "Because"})
+    assert state.skip == {"reason", "details"}
+    assert state.values.get("reason") is None
+    form_logic = logic.build_logic(elements, clear_invisible_values=False)
+    state = form_logic.evaluate({"other": "no", "reason": "Because"})
+    assert state.skip == {"reason"}
+
+
+def test_hidden_containers_are_pruned():
+    calls = []
+    register_function("countCall", lambda: calls.append(1) or True)
+    page = Page(
+        name="page1",
+        visible_if="{age} >= 18",
+        questions=[
+            PanelBlock(
+                name="panel1",
+                elements=[
+                    TextQuestion(name="job", required=True, visible_if="countCall()")
+                ],
+            )
+        ],
+    )
+    form_logic = logic.build_logic([Page(name="start", questions=[]), page])
+    plan = validators.ValidationPlan({"job": page.questions[0].elements[0]}, form_logic)
+    assert plan.validate({"age": 10}) == []
+    assert calls == []
+    assert plan.validate({"age": 20}) == [
+        {"question": "job", "message": validators.REQUIRED_MESSAGE}
+    ]
+    assert calls == [1]
+
+
+def test_enable_if_and_required_if():
+    plan = validators.ValidationPlan(
+        {
+            "country": TextQuestion(name="country"),
+            "state": TextQuestion(
+                name="state",
+                required_if="{country} = 'US'",
+                validators=[questions.TextValidator(max_length=2)],
+            ),
+            "locked": TextQuestion(
+                name="locked", required=True, enable_if="{country} = 'US'"
+            ),
+        }
+    )
+    assert plan.validate({"country": "ES", "state": "Madrid"}) == [
+        {"question": "state", "message": "Invalid value"}
+    ]
+    assert plan.validate({"country": "US"}, max_errors=5) == [
+        {"question": "state", "message": validators.REQUIRED_MESSAGE},
+        {"question": "locked", "message": validators.REQUIRED_MESSAGE},
+    ]
+
+
+def test_calculated_values():
+    elements = [
+        TextQuestion(name="price"),
+        TextQuestion(name="discount_code", required=True, visible_if="{total} > 100"),
+    ]
+    calculated_values = [
+        {"name": "total", "expression": "{subtotal} * 2"},
+        {"name": "subtotal", "expression": "{price} + 10"},
+    ]
+    form_logic = logic.build_logic(elements, calculated_values)
+    plan = validators.ValidationPlan(
+        {element.name: element for element in elements}, form_logic
+    )
+    assert plan.validate({"price": 20}) == []
+    assert plan.validate({"price": 60}) == [
+        {"question": "discount_code", "message": validators.REQUIRED_MESSAGE}
+    ]
+    assert form_logic.evaluate({"price": 60}).values["total"] == 140
+
+
+def test_cycles_and_invalid_conditions():
+    elements = [
+        TextQuestion(name="a", required=True, visible_if="{b} empty"),
+        TextQuestion(name="b", required=True, visible_if="{a} empty"),
+        TextQuestion(name="c", required=True, visible_if="{a} ="),
+    ]
+    plan = validators.ValidationPlan({element.name: element for element in elements})
+    assert [error["question"] for error in plan.validate({})] == ["a", "b", "c"]
+
+
+def test_choices_visible_if():
+    element = CheckboxQuestion(
+        name="flavors",
+        choices=["vanilla", "chocolate", "peanut"],
+        choices_visible_if="{item} != 'peanut' or {allergies} = 'none'",
+        has_other=True,
+    )
+    plan = validators.ValidationPlan({"flavors": element})
+    assert plan.validate({"flavors": ["vanilla", "other"]}) == []
+    assert plan.validate({"flavors": ["peanut"]}) == [
+        {"question": "flavors", "message": validators.CHOICE_MESSAGE}
+    ]
+    assert plan.validate({"flavors": ["peanut"], "allergies": "none"}) == []
+
+
+def test_form_validate_with_logic():
+    class AdultPage(form.Form):
+        employer = TextQuestion(required=True)
+
+    class PetsPanel(form.Form):
+        pet_name = TextQuestion(required=True)
+
+    class StartPage(form.Form):
+        age = TextQuestion()
+        has_pets = questions.BooleanQuestion()
+        pets = form.FormPanel(PetsPanel, visible_if="{has_pets} = true")
+
+    class TestForm(form.Form):
+        start = form.FormPage(StartPage)
+        adult = form.FormPage(AdultPage, visible_if="{age} >= 18")
+
+    test_form = TestForm()
+    assert test_form.validate({"age": 12}) is True
+    form_data = {"age": 30, "has_pets": True}
+    assert test_form.validate(form_data, set_errors=True) is False
+    assert form_data["__errors__"] == [
+        {"question": "pet_name", "message": validators.REQUIRED_MESSAGE},
+        {"question": "employer", "message": validators.REQUIRED_MESSAGE},
+    ]
+
+
+def test_update_only_evaluates_affected_nodes():
+    elements = [
+        TextQuestion(name="other"),
+        TextQuestion(name="reason", visible_if="{other} = 'yes'"),
+        TextQuestion(name="details", required_if="{reason} notempty"),
+        TextQuestion(name="unrelated", visible_if="{name} = 'x'"),
+        TextQuestion(name="name"),
+    ]
+    form_logic = logic.build_logic(elements)
+    assert form_logic.affected(["OTHER"]) == sorted(
+        position
+        for position, (node, parent) in enumerate(form_logic.order)
+        if node.name in ("reason", "details")
+    )
+    form_data = {"other": "no", "reason": "Because"}
+    state = form_logic.evaluate(form_data)
+    assert state.skip == {"reason", "unrelated"}
+    assert state.required == set()
+    form_data = {"other": "yes", "reason": "Because"}
+    assert form_logic.update(state, form_data, ["other"]) == {"reason", "details"}
+    expected = form_logic.evaluate(form_data)
+    assert state.skip == expected.skip == {"unrelated"}
+    assert state.required == expected.required == {"details"}
+    assert state.values["reason"] == "Because"
+
+
+def test_variables_are_not_case_sensitive():
+    elements = [
+        TextQuestion(name="Other"),
+        TextQuestion(name="reason", visible_if="{other} = 'yes'"),
+        TextQuestion(name="details", visible_if="{REASON} notempty"),
+    ]
+    form_logic = logic.build_logic(elements, [{"name": "Total", "expression": "1"}])
+    state = form_logic.evaluate({"Other": "yes", "reason": "Because"})
+    assert state.skip == set()
+    assert state.values.get_folded("total") == 1
+    state = form_logic.evaluate({"Other": "no", "reason": "Because"})
+    assert state.skip == {"reason", "details"}
+    form_logic.update(state, {"Other": "yes", "reason": "Because"}, ["Other"])
+    assert state.skip == set()
+
+
+def test_missing_answers_scale_linearly():
+    def timing(size):
+        plan = validators.ValidationPlan(
+            {
+                f"q{index}": TextQuestion(
+                    name=f"q{index}", visible_if=f"{{gate{index}}} = 1"
+                )
+                for index in range(size)
+            }
+        )
+        form_data = {f"q{index}": "text" for index in range(size)}
+        best = None
+        for attempt in range(3):
+            started = time.perf_counter()
+            plan.validate(form_data)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    # Eight times the questions must not take anywhere near 64 times as long.
+    assert timing(4000) < timing(500) * 24
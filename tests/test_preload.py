@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Tests for `preload` package."""
+
+import gc
+
+import questions
+
+from questions import form
+from questions import preload
+
+
+def test_iter_form_classes():
+    class BaseForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class TestForm(BaseForm):
+        text2 = questions.TextQuestion()
+
+    form_classes = list(preload.iter_form_classes())
+    assert BaseForm in form_classes
+    assert TestForm in form_classes
+    assert form_classes.index(BaseForm) < form_classes.index(TestForm)
+    assert list(preload.iter_form_classes(TestForm)) == []
+
+
+def test_iter_servable_forms():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class PanelForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+        panel1 = form.FormPanel(PanelForm, name="Panel1")
+
+    GeneratedForm = form.Form.from_json(
+        '{"pages": [{"name": "generated", "questions": [{"type": "text", "name": "q"}]}]}',
+        "GeneratedForm",
+    )
+    form_classes = list(preload.iter_servable_forms())
+    assert TestForm in form_classes
+    assert PageForm not in form_classes
+    assert PanelForm not in form_classes
+    assert GeneratedForm not in form_classes
+    assert not any(form_class.__name__ == "Generated" for form_class in form_classes)
+
+
+def test_warmup_forms():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion(title={"default": "Name", "de": "Vorname"})
+
+    class OtherPageForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+        page2 = form.FormPage(OtherPageForm, name="Page2")
+
+    test_form = TestForm(platform="react")
+    compiled_forms = questions.warmup([test_form, PageForm], ["de"], freeze=False)
+    assert len(compiled_forms) == 2
+    compiled = compiled_forms[0]
+    assert compiled is test_form._compile()
+    assert (False, False, None) in compiled._json
+    de = compiled.locale_key("de")
+    assert (False, False, de) in compiled._json
+    assert ("shell", False, de) in compiled._json
+    assert ("Page2", False, None) in compiled._pages_json
+    assert compiled._fingerprint is not None
+    assert compiled._validation_plan is not None
+    assert set(compiled._page_plans) == {"Page1", "Page2"}
+    assert test_form.render(locale="de") is test_form.render(locale="de")
+    assert len(compiled._rendered) == 2
+    assert compiled_forms[1] is PageForm()._compile()
+
+
+def test_warmup_all_forms_and_freeze():
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+
+    try:
+        compiled_forms = questions.warmup()
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+    assert TestForm()._compile() in compiled_forms
+    assert PageForm()._compile() not in compiled_forms
+
+
+def test_new_form_class_keeps_compiled_forms():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion()
+
+    compiled = TestForm()._compile()
+
+    class OtherForm(form.Form):
+        text2 = questions.TextQuestion()
+
+    assert TestForm()._compile() is compiled
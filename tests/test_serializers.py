@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""Tests for `serializers` package."""
+import json
+
+from questions import form
+from questions import questions
+from questions import serializers
+from questions import TextValidator
+from questions.settings import INCLUDE_KEYS
+
+
+def test_to_json_matches_include_keys():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(
+            title={"default": "Name", "de": "Name"},
+            validators=[TextValidator(min_length=5)],
+        )
+        dropdown1 = questions.DropdownQuestion(choices=["a", {"value": "b"}])
+        rating1 = questions.RatingQuestion(choices=["extra"])
+
+    survey = TestForm(title="Testing")._construct_survey()
+    expected = survey.json(by_alias=True, include=INCLUDE_KEYS)
+    assert serializers.to_json(survey) == expected
+
+
+def test_to_json_exclude_defaults():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(title="Name")
+
+    survey = TestForm()._construct_survey()
+    data = json.loads(serializers.to_json(survey, exclude_defaults=True))
+    question = data["pages"][0]["questions"][0]
+    # SurveyJS shows question numbers and uses a different maximum width by
+    # default, so those properties are kept.
+    assert question == {
+        "type": "text",
+        "name": "text1",
+        "title": "Name",
+        "hideNumber": True,
+        "maxWidth": "initial",
+    }
+    assert "minWidth" not in question
+
+
+def test_to_json_exclude_defaults_renders_same_form():
+    class PanelForm(form.Form):
+        text2 = questions.TextQuestion(hide_number=False)
+
+    class PageForm(form.Form):
+        text1 = questions.TextQuestion(title="Name")
+        colors = questions.CheckboxQuestion(choices=["red", "green"])
+        notes = questions.CommentQuestion()
+        rows = questions.MatrixDynamicQuestion(columns=[{"name": "a"}])
+        panel1 = form.FormPanel(PanelForm, name="Panel1")
+
+    class TestForm(form.Form):
+        page1 = form.FormPage(PageForm, name="Page1")
+
+    test_form = TestForm()
+    data = json.loads(test_form.to_json(exclude_defaults=True))
+    assert data["showPageNumbers"] is True
+    text1, colors, notes, rows, panel1 = data["pages"][0]["questions"]
+    assert text1["hideNumber"] is True
+    assert colors["colCount"] == 4
+    assert notes["rows"] == 3
+    assert rows["rowCount"] == 1
+    assert panel1["innerIndent"] == 1
+    assert panel1["elements"][0]["hideNumber"] is False
+    # The slimmed JSON defines the same form as the full JSON.
+    slimmed = form.Form.from_json(test_form.to_json(exclude_defaults=True), "Slim")
+    assert slimmed().to_json() == test_form.to_json()
+    assert slimmed().render_html(title="Form") == test_form.render_html(title="Form")
+
+
+def test_to_json_nested_elements_use_question_keys():
+    class PanelForm(form.Form):
+        text1 = questions.Select2Question()
+
+    class TestForm(form.Form):
+        panel1 = form.FormPanel(PanelForm)
+
+    survey = TestForm()._construct_survey()
+    data = json.loads(serializers.to_json(survey))
+    element = data["pages"][0]["questions"][0]["elements"][0]
+    assert element["name"] == "text1"
+    assert element["renderAs"] == "select2"
+    assert "extraJs" not in element
+
+
+def test_get_serializer_is_cached():
+    serializer = serializers.get_serializer(questions.TextQuestion)
+    assert serializers.get_serializer(questions.TextQuestion) is serializer
+    field_names = [field[0] for field in serializer.fields]
+    assert "place_holder" in field_names
+    assert "extra_js" not in field_names
+
+
+def test_iter_json():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(title="Name")
+        dropdown1 = questions.DropdownQuestion(choices=["a", "b"])
+
+    survey = TestForm(title="Testing")._construct_survey()
+    for exclude_defaults in (False, True):
+        chunks = list(serializers.iter_json(survey, exclude_defaults))
+        assert "".join(chunks) == serializers.to_json(survey, exclude_defaults)
+    question = survey.pages[0].questions[0]
+    assert list(serializers.iter_json(question)) == [serializers.to_json(question)]
+
+
+def test_get_locale_chain():
+    assert serializers.get_locale_chain("pt-br") == ("pt-br", "pt", "default", "en")
+    assert serializers.get_locale_chain("en") == ("en", "default")
+
+
+def test_locale_key():
+    locales = serializers.translation_locales(
+        questions.TextQuestion(name="q", title={"default": "Name", "pt": "Nome"})
+    )
+    assert locales == {"default", "pt"}
+    assert serializers.locale_key(None, locales) is None
+    assert serializers.locale_key("pt-br", locales) == (None, ("pt", "default"))
+    assert serializers.locale_key("pt-pt", locales) == (None, ("pt", "default"))
+    assert serializers.locale_key("pt", locales) == ("pt", ("pt", "default"))
+    assert serializers.locale_key("xx", locales) == (None, ("default",))
+
+
+def test_localize():
+    texts = {"default": "Name", "de": "Name (de)", "pt": "Nome"}
+    assert serializers.localize(texts, "de") == "Name (de)"
+    assert serializers.localize(texts, "pt-br") == "Nome"
+    assert serializers.localize(texts, "fr") == "Name"
+    assert serializers.localize({"es": "Nombre"}, "fr") == "Nombre"
+
+
+def test_to_json_locale():
+    class TestForm(form.Form):
+        text1 = questions.TextQuestion(title={"default": "Name", "de": "Vorname"})
+        dropdown1 = questions.DropdownQuestion(
+            choices=[{"value": "a", "text": {"default": "Apple", "de": "Apfel"}}]
+        )
+
+    survey = TestForm()._construct_survey()
+    data = json.loads(serializers.to_json(survey, locale="de"))
+    elements = data["pages"][0]["questions"]
+    assert elements[0]["title"] == "Vorname"
+    assert elements[1]["choices"] == [{"value": "a", "text": "Apfel"}]
+    chunks = serializers.iter_json(survey, locale="de")
+    assert "".join(chunks) == serializers.to_json(survey, locale="de")
+    data = json.loads(serializers.to_json(survey))
+    assert data["pages"][0]["questions"][0]["title"] == {
+        "default": "Name",
+        "de": "Vorname",
+    }
+
+
+def test_to_json_leaves_out_server_validator_options():
+    validator = questions.EmailValidator(check_deliverability=True)
+    data = json.loads(serializers.to_json(validator))
+    assert data == {"type": "email", "message": "Invalid value"}
@@ -82,3 +82,59 @@ def test_get_form_page_no_resources():
     )
     assert "Title" in html
     assert "GENERATED_JS" in html
+
+
+def test_iter_survey_js():
+    chunks = ["{", '"pages": []', "}"]
+    survey_js = templates.iter_survey_js(
+        form_json=iter(chunks),
+        form_data=None,
+        html_id="id",
+        action="http://testing",
+        theme="defaultV2",
+        platform="jquery",
+    )
+    assert 'var json = {"pages": []};' in "".join(survey_js)
+
+
+def test_iter_form_page():
+    html = templates.iter_form_page(
+        title="Title",
+        html_id="id",
+        platform="jquery",
+        survey_js=iter(["GENERATED", "_JS"]),
+        js_resources=["file.js"],
+        css_resources=["file.css"],
+    )
+    html = "".join(html)
+    assert "GENERATED_JS" in html
+    assert html == templates.get_form_page(
+        title="Title",
+        html_id="id",
+        platform="jquery",
+        survey_js="GENERATED_JS",
+        js_resources=["file.js"],
+        css_resources=["file.css"],
+    )
+
+
+def test_get_survey_js_with_pages_url():
+    for platform in ("jquery", "ko", "react", "vue"):
+        survey_js = templates.get_survey_js(
+            form_json="FORM_JSON",
+            platform=platform,
+            pages_url="/pages/",
+        )
+        assert 'var pagesUrl = "/pages/";' in survey_js
+        assert "onCurrentPageChanged" in survey_js
+    react_js = templates.get_survey_js(form_json="FORM_JSON", platform="react")
+    assert "<Survey.Survey json={json} data={data} />" in react_js
+    react_js = templates.get_survey_js(
+        form_json="FORM_JSON", platform="react", pages_url="/pages/"
+    )
+    assert "<Survey.Survey model={window.survey} />" in react_js
+    survey_js = templates.get_survey_js(
+        form_json="FORM_JSON", pages_url="/pages/?x='</script>"
+    )
+    assert "</script>" not in survey_js
+    assert 'var pagesUrl = "/pages/?x=\\u0027\\u003c/script\\u003e";' in survey_js
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+
+"""Tests for `utils` package."""
+
+from questions import utils
+
+
+def test_etag_matches():
+    etag = '"abc123"'
+    assert utils.etag_matches('"abc123"', etag) is True
+    assert utils.etag_matches('"other", W/"abc123"', etag) is True
+    assert utils.etag_matches("*", etag) is True
+    assert utils.etag_matches('"other"', etag) is False
+    assert utils.etag_matches("", etag) is False
+    assert utils.etag_matches(None, etag) is False
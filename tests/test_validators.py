@@ -2,12 +2,28 @@
 
 """Tests for `validators` package."""
 
+import asyncio
+import http.server
+import json
+import pickle
+import threading
+
+import pytest
+
 from questions import validators
+from questions import CheckboxQuestion
+from questions import DropdownQuestion
 from questions import EmailValidator
 from questions import ExpressionValidator
+from questions import MatrixDropdownQuestion
+from questions import MatrixDynamicQuestion
 from questions import NumericValidator
 from questions import RegexValidator
+from questions import TextQuestion
 from questions import TextValidator
+from questions.questions import PanelBlock
+from questions.questions import PanelDynamicBlock
+from questions.settings import UNSAFE_REGEX_POLICY
 
 
 def test_text_validator_bad_min_length():
@@ -62,3 +78,581 @@ def test_expression_validator():
     assert validators.expression_validator(validator, "anything", form_data) is True
     validator = ExpressionValidator(expression="")
     assert validators.expression_validator(validator, "anything", form_data) is True
+
+
+def test_compile_validator():
+    cases = [
+        (TextValidator(min_length=3, max_length=5), ["ab", "abcd", "abcdef"]),
+        (TextValidator(allow_digits=False), ["h4ll0", "hello"]),
+        (NumericValidator(min_value=7, max_value=42), [5, 7, 22, 99, "30"]),
+        (RegexValidator(regex="[A-Z][a-z]+-[0-9][0-9]"), ["anything", "Abc-55"]),
+    ]
+    for validator, values in cases:
+        check = validators.compile_validator(validator)
+        for value in values:
+            expected = validators.call_validator(validator, value, {})
+            assert check(value, {}) is expected
+
+
+def test_compile_expression_validator():
+    validator = ExpressionValidator(
+        kind="expression", expression="{var2} notempty and {var3} > 5"
+    )
+    check = validators.compile_validator(validator)
+    assert check("anything", {"var2": "", "var3": 1}) is False
+    assert check("anything", {}) is False
+    assert check("anything", {"var2": "other", "var3": 8}) is True
+    validator = ExpressionValidator(kind="expression", expression="")
+    assert validators.compile_validator(validator)("anything", {}) is True
+    validator = ExpressionValidator(kind="expression", expression="{var1} >")
+    assert validators.compile_validator(validator)("anything", {"var1": 1}) is False
+
+
+def test_validation_plan():
+    element = TextQuestion(
+        name="text1",
+        required=True,
+        validators=[TextValidator(min_length=3, message="Too short")],
+    )
+    plan = validators.ValidationPlan({"text1": element})
+    assert plan.validate({"text1": "abcd"}) == []
+    assert plan.validate({"text1": "ab"}) == [
+        {"question": "text1", "message": "Too short"}
+    ]
+    restored = pickle.loads(pickle.dumps(plan))
+    assert restored.validate({"text1": "ab"}) == plan.validate({"text1": "ab"})
+    assert restored.entries[0][0] == "text1"
+
+
+def test_email_validator_is_offline_by_default():
+    calls = []
+    validators.set_email_resolver(lambda domain: calls.append(domain) or False)
+    try:
+        check = validators.compile_validator(EmailValidator())
+        assert check("someone@example.com", {}) is True
+        assert check("not an address", {}) is False
+        assert calls == []
+    finally:
+        validators.set_email_resolver()
+
+
+def test_email_validator_deliverability_cache():
+    calls = []
+
+    def resolver(domain):
+        calls.append(domain)
+        return domain != "nomail.example.com"
+
+    validators.set_email_resolver(resolver, ttl=60)
+    try:
+        validator = EmailValidator(check_deliverability=True)
+        check = validators.compile_validator(validator)
+        assert check("one@mail.example.com", {}) is True
+        assert check("two@MAIL.example.com", {}) is True
+        assert check("one@nomail.example.com", {}) is False
+        assert (
+            validators.email_validator(validator, "x@nomail.example.com", {}) is False
+        )
+        assert calls == ["mail.example.com", "nomail.example.com"]
+    finally:
+        validators.set_email_resolver()
+
+
+def test_email_domain_cache_expiry_and_size():
+    calls = []
+    cache = validators.EmailDomainCache(
+        lambda domain: calls.append(domain) or True, ttl=0, max_size=1
+    )
+    assert cache.is_deliverable("a.example.com") is True
+    assert cache.is_deliverable("a.example.com") is True
+    assert calls == ["a.example.com", "a.example.com"]
+    cache = validators.EmailDomainCache(
+        lambda domain: calls.append(domain) or True, max_size=1
+    )
+    calls.clear()
+    for domain in ["a.example.com", "b.example.com", "a.example.com"]:
+        cache.is_deliverable(domain)
+    assert calls == ["a.example.com", "b.example.com", "a.example.com"]
+
+
+def test_email_domain_cache_unknown_results():
+    calls = []
+    cache = validators.EmailDomainCache(lambda domain: calls.append(domain))
+    assert cache.is_deliverable("example.com") is True
+    assert cache.is_deliverable("example.com") is True
+    assert len(calls) == 2
+
+
+def test_email_domain_cache_concurrent_lookups():
+    calls = []
+    started = threading.Event()
+
+    def resolver(domain):
+        calls.append(domain)
+        started.wait(1)
+        return True
+
+    cache = validators.EmailDomainCache(resolver)
+    threads = [
+        threading.Thread(target=cache.is_deliverable, args=("example.com",))
+        for index in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["example.com"]
+
+
+class ChoicesHandler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        body = json.dumps({"result": [{"code": "ES"}, {"code": "MX"}, {"code": 1}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def choices_url():
+    server = http.server.HTTPServer(("127.0.0.1", 0), ChoicesHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ChoicesHandler.requests = []
+    validators.set_choices_fetcher()
+    yield f"http://127.0.0.1:{server.server_port}/countries"
+    validators.set_choices_fetcher()
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_choices(choices_url):
+    assert validators.fetch_choices(choices_url, "result", "code") == {"ES", "MX", "1"}
+    assert validators.fetch_choices(choices_url, "missing", "code") is None
+    assert validators.fetch_choices(choices_url + "x", "result;code") is None
+
+
+def test_avalidate_choices_by_url(choices_url):
+    element = CheckboxQuestion(
+        name="countries",
+        has_other=True,
+        choices_by_url={"url": choices_url, "path": "result", "valueName": "code"},
+    )
+    plan = validators.ValidationPlan({"countries": element})
+    assert asyncio.run(plan.avalidate({"countries": ["ES", "other", 1]})) == []
+    assert asyncio.run(plan.avalidate({"countries": ["ES", "FR"]})) == [
+        {"question": "countries", "message": validators.CHOICE_MESSAGE}
+    ]
+    assert asyncio.run(plan.avalidate({})) == []
+    assert len(ChoicesHandler.requests) == 1
+    assert plan.validate({"countries": ["FR"]}) == []
+
+
+def test_avalidate_keeps_error_order():
+    validators.set_email_resolver(lambda domain: domain != "nomail.example.com")
+    try:
+        plan = validators.ValidationPlan(
+            {
+                "email": TextQuestion(
+                    name="email",
+                    validators=[EmailValidator(check_deliverability=True)],
+                ),
+                "text1": TextQuestion(
+                    name="text1",
+                    required=True,
+                    validators=[TextValidator(min_length=3, message="Too short")],
+                ),
+            }
+        )
+        form_data = {"email": "someone@nomail.example.com", "text1": "ab"}
+        errors = asyncio.run(plan.avalidate(form_data))
+        assert errors == plan.validate(form_data)
+        assert [error["question"] for error in errors] == ["email", "text1"]
+    finally:
+        validators.set_email_resolver()
+
+
+def test_avalidate_concurrency_and_timeout():
+    running = []
+    peak = []
+    release = threading.Event()
+
+    def resolver(domain):
+        running.append(domain)
+        peak.append(len(running))
+        release.wait(0.05 if domain.startswith("fast") else 1)
+        running.remove(domain)
+        return False
+
+    validators.set_email_resolver(resolver)
+    try:
+        plan = validators.ValidationPlan(
+            {
+                f"email{index}": TextQuestion(
+                    name=f"email{index}",
+                    validators=[EmailValidator(check_deliverability=True)],
+                )
+                for index in range(4)
+            }
+        )
+        form_data = {
+            f"email{index}": f"a@fast{index}.example.com" for index in range(4)
+        }
+        errors = asyncio.run(plan.avalidate(form_data, concurrency=2))
+        assert len(errors) == 4
+        assert max(peak) == 2
+        form_data = {
+            f"email{index}": f"a@slow{index}.example.com" for index in range(4)
+        }
+        errors = asyncio.run(plan.avalidate(form_data, timeout=0.05))
+        assert errors == []
+    finally:
+        release.set()
+        validators.set_email_resolver()
+
+
+def test_validation_plan_max_errors():
+    calls = []
+
+    def resolver(domain):
+        calls.append(domain)
+        return False
+
+    validators.set_email_resolver(resolver)
+    try:
+        plan = validators.ValidationPlan(
+            {
+                "email": TextQuestion(
+                    name="email",
+                    validators=[EmailValidator(check_deliverability=True)],
+                ),
+                "code": TextQuestion(
+                    name="code",
+                    validators=[
+                        RegexValidator(regex="[A-Z]+$", message="Upper case"),
+                        TextValidator(max_length=3, message="Too long"),
+                    ],
+                ),
+                "name": TextQuestion(name="name", required=True),
+            }
+        )
+        form_data = {"email": "a@example.com", "code": "abcd"}
+        errors = plan.validate(form_data)
+        assert [error["message"] for error in errors] == [
+            "Invalid value",
+            "Upper case",
+            "Too long",
+            validators.REQUIRED_MESSAGE,
+        ]
+        assert plan.validate(form_data, max_errors=1) == [
+            {"question": "name", "message": validators.REQUIRED_MESSAGE}
+        ]
+        assert plan.validate(form_data, max_errors=3) == [
+            errors[1],
+            errors[2],
+            errors[3],
+        ]
+        assert len(calls) == 1
+        assert plan.validate(form_data, max_errors=10) == errors
+        with pytest.raises(ValueError):
+            plan.validate(form_data, max_errors=0)
+    finally:
+        validators.set_email_resolver()
+
+
+def test_validation_plan_matrix_rows():
+    element = MatrixDynamicQuestion(
+        name="orders",
+        columns=[
+            {"name": "product", "cellType": "text", "isRequired": True},
+            {
+                "name": "quantity",
+                "cellType": "text",
+                "validators": [
+                    {"type": "numeric", "min": 1, "max": 10, "text": "1 to 10"},
+                    {"type": "expression", "expression": "{row.quantity} <= {limit}"},
+                ],
+            },
+        ],
+    )
+    plan = validators.ValidationPlan({"orders": element})
+    rows = [{"product": "tea", "quantity": 2} for index in range(20)]
+    rows[17] = {"product": "tea", "quantity": 12}
+    rows[18] = {"quantity": 3}
+    rows[19] = "garbage"
+    assert plan.validate({"orders": rows, "limit": 5}) == [
+        {"question": "orders[17].quantity", "message": "1 to 10"},
+        {"question": "orders[17].quantity", "message": "Invalid value"},
+        {"question": "orders[18].product", "message": validators.REQUIRED_MESSAGE},
+        {"question": "orders[19]", "message": validators.ROWS_MESSAGE},
+    ]
+    assert plan.validate({"orders": rows, "limit": 5}, max_errors=1) == [
+        {"question": "orders[17].quantity", "message": "1 to 10"}
+    ]
+    assert plan.validate({"orders": "garbage"}) == [
+        {"question": "orders", "message": validators.ROWS_MESSAGE}
+    ]
+    assert plan.validate({}) == []
+
+
+def test_validation_plan_matrix_column_surveyjs_names():
+    column = {
+        "name": "qty",
+        "cellType": "text",
+        "validators": [{"type": "numeric", "minValue": 1, "maxValue": 5}],
+    }
+    element = MatrixDynamicQuestion(name="orders", columns=[column])
+    plan = validators.ValidationPlan({"orders": element})
+    assert plan.validate({"orders": [{"qty": 9}, {"qty": 3}]}) == [
+        {"question": "orders[0].qty", "message": "Invalid value"}
+    ]
+    validator = validators.validator_from_json(
+        {"type": "text", "maxLength": 3, "allowDigits": False, "text": "Short"}
+    )
+    assert isinstance(validator, TextValidator)
+    assert (validator.max_length, validator.allow_digits) == (3, False)
+    assert validator.message == "Short"
+
+
+def test_validation_plan_matrix_dropdown_rows():
+    element = MatrixDropdownQuestion(
+        name="ratings",
+        cell_type="text",
+        columns=[{"name": "score", "validators": [NumericValidator(max_value=5)]}],
+        rows=["food", "service"],
+    )
+    plan = validators.ValidationPlan({"ratings": element})
+    form_data = {"ratings": {"food": {"score": 4}, "service": {"score": 9}}}
+    assert plan.validate(form_data) == [
+        {"question": "ratings[service].score", "message": "Invalid value"}
+    ]
+
+
+def test_validation_plan_dynamic_panel_rows():
+    element = PanelDynamicBlock(
+        name="people",
+        template_elements=[
+            TextQuestion(name="name", required=True),
+            PanelBlock(
+                name="contact",
+                elements=[
+                    TextQuestion(
+                        name="phone",
+                        validators=[RegexValidator(regex="[0-9]+$", message="Digits")],
+                    )
+                ],
+            ),
+        ],
+    )
+    plan = validators.ValidationPlan({"people": element})
+    form_data = {"people": [{"name": "Ann", "phone": "123"}, {"phone": "abc"}]}
+    assert plan.validate(form_data) == [
+        {"question": "people[1].name", "message": validators.REQUIRED_MESSAGE},
+        {"question": "people[1].phone", "message": "Digits"},
+    ]
+    assert asyncio.run(plan.avalidate(form_data)) == plan.validate(form_data)
+
+
+def test_compile_choices_check():
+    element = CheckboxQuestion(
+        name="codes",
+        choices=[f"code{index}" for index in range(40000)]
+        + [{"value": 1, "text": "One"}, {"text": "Two"}],
+        has_other=True,
+    )
+    check = validators.compile_choices_check(element)
+    assert check("code39999", {}) is True
+    assert check(["code1", 1, "Two", "other"], {}) is True
+    assert check(["code1", "none"], {}) is False
+    assert check("One", {}) is False
+    assert validators.compile_choices_check(TextQuestion(name="text1")) is None
+    element = DropdownQuestion(
+        name="country", choices=["ES"], choices_by_url={"url": "http://example.com"}
+    )
+    assert validators.compile_choices_check(element) is None
+
+
+def test_compile_choices_check_number_range():
+    element = DropdownQuestion(
+        name="score", choices=["n/a"], choices_min=1, choices_max=10
+    )
+    check = validators.compile_choices_check(element)
+    assert check(5, {}) is True
+    assert check("10", {}) is True
+    assert check(5.0, {}) is True
+    assert check("n/a", {}) is True
+    assert check(11, {}) is False
+    assert check("five", {}) is False
+    element = DropdownQuestion(
+        name="big", choices_min=0, choices_max=10**9, choices_step=5
+    )
+    check = validators.compile_choices_check(element)
+    assert check(999999995, {}) is True
+    assert check(7, {}) is False
+    element = DropdownQuestion(name="none", choices_min=5, choices_max=5)
+    assert validators.compile_choices_check(element) is None
+
+
+def test_validation_plan_choices():
+    plan = validators.ValidationPlan(
+        {
+            "color": DropdownQuestion(name="color", choices=["red", "green"]),
+            "sizes": MatrixDynamicQuestion(
+                name="sizes",
+                choices=["S", "M"],
+                columns=[{"name": "size"}, {"name": "notes", "cellType": "text"}],
+            ),
+        }
+    )
+    form_data = {
+        "color": "blue",
+        "sizes": [{"size": "M", "notes": "X"}, {"size": "XL"}],
+    }
+    assert plan.validate(form_data) == [
+        {"question": "color", "message": validators.CHOICE_MESSAGE},
+        {"question": "sizes[1].size", "message": validators.CHOICE_MESSAGE},
+    ]
+    assert plan.validate({"color": "red"}) == []
+    assert plan.validate(form_data, max_errors=1) == [
+        {"question": "color", "message": validators.CHOICE_MESSAGE}
+    ]
+
+
+def test_validate_incremental():
+    calls = []
+
+    def check(value, form_data):
+        calls.append(value)
+        return True
+
+    plan = validators.ValidationPlan(
+        {
+            "start": TextQuestion(name="start"),
+            "end": TextQuestion(
+                name="end",
+                validators=[
+                    ExpressionValidator(
+                        expression="{end} > {start}", message="Too early"
+                    )
+                ],
+            ),
+            "reason": TextQuestion(name="reason", required_if="{start} > 10"),
+            "notes": TextQuestion(
+                name="notes", validators=[TextValidator(max_length=3)]
+            ),
+        }
+    )
+    form_data = {"start": 5, "end": 8, "notes": "ok"}
+    state = plan.validate_incremental(form_data)
+    assert state.valid
+    assert plan.readers == {"end": {1}, "start": {1}}
+    # Changing "start" checks "end" and "reason" again, but not "notes".
+    name, required, checks = plan.entries[3]
+    plan.entries = plan.entries[:3] + ((name, required, ((check, "", False),)),)
+    form_data = {"start": 20, "end": 8, "notes": "ok"}
+    state = plan.validate_incremental(form_data, state)
+    assert calls == []
+    assert state.errors == plan.validate(form_data)
+    calls.clear()
+    assert state.errors == [
+        {"question": "end", "message": "Too early"},
+        {"question": "reason", "message": validators.REQUIRED_MESSAGE},
+    ]
+    form_data = {"start": 20, "end": 30, "reason": "Late", "notes": "long"}
+    state = plan.validate_incremental(form_data, state, changed=["end", "reason"])
+    assert state.valid
+    assert calls == []
+    state = plan.validate_incremental(form_data, state)
+    assert calls == ["long"]
+    other = validators.ValidationPlan(plan.form_elements)
+    form_data = {"notes": "long"}
+    assert other.validate_incremental(form_data, state).errors == other.validate(
+        form_data
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern,problems",
+    [
+        (r"^[A-Z]+\d{2,4}$", []),
+        (r"(\d{3}-)*\d{4}", []),
+        (r"(x|y)*z", []),
+        (r"^[a-z]+(-[a-z]+)*$", []),
+        (r"^(\d+\.)*\d+$", []),
+        (r"^([a-z0-9]+\.)+[a-z]{2,}$", []),
+        (r"^(\w+\s)*\w+$", []),
+        (r"([^,]+,)*", []),
+        (r"(\w+[^\w]+)*", []),
+        (r"(a+)+$", ["nested quantifier"]),
+        (r"(\w+\s?)*$", ["nested quantifier"]),
+        (r"(a*b*)*", ["nested quantifier"]),
+        (r"(\d+\w)*", ["nested quantifier"]),
+        (r"((a+-)+)*", ["nested quantifier"]),
+        (r"(\w+\u4e2d)*", ["nested quantifier"]),
+        (r"(a|ab)*c", ["overlapping alternatives in a quantifier"]),
+    ],
+)
+def test_analyze_regex(pattern, problems):
+    assert validators.analyze_regex(pattern) == problems
+
+
+def test_unsafe_regex_policy():
+    unsafe = RegexValidator(regex="(a+)+$")
+    with pytest.warns(RuntimeWarning):
+        check = validators.compile_validator(unsafe)
+    assert check("aaa", {}) is True
+    try:
+        validators.set_regex_policy("reject")
+        with pytest.raises(validators.UnsafeRegexError):
+            validators.compile_validator(unsafe)
+        validators.compile_validator(RegexValidator(regex="^[a-z]+(-[a-z]+)*$"))
+        validators.set_regex_policy("allow")
+        validators.compile_validator(unsafe)
+    finally:
+        validators.set_regex_policy(UNSAFE_REGEX_POLICY)
+    with pytest.raises(ValueError):
+        validators.set_regex_policy("maybe")
+
+
+def test_validation_budget():
+    plan = validators.ValidationPlan(
+        {
+            "text1": TextQuestion(name="text1", required=True),
+            "text2": TextQuestion(
+                name="text2",
+                validators=[ExpressionValidator(expression="{text2} > {text1}")],
+            ),
+        }
+    )
+    # One step for each question, plus the operations of the expression.
+    assert plan.entry_steps == (1, 4)
+    form_data = {"text1": 1, "text2": 2}
+    assert plan.validate(form_data, max_steps=5) == []
+    with pytest.raises(validators.ValidationBudgetError):
+        plan.validate(form_data, max_steps=4)
+    with pytest.raises(validators.ValidationBudgetError):
+        plan.validate(form_data, max_errors=1, max_steps=3)
+    with pytest.raises(validators.ValidationBudgetError):
+        plan.validate(form_data, time_limit=-1)
+    results = list(validators.validate_many(plan, [form_data], max_steps=4))
+    assert results == [
+        (False, [{"question": "", "message": validators.BUDGET_MESSAGE}])
+    ]
+    results = list(validators.validate_many(plan, [form_data, {}], max_steps=5))
+    assert results == [
+        (True, []),
+        (
+            False,
+            [
+                {"question": "text1", "message": validators.REQUIRED_MESSAGE},
+                {"question": "text2", "message": "Invalid value"},
+            ],
+        ),
+    ]